@@ -0,0 +1,178 @@
+"""
+Multilingual text analyzer for keyword retrieval (English, Hindi, Marathi).
+
+The same analyze() is applied to chunks at index build time and to the
+query, so both sides go through identical normalization:
+
+1. Unicode NFC, lowercasing, removal of ZWJ/ZWNJ
+2. Nukta folding (क़ -> क) and chandrabindu -> anusvara
+3. Homorganic nasal + virama folded to anusvara (हिन्दी -> हिंदी)
+4. Tokenization that keeps Devanagari matras/virama inside words
+5. Stopword removal and a light Hindi/Marathi suffix stemmer
+
+Per-token work is cached, so analyzing a query is a regex pass plus
+dictionary lookups.
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+
+# =========================
+# NORMALIZATION
+# =========================
+NUKTA = "\u093c"
+CHANDRABINDU = "\u0901"
+ANUSVARA = "\u0902"
+
+_FOLD_TABLE = str.maketrans({
+    NUKTA: None,
+    CHANDRABINDU: ANUSVARA,
+    "\u200c": None,  # zero width non-joiner
+    "\u200d": None,  # zero width joiner
+    "\u0929": "\u0928",  # ऩ -> न
+    "\u0931": "\u0930",  # ऱ -> र
+    "\u0934": "\u0933",  # ऴ -> ळ
+})
+
+# Nasal consonant + virama before a consonant of the same class
+_HOMORGANIC_NASAL_RE = re.compile(
+    "ङ्(?=[कखगघ])|ञ्(?=[चछजझ])|ण्(?=[टठडढ])|न्(?=[तथदध])|म्(?=[पफबभ])"
+)
+
+# Latin words/numbers, or Devanagari runs (letters, matras, virama,
+# digits) excluding the danda punctuation marks
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[\u0900-\u0963\u0966-\u097f]+")
+
+
+def normalize(text: str) -> str:
+    """NFC-normalize, lowercase and fold Devanagari spelling variants."""
+    if text.isascii():
+        return text.lower()
+
+    # NFC leaves the precomposed nukta letters (U+0958-095F) decomposed,
+    # so dropping U+093C afterwards folds them onto their base consonant
+    text = unicodedata.normalize("NFC", text).lower()
+    text = text.translate(_FOLD_TABLE)
+    return _HOMORGANIC_NASAL_RE.sub(ANUSVARA, text)
+
+
+# =========================
+# STOPWORDS
+# =========================
+ENGLISH_STOPWORDS = [
+    "is", "are", "was", "were", "be", "been", "being", "am",
+    "the", "a", "an", "this", "that", "these", "those", "it", "its",
+    "what", "why", "how", "when", "where", "which", "who", "whom", "whose",
+    "and", "or", "of", "to", "in", "on", "for", "with", "by", "from",
+    "at", "as", "into", "about", "than", "then", "there", "their", "they",
+    "them", "has", "have", "had", "does", "did", "can", "could",
+    "will", "would", "shall", "should", "may", "might", "must",
+    "not", "you", "your", "me", "my", "our", "please", "tell", "give",
+    "explain", "define", "describe", "mean", "meant", "also", "any",
+    "some", "such", "only", "very", "more", "most", "other", "all",
+]
+
+HINDI_STOPWORDS = [
+    "है", "हैं", "था", "थी", "थे", "हो", "होता", "होती", "होते", "होना",
+    "गया", "गई", "गए", "किया", "की", "का", "के", "को", "में", "से", "पर",
+    "और", "या", "तथा", "एवं", "भी", "तो", "ही", "न", "नहीं",
+    "यह", "ये", "वह", "वे", "इस", "उस", "इन", "उन", "इसे", "उसे",
+    "इसका", "उसका", "इसकी", "उसकी", "इसके", "उसके", "जो", "जब", "तब", "कि",
+    "क्या", "कैसे", "कैसा", "कैसी", "क्यों", "कौन", "कहाँ", "कब", "किस",
+    "किसे", "किसी", "कुछ", "सब", "सभी", "अपना", "अपनी", "अपने", "एक",
+    "लिए", "द्वारा", "साथ", "बाद", "पहले", "बताओ", "बताइए", "बताएं",
+    "समझाओ", "समझाइए", "समझाएं", "मतलब", "यानी", "कृपया", "मुझे",
+    "हम", "आप", "तुम", "मैं", "रहा", "रही", "रहे", "करना", "करता",
+    "करती", "करते", "सकता", "सकती", "सकते", "वाला", "वाली", "वाले",
+]
+
+MARATHI_STOPWORDS = [
+    "आहे", "आहेत", "होता", "होती", "होते", "होतो", "असतो", "असते",
+    "असतात", "असे", "अशी", "असा", "आणि", "किंवा", "व", "हा", "ही", "हे",
+    "तो", "ती", "ते", "त्या", "त्याचा", "त्याची", "त्याचे", "त्यांचा",
+    "त्यांची", "त्यांचे", "या", "याचा", "याची", "याचे", "मध्ये", "मधील",
+    "ला", "ना", "ने", "नी", "चा", "ची", "चे", "च्या", "साठी", "कडे",
+    "पासून", "वर", "म्हणजे", "काय", "का", "कसा", "कसे", "कशी", "कोण",
+    "कुठे", "केव्हा", "कधी", "किती", "कोणता", "कोणती", "कोणते", "सांग",
+    "सांगा", "समजाव", "समजावा", "स्पष्ट", "करा", "करणे", "केला", "केली",
+    "केले", "नाही", "नाहीत", "सर्व", "काही", "पण", "तर", "आपण", "मला",
+    "तुम्ही", "आम्ही", "म्हणून", "येथे", "तेथे", "जे", "जी",
+]
+
+STOPWORDS = frozenset(
+    normalize(w) for w in ENGLISH_STOPWORDS + HINDI_STOPWORDS + MARATHI_STOPWORDS
+)
+
+
+# =========================
+# LIGHT STEMMER
+# =========================
+# Inflectional suffixes after Ramanathan & Rao's light Hindi stemmer,
+# plus common Marathi case/postposition endings. One shared list is used
+# because chunks are indexed without knowing their language; what matters
+# is that query and chunk words are reduced the same way.
+HINDI_SUFFIXES = [
+    "ो", "े", "ू", "ु", "ी", "ि", "ा",
+    "कर", "ाओ", "िए", "ाई", "ाए", "ने", "नी", "ना", "ते", "ीं", "ती",
+    "ता", "ाँ", "ां", "ों", "ें",
+    "ाकर", "ाइए", "ाईं", "ाया", "ेगी", "ेगा", "ोगी", "ोगे", "ाने", "ाना",
+    "ाते", "ाती", "ाता", "तीं", "ाओं", "ाएं", "ुओं", "ुएं", "ुआं",
+    "ाएगी", "ाएगा", "ाओगी", "ाओगे", "एंगी", "ेंगी", "एंगे", "ेंगे",
+    "ूंगी", "ूंगा", "ातीं", "नाओं", "नाएं", "ताओं", "ताएं", "ियाँ",
+    "ियों", "ियां",
+    "ाएंगी", "ाएंगे", "ाऊंगी", "ाऊंगा", "ाइयाँ", "ाइयों", "ाइयां",
+]
+
+MARATHI_SUFFIXES = [
+    "चा", "ची", "चे", "च्या", "ला", "ना", "ने", "नी", "त", "ात", "ांत",
+    "ाचा", "ाची", "ाचे", "ाच्या", "ांचा", "ांची", "ांचे", "ांच्या",
+    "ाला", "ाने", "ांना", "ांनी", "मध्ये", "ामध्ये", "साठी", "ासाठी",
+    "कडे", "ाकडे", "पासून", "ापासून", "हून", "ाहून", "वर", "ावर",
+]
+
+MIN_STEM_LENGTH = 2
+
+_SUFFIXES_BY_LENGTH = {}
+for _suffix in {normalize(s) for s in HINDI_SUFFIXES + MARATHI_SUFFIXES}:
+    _SUFFIXES_BY_LENGTH.setdefault(len(_suffix), set()).add(_suffix)
+_SUFFIX_LENGTHS = sorted(_SUFFIXES_BY_LENGTH, reverse=True)
+
+
+def stem_devanagari(token: str) -> str:
+    """Strip the longest known suffix, keeping at least MIN_STEM_LENGTH chars."""
+    for length in _SUFFIX_LENGTHS:
+        if len(token) - length >= MIN_STEM_LENGTH and token[-length:] in _SUFFIXES_BY_LENGTH[length]:
+            return token[:-length]
+    return token
+
+
+# =========================
+# ANALYZER
+# =========================
+# Bump whenever analyze() output changes: keyword indexes stored in
+# .chunks files record it and are ignored (rebuilt at load) on mismatch
+ANALYZER_VERSION = 1
+
+
+@lru_cache(maxsize=200_000)
+def _analyze_token(token: str):
+    if token in STOPWORDS:
+        return None
+
+    if token[0] < "\u0900":
+        # Latin / ASCII digits: keep the original length filter
+        return token if len(token) > 2 else None
+
+    stem = stem_devanagari(token)
+    return stem if len(stem) >= MIN_STEM_LENGTH else None
+
+
+def analyze(text: str):
+    """Normalize, tokenize, drop stopwords and stem. Returns a list of terms."""
+    terms = []
+    for token in _TOKEN_RE.findall(normalize(text)):
+        term = _analyze_token(token)
+        if term:
+            terms.append(term)
+    return terms
@@ -0,0 +1,158 @@
+"""
+Extractive answer composer for offline mode.
+
+Instead of returning the retrieved chunks verbatim, the top chunks are
+split into sentences, each sentence is scored against the question
+(TF-IDF cosine) and by centrality among the candidates (TextRank), and
+the best non-redundant sentences are emitted in reading order until the
+character budget is used up.
+"""
+
+import math
+import re
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; falls back to query-overlap scoring
+    np = None
+
+from config import ANSWER_CHAR_BUDGET, ANSWER_QUERY_WEIGHT
+from analyzer import analyze
+
+# Sentence ends: . ? ! followed by whitespace, or a danda (।/॥). PDF text
+# often loses the space ("potential.Potential"), so . ? ! after a
+# lowercase or Devanagari letter also ends a sentence right before an
+# uppercase or Devanagari letter (abbreviations like "U.S." are kept)
+_SENTENCE_END_RE = re.compile(
+    r"(?<=[.?!])\s+|(?<=[।॥])\s*"
+    r"|(?<=[a-z\u0900-\u0963][.?!])(?=[A-Z\u0904-\u0939\u0958-\u0961])"
+)
+
+MIN_SENTENCE_CHARS = 25
+TEXTRANK_DAMPING = 0.85
+TEXTRANK_ITERATIONS = 20
+REDUNDANCY_THRESHOLD = 0.8
+
+
+def split_sentences(text: str):
+    """Split chunk text on English and Devanagari sentence boundaries."""
+    return [
+        s.strip() for s in _SENTENCE_END_RE.split(text)
+        if len(s.strip()) >= MIN_SENTENCE_CHARS
+    ]
+
+
+def _tfidf_matrix(term_lists, query_terms):
+    """Row-normalized TF-IDF for sentences (rows) plus the query vector."""
+    vocab = {}
+    for terms in term_lists + [query_terms]:
+        for term in terms:
+            vocab.setdefault(term, len(vocab))
+
+    matrix = np.zeros((len(term_lists), len(vocab)), dtype=np.float32)
+    for row, terms in enumerate(term_lists):
+        for term, tf in Counter(terms).items():
+            matrix[row, vocab[term]] = tf
+
+    query = np.zeros(len(vocab), dtype=np.float32)
+    for term, tf in Counter(query_terms).items():
+        query[vocab[term]] = tf
+
+    df = (matrix > 0).sum(axis=0)
+    idf = np.log((1 + len(term_lists)) / (1 + df)) + 1.0
+    matrix *= idf
+    query *= idf
+
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    query /= max(float(np.linalg.norm(query)), 1e-12)
+    return matrix, query
+
+
+def _textrank(similarity):
+    """PageRank over the sentence similarity graph (power iteration)."""
+    n = similarity.shape[0]
+    graph = similarity.copy()
+    np.fill_diagonal(graph, 0.0)
+
+    out_weight = graph.sum(axis=1, keepdims=True)
+    transition = np.divide(graph, out_weight, out=np.full_like(graph, 1.0 / n), where=out_weight > 0)
+
+    rank = np.full(n, 1.0 / n, dtype=np.float32)
+    for _ in range(TEXTRANK_ITERATIONS):
+        rank = (1 - TEXTRANK_DAMPING) / n + TEXTRANK_DAMPING * (transition.T @ rank)
+
+    return rank / max(float(rank.max()), 1e-12)
+
+
+def _score_sentences(term_lists, query_terms):
+    """Returns (scores, similarity matrix or None) for the candidate sentences."""
+    if np is None:
+        query = set(query_terms)
+        scores = [
+            len(query.intersection(terms)) / math.sqrt(len(terms) or 1)
+            for terms in term_lists
+        ]
+        return scores, None
+
+    matrix, query = _tfidf_matrix(term_lists, query_terms)
+    similarity = matrix @ matrix.T
+    relevance = matrix @ query
+    centrality = _textrank(similarity)
+
+    scores = ANSWER_QUERY_WEIGHT * relevance + (1 - ANSWER_QUERY_WEIGHT) * centrality
+    return scores.tolist(), similarity
+
+
+def compose_answer(question: str, chunks, char_budget: int = ANSWER_CHAR_BUDGET):
+    """
+    Build a compact extractive answer from retrieved chunks.
+
+    Args:
+        question: Student's question
+        chunks: Retrieved document dicts (best first) with "content",
+            "subject" and "id"
+        char_budget: Maximum answer length in characters
+
+    Returns:
+        Dict with "text" and "sources" (chunk ids as "<subject>:<id>"),
+        or None if no usable sentence was found.
+    """
+    sentences = []  # (chunk rank, position, text)
+    for rank, chunk in enumerate(chunks):
+        for position, sentence in enumerate(split_sentences(chunk["content"])):
+            sentences.append((rank, position, sentence))
+
+    if not sentences:
+        return None
+
+    term_lists = [analyze(sentence) for _, _, sentence in sentences]
+    scores, similarity = _score_sentences(term_lists, analyze(question))
+
+    selected = []
+    used = 0
+    for i in sorted(range(len(sentences)), key=lambda i: scores[i], reverse=True):
+        length = len(sentences[i][2]) + 1
+        if used + length > char_budget:
+            continue
+        if similarity is not None and any(similarity[i, j] > REDUNDANCY_THRESHOLD for j in selected):
+            continue
+        selected.append(i)
+        used += length
+
+    if not selected:
+        # Budget smaller than every sentence: truncate the best one
+        best = max(range(len(sentences)), key=lambda i: scores[i])
+        selected = [best]
+
+    selected.sort(key=lambda i: (sentences[i][0], sentences[i][1]))
+    text = " ".join(sentences[i][2] for i in selected)[:char_budget]
+
+    sources = []
+    for i in selected:
+        chunk = chunks[sentences[i][0]]
+        source_id = f"{chunk['subject']}:{chunk['id']}"
+        if source_id not in sources:
+            sources.append(source_id)
+
+    return {"text": text, "sources": sources}
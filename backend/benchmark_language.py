@@ -0,0 +1,188 @@
+"""
+Language detection benchmark: language_detector vs the legacy detector.
+
+Runs both detectors over benchmarks/language_questions.json plus the
+en/hi/mr questions of the relevance suite and reports accuracy (overall,
+per language, per kind), determinism across repeated calls, cold
+first-call latency and warm per-call p50/p95/p99.
+
+    python benchmark_language.py
+    python benchmark_language.py --rounds 50 --output lang.json
+"""
+
+import argparse
+import json
+import re
+import time
+from collections import defaultdict
+from pathlib import Path
+
+try:
+    from langdetect import detect, LangDetectException
+except ImportError:  # the legacy baseline is skipped without langdetect
+    detect = None
+
+import language_detector
+from benchmark_rag import BENCH_DIR, RESULTS_DIR, QUESTIONS_PATH, _git_commit, _percentiles
+
+LANGUAGE_QUESTIONS_PATH = BENCH_DIR / "language_questions.json"
+
+
+# =========================
+# LEGACY DETECTOR (baseline)
+# =========================
+def legacy_detect_language(text: str) -> str:
+    """The keyword + langdetect detector previously used by router.py."""
+    if not text or len(text.strip()) < 2:
+        return "en"
+
+    text_lower = text.lower().strip()
+
+    if re.search(r'[ऀ-ॿ]', text):
+        marathi_keywords = [
+            "आहे", "आहेत", "का", "कसा", "कसे", "कशी",
+            "म्हणजे", "सांग", "सांगा", "समजाव", "समजावा",
+            "मध्ये", "ला", "ना", "नाही", "होते"
+        ]
+        hindi_keywords = [
+            "है", "हैं", "क्या", "कैसा", "कैसे", "कैसी",
+            "यानी", "बताओ", "बताइए", "समझाओ", "समझाइए",
+            "में", "को", "नहीं", "था", "थी", "थे"
+        ]
+
+        marathi_count = sum(1 for word in marathi_keywords if word in text_lower)
+        hindi_count = sum(1 for word in hindi_keywords if word in text_lower)
+        return "mr" if marathi_count > hindi_count else "hi"
+
+    try:
+        detected = detect(text)
+        return detected if detected in ("en", "hi", "mr") else "en"
+    except LangDetectException:
+        return "en"
+
+
+# =========================
+# BENCHMARK
+# =========================
+def _load_labeled():
+    with open(LANGUAGE_QUESTIONS_PATH, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    with open(QUESTIONS_PATH, "r", encoding="utf-8") as f:
+        items += [
+            {"language": q["language"], "kind": "relevance", "text": q["question"]}
+            for q in json.load(f)
+        ]
+    return items
+
+
+def _accuracy(detector, items):
+    by_language = defaultdict(lambda: [0, 0])
+    by_kind = defaultdict(lambda: [0, 0])
+    misses = []
+
+    for item in items:
+        predicted = detector(item["text"])
+        hit = predicted == item["language"]
+        for bucket in (by_language[item["language"]], by_kind[item["kind"]]):
+            bucket[0] += hit
+            bucket[1] += 1
+        if not hit:
+            misses.append({"text": item["text"], "expected": item["language"], "predicted": predicted})
+
+    def ratio(buckets):
+        return {key: round(hits / total, 4) for key, (hits, total) in sorted(buckets.items())}
+
+    total_hits = sum(hits for hits, _ in by_language.values())
+    return {
+        "accuracy": round(total_hits / len(items), 4),
+        "by_language": ratio(by_language),
+        "by_kind": ratio(by_kind),
+        "misses": misses,
+    }
+
+
+def _unstable(detector, items, repeats: int):
+    """Texts whose detected language changes across repeated calls."""
+    return [
+        item["text"] for item in items
+        if len({detector(item["text"]) for _ in range(repeats)}) > 1
+    ]
+
+
+def _latency(detector, items, rounds: int, before_call=None):
+    samples_ms = []
+    for _ in range(rounds):
+        for item in items:
+            if before_call:
+                before_call()
+            start = time.perf_counter()
+            detector(item["text"])
+            samples_ms.append((time.perf_counter() - start) * 1000)
+    return _percentiles(samples_ms)
+
+
+def run_benchmark(rounds: int, repeats: int):
+    items = _load_labeled()
+    report = {"items": len(items)}
+
+    detectors = {"language_detector": language_detector.detect_language}
+    if detect is not None:
+        detectors["legacy"] = legacy_detect_language
+    else:
+        print("[WARN] langdetect not installed; skipping the legacy baseline")
+
+    for name, detector in detectors.items():
+        # Cold call first: langdetect loads its profiles lazily
+        start = time.perf_counter()
+        detector(items[0]["text"])
+        cold_ms = (time.perf_counter() - start) * 1000
+
+        entry = {
+            "cold_first_call_ms": round(cold_ms, 3),
+            **_accuracy(detector, items),
+            "unstable": _unstable(detector, items, repeats),
+            "latency": _latency(detector, items, rounds),
+        }
+        if name == "language_detector":
+            entry["latency_uncached"] = _latency(
+                detector, items, rounds, language_detector._detect_latin.cache_clear
+            )
+        report[name] = entry
+
+        print(
+            f"[BENCH] {name:<18} acc={entry['accuracy']}  cold={entry['cold_first_call_ms']}ms  "
+            f"p50={entry['latency']['p50_ms']}ms  p95={entry['latency']['p95_ms']}ms  "
+            f"unstable={len(entry['unstable'])}"
+        )
+        print(f"        by language: {entry['by_language']}")
+        print(f"        by kind:     {entry['by_kind']}")
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Language detection benchmark")
+    parser.add_argument("--rounds", type=int, default=20, help="Timed passes over the labeled set")
+    parser.add_argument("--repeats", type=int, default=5, help="Calls per text for the determinism check")
+    parser.add_argument("--output", help="Result JSON path (default: benchmarks/results/lang-<commit>-<time>.json)")
+    args = parser.parse_args()
+
+    commit = _git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        **run_benchmark(args.rounds, args.repeats),
+    }
+
+    output = Path(args.output) if args.output else (
+        RESULTS_DIR / f"lang-{commit}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"\n✅ Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
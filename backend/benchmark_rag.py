@@ -0,0 +1,295 @@
+"""
+Offline RAG benchmark and relevance regression suite.
+
+1. Scale: synthesizes corpora from the vector_store science chunks at several
+   multiples (default 1x, 10x, 100x, 1000x), builds the sharded store and
+   reports build time, memory, and p50/p95/p99 query latency for single
+   and batched keyword search.
+2. Relevance: runs the labeled en/hi/mr question -> chunk-id set in
+   benchmarks/relevance_questions.json against the real vector_store plus
+   the Hindi/Marathi fixture chunks in benchmarks/relevance_corpus (the
+   store itself has none) and reports recall@k and MRR per language.
+
+Results are written as JSON so runs can be compared across commits:
+    python benchmark_rag.py
+    python benchmark_rag.py --scales 1,10 --queries 100 --output run.json
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import offline_rag
+from chunk_store import iter_chunks, subject_files
+from config import BASE_DIR, VECTOR_DIR, TOP_K
+
+BENCH_DIR = BASE_DIR / "benchmarks"
+QUESTIONS_PATH = BENCH_DIR / "relevance_questions.json"
+# Labeled hi/mr chunks searched alongside the vector_store subjects
+RELEVANCE_CORPUS_DIR = BENCH_DIR / "relevance_corpus"
+RESULTS_DIR = BENCH_DIR / "results"
+# Subject whose chunks seed the synthetic corpora (.chunks, .jsonl or .json)
+SOURCE_SUBJECT = "science"
+
+RECALL_AT = (1, 3, 5)
+MAX_SHARDS = 8
+
+
+# =========================
+# HELPERS
+# =========================
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def _rss_bytes():
+    """Current resident set size (Linux), or None."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def _percentiles(samples_ms):
+    ordered = sorted(samples_ms)
+
+    def pick(p):
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 4)
+
+    return {
+        "p50_ms": pick(50),
+        "p95_ms": pick(95),
+        "p99_ms": pick(99),
+        "mean_ms": round(sum(ordered) / len(ordered), 4),
+    }
+
+
+def _load_questions():
+    with open(QUESTIONS_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# =========================
+# SCALE BENCHMARK
+# =========================
+def synthesize_corpus(base_docs, scale: int, seed: int = 0):
+    """
+    Replicate base_docs scale times. Replica 0 is the original; later
+    replicas shuffle and drop ~10% of each chunk's sentences so documents
+    (and their term statistics) differ.
+    """
+    rng = random.Random(seed)
+    docs = []
+
+    for replica in range(scale):
+        for doc in base_docs:
+            content = doc["content"]
+            if replica:
+                sentences = re.split(r"(?<=[.?!।])\s+", content)
+                rng.shuffle(sentences)
+                kept = [s for s in sentences if rng.random() > 0.1] or sentences
+                content = " ".join(kept)
+            docs.append({"id": len(docs), "content": content})
+
+    return docs
+
+
+def _write_shards(docs, directory: str, n_shards: int):
+    per_shard = -(-len(docs) // n_shards)
+    for shard in range(n_shards):
+        part = docs[shard * per_shard:(shard + 1) * per_shard]
+        with open(os.path.join(directory, f"bench{shard}.json"), "w", encoding="utf-8") as f:
+            json.dump(part, f, ensure_ascii=False)
+
+
+def _bench_queries(base_docs, questions, n_queries: int, seed: int = 0):
+    """Labeled English questions plus random 2-4 term queries from the corpus."""
+    rng = random.Random(seed)
+    vocab = sorted({t for doc in base_docs for t in offline_rag.tokenize(doc["content"])})
+
+    queries = [q["question"] for q in questions if q["language"] == "en"]
+    while len(queries) < n_queries:
+        queries.append(" ".join(rng.sample(vocab, rng.randint(2, 4))))
+    return queries[:n_queries]
+
+
+def run_scale_benchmark(scales, n_queries: int, trace_memory: bool = False):
+    source = subject_files(VECTOR_DIR).get(SOURCE_SUBJECT)
+    if source is None:
+        raise FileNotFoundError(f"No chunk file for subject '{SOURCE_SUBJECT}' in {VECTOR_DIR}")
+    base_docs = list(iter_chunks(source))
+
+    queries = _bench_queries(base_docs, _load_questions(), n_queries)
+    results = []
+
+    for scale in scales:
+        docs = synthesize_corpus(base_docs, scale)
+        n_shards = min(scale, MAX_SHARDS)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            _write_shards(docs, tmp, n_shards)
+            files = offline_rag.scan_vector_dir(tmp)
+
+            if trace_memory:
+                tracemalloc.start()
+            rss_before = _rss_bytes()
+            start = time.perf_counter()
+
+            store = offline_rag.OfflineStore({
+                subject: offline_rag.SubjectFile(subject, path, signature)
+                for subject, (path, signature) in files.items()
+            })
+
+            build_time = time.perf_counter() - start
+            rss_after = _rss_bytes()
+            traced_peak = None
+            if trace_memory:
+                traced_peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+        tokenized = [offline_rag.tokenize(q) for q in queries]
+
+        single_ms = []
+        for terms in tokenized:
+            start = time.perf_counter()
+            store.keyword_search(terms, None, TOP_K)
+            single_ms.append((time.perf_counter() - start) * 1000)
+
+        batch = {}
+        if offline_rag.np is not None:
+            start = time.perf_counter()
+            store.keyword_search_batch(tokenized, None, TOP_K)
+            batch_total = (time.perf_counter() - start) * 1000
+            batch = {
+                "total_ms": round(batch_total, 3),
+                "per_query_ms": round(batch_total / len(tokenized), 4),
+            }
+
+        entry = {
+            "scale": scale,
+            "chunks": len(store.documents),
+            "shards": len(store.shards),
+            "terms": store.terms,
+            "build_time_s": round(build_time, 3),
+            "rss_delta_mb": (
+                round((rss_after - rss_before) / 2**20, 2)
+                if rss_before is not None and rss_after is not None else None
+            ),
+            "traced_peak_mb": round(traced_peak / 2**20, 2) if traced_peak else None,
+            "queries": len(queries),
+            "single": _percentiles(single_ms),
+            "batch": batch,
+        }
+        results.append(entry)
+
+        print(
+            f"[BENCH] {scale:>5}x  chunks={entry['chunks']:<7} build={entry['build_time_s']}s  "
+            f"rss+={entry['rss_delta_mb']}MB  p50={entry['single']['p50_ms']}ms  "
+            f"p95={entry['single']['p95_ms']}ms  p99={entry['single']['p99_ms']}ms"
+        )
+
+        del store
+
+    return results
+
+
+# =========================
+# RELEVANCE SUITE
+# =========================
+def run_relevance(ks=RECALL_AT):
+    """recall@k and MRR per language over the labeled question set."""
+    questions = _load_questions()
+    depth = max(ks)
+    per_language = {}
+
+    files = {**offline_rag.scan_vector_dir(), **offline_rag.scan_vector_dir(RELEVANCE_CORPUS_DIR)}
+    store = offline_rag.OfflineStore({
+        subject: offline_rag.SubjectFile(subject, path, signature)
+        for subject, (path, signature) in files.items()
+    })
+
+    for item in questions:
+        hits, coverage = offline_rag._search(store, item["question"], top_k=depth)
+        chunks, _ = offline_rag._top_documents(store, hits, coverage)
+        ranked = [f"{doc['subject']}:{doc['id']}" for doc in chunks]
+        relevant = set(item["relevant"])
+
+        stats = per_language.setdefault(item["language"], {
+            "n": 0, "mrr": 0.0, **{f"recall@{k}": 0.0 for k in ks}
+        })
+        stats["n"] += 1
+        for k in ks:
+            stats[f"recall@{k}"] += len(relevant.intersection(ranked[:k])) / len(relevant)
+        for rank, doc_id in enumerate(ranked, start=1):
+            if doc_id in relevant:
+                stats["mrr"] += 1.0 / rank
+                break
+
+    for language, stats in per_language.items():
+        n = stats["n"]
+        for key in stats:
+            if key != "n":
+                stats[key] = round(stats[key] / n, 4)
+        print(
+            f"[RELEVANCE] {language}: n={n}  MRR={stats['mrr']}  "
+            + "  ".join(f"R@{k}={stats[f'recall@{k}']}" for k in ks)
+        )
+
+    return per_language
+
+
+# =========================
+# MAIN
+# =========================
+def main():
+    parser = argparse.ArgumentParser(description="Offline RAG benchmark and relevance suite")
+    parser.add_argument("--scales", default="1,10,100,1000", help="Comma-separated corpus multiples")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per scale")
+    parser.add_argument("--skip-scale", action="store_true", help="Only run the relevance suite")
+    parser.add_argument("--skip-relevance", action="store_true", help="Only run the scale benchmark")
+    parser.add_argument("--tracemalloc", action="store_true", help="Also trace Python heap peak during build (slower)")
+    parser.add_argument("--output", help="Result JSON path (default: benchmarks/results/rag-<commit>-<time>.json)")
+    args = parser.parse_args()
+
+    commit = _git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "top_k": TOP_K,
+        "numpy": offline_rag.np is not None,
+    }
+
+    if not args.skip_scale:
+        scales = [int(s) for s in args.scales.split(",") if s.strip()]
+        report["scale"] = run_scale_benchmark(scales, args.queries, args.tracemalloc)
+
+    if not args.skip_relevance:
+        report["relevance"] = run_relevance()
+        report["retrieval_stats"] = offline_rag.get_retrieval_stats()
+
+    output = Path(args.output) if args.output else (
+        RESULTS_DIR / f"rag-{commit}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"\n✅ Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,411 @@
+"""
+vector_store chunk files: discovery, streaming reads and atomic writes.
+
+A subject's chunks live in one of:
+
+  <subject>.chunks  binary store, memory-mapped; chunks are decoded on access
+  <subject>.jsonl   one chunk object per line, read line by line
+  <subject>.json    the original JSON array
+
+Binary layout (little-endian):
+
+  header    32 bytes: magic, version, flags, chunk count, block count,
+            chunks per block, subject count, subject table size
+  stats     24 bytes (version 2): crc32 of the chunk texts, analyzer
+            version, keyword section offset and size (0: none)
+  subjects  JSON list of subject names (UTF-8)
+  entries   per chunk: u64 offset, u32 length, u32 subject index, u32 chunk id
+  blocks    per block (zlib flag only): u64 offset, u32 stored size, u32 raw size
+  blob      UTF-8 chunk texts; with the zlib flag, compressed in blocks of
+            `chunks per block` chunks and entry offsets are within the block
+  keyword   (version 2, 8-byte aligned) BM25 postings built at write time:
+            u32 term count, u32 vocabulary size, u64 posting count; the
+            vocabulary ("\n"-joined terms); u32 term count per chunk; u64
+            postings start per term (+ end); u32 doc ids; u32 term
+            frequencies. Vocabulary and doc lengths are padded to 8 bytes.
+
+Opening a .chunks file reads only the header and subject table; the
+pages of the mmap live in the OS page cache and are shared by every
+process that maps the file. The keyword section and checksum let
+offline_rag and dense_retriever skip decoding every chunk at load time.
+
+Convert existing files:
+    python chunk_store.py                     # every vector_store/*.json(l)
+    python chunk_store.py --compress science.json
+    python chunk_store.py science.chunks      # rewrite, e.g. a version 1 file
+"""
+
+import argparse
+import json
+import mmap
+import os
+import shutil
+import struct
+import sys
+import time
+import zlib
+from array import array
+from collections import Counter
+from functools import lru_cache
+
+from analyzer import ANALYZER_VERSION, analyze
+
+# Preferred first: if several exist for a subject, the binary store wins
+CHUNK_SUFFIXES = (".chunks", ".jsonl", ".json")
+
+MAGIC = b"TUTCHUNK"
+VERSION = 2
+FLAG_ZLIB = 1
+
+HEADER = struct.Struct("<8sHHIIIII")
+STATS = struct.Struct("<IIQQ")
+ENTRY = struct.Struct("<QIII")
+BLOCK = struct.Struct("<QII")
+KEYWORD = struct.Struct("<IIQ")
+
+# Chunks per zlib block: larger blocks compress better, smaller ones make
+# decoding a single top-K chunk cheaper
+BLOCK_CHUNKS = 32
+# Decompressed blocks kept per open file
+BLOCK_CACHE = 16
+
+
+def _pad8(size: int) -> int:
+    return -size % 8
+
+
+def _little_endian(values: array) -> bytes:
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def subject_files(vector_dir) -> dict:
+    """Map subject -> chunk file path for every chunk file in vector_dir."""
+    files = {}
+    for file in sorted(os.listdir(vector_dir)):
+        subject, suffix = os.path.splitext(file)
+        if suffix not in CHUNK_SUFFIXES:
+            continue
+        current = files.get(subject)
+        if current is None or CHUNK_SUFFIXES.index(suffix) < CHUNK_SUFFIXES.index(os.path.splitext(current)[1]):
+            files[subject] = os.path.join(vector_dir, file)
+    return files
+
+
+def iter_chunks(path: str):
+    """Yield the chunk dicts of one .chunks, .json or .jsonl file."""
+    if path.endswith(".chunks"):
+        yield from ChunkFile(path)
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from json.load(f)
+
+
+class JsonlWriter:
+    """
+    Append chunks to <path>.tmp and rename it over path on a clean exit,
+    so readers (and the reload watcher) never see a half-written file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp_path = f"{path}.tmp"
+        self.count = 0
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.tmp_path, "w", encoding="utf-8")
+        return self
+
+    def write(self, chunk: dict):
+        self._file.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+        self.count += 1
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.close()
+        if exc_type is None:
+            os.replace(self.tmp_path, self.path)
+        else:
+            os.remove(self.tmp_path)
+        return False
+
+
+# =========================
+# BINARY STORE
+# =========================
+class ChunkFile:
+    """
+    Read-only, memory-mapped .chunks file that behaves like a list of
+    {"subject", "id", "content"} dicts; each access decodes one chunk.
+    """
+
+    def __init__(self, path: str, subject: str = None):
+        self.path = path
+        self._subject = subject
+
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mm) < HEADER.size:
+            raise ValueError(f"Truncated chunk store: {path}")
+        (magic, version, flags, self._count, n_blocks, self.block_chunks,
+         _, subjects_bytes) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version not in (1, VERSION):
+            raise ValueError(f"Not a version 1-{VERSION} chunk store: {path}")
+
+        # crc32 of the chunk texts (as dense_retriever.content_checksum),
+        # None for version 1 files
+        self.checksum = None
+        self.analyzer_version = None
+        self._keyword = self._keyword_bytes = 0
+        subjects = HEADER.size
+        if version >= 2:
+            (self.checksum, self.analyzer_version, self._keyword,
+             self._keyword_bytes) = STATS.unpack_from(self._mm, HEADER.size)
+            subjects += STATS.size
+
+        self.compressed = bool(flags & FLAG_ZLIB)
+        self.subjects = json.loads(self._mm[subjects:subjects + subjects_bytes].decode("utf-8"))
+        self._entries = subjects + subjects_bytes
+        self._blocks = self._entries + self._count * ENTRY.size
+        self._blob = self._blocks + n_blocks * BLOCK.size
+        self.nbytes = len(self._mm)
+
+        if self.compressed:
+            self._raw_block = lru_cache(maxsize=BLOCK_CACHE)(self._raw_block)
+
+    def __len__(self):
+        return self._count
+
+    def _raw_block(self, block: int) -> bytes:
+        offset, stored, raw = BLOCK.unpack_from(self._mm, self._blocks + block * BLOCK.size)
+        start = self._blob + offset
+        return zlib.decompress(self._mm[start:start + stored], bufsize=raw)
+
+    def text(self, index: int) -> str:
+        offset, length, _, _ = ENTRY.unpack_from(self._mm, self._entries + index * ENTRY.size)
+        if self.compressed:
+            data = self._raw_block(index // self.block_chunks)
+            return data[offset:offset + length].decode("utf-8")
+        start = self._blob + offset
+        return self._mm[start:start + length].decode("utf-8")
+
+    def __getitem__(self, index: int) -> dict:
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        _, _, subject, chunk_id = ENTRY.unpack_from(self._mm, self._entries + index * ENTRY.size)
+        return {
+            "subject": self._subject or self.subjects[subject],
+            "id": chunk_id,
+            "content": self.text(index),
+        }
+
+    def __iter__(self):
+        for index in range(self._count):
+            yield self[index]
+
+    def keyword_index(self):
+        """
+        Stored BM25 postings, or None if the file has none or they were
+        built by another analyzer version. Returns a dict with "terms"
+        (list) and zero-copy views of the mmap: "doc_lengths" (u32 per
+        chunk), "indptr" (u64 per term + 1), "doc_ids" and "tfs" (u32 per
+        posting; a term's postings are doc_ids[indptr[i]:indptr[i + 1]]).
+        """
+        if not self._keyword_bytes or self.analyzer_version != ANALYZER_VERSION:
+            return None
+
+        offset = self._keyword
+        n_terms, vocab_bytes, n_postings = KEYWORD.unpack_from(self._mm, offset)
+        offset += KEYWORD.size
+        vocab = self._mm[offset:offset + vocab_bytes].decode("utf-8")
+        offset += vocab_bytes + _pad8(vocab_bytes)
+
+        view = memoryview(self._mm)
+        sections = {}
+        for name, size in (("doc_lengths", 4 * self._count), ("indptr", 8 * (n_terms + 1)),
+                           ("doc_ids", 4 * n_postings), ("tfs", 4 * n_postings)):
+            sections[name] = view[offset:offset + size]
+            offset += size + (_pad8(size) if name == "doc_lengths" else 0)
+
+        return {"terms": vocab.split("\n") if n_terms else [], **sections}
+
+    def close(self):
+        self._mm.close()
+
+
+class ChunkFileWriter:
+    """
+    Stream chunks into a .chunks file. Texts go to a side file as they
+    arrive (only the 20-byte entries and, with keyword_index, the compact
+    postings stay in memory); on a clean exit the header, tables, blob
+    and keyword section are assembled into <path>.tmp, which is then
+    renamed over path.
+    """
+
+    def __init__(self, path: str, subject: str = None, compress: bool = False,
+                 block_chunks: int = BLOCK_CHUNKS, keyword_index: bool = True):
+        self.path = path
+        self.tmp_path = f"{path}.tmp"
+        self.blob_path = f"{path}.blob.tmp"
+        self.subject = subject or os.path.splitext(os.path.basename(path))[0]
+        self.compress = compress
+        self.block_chunks = block_chunks if compress else 0
+        self.count = 0
+        self.checksum = 0
+
+        # term -> (doc ids, term frequencies), in first-seen term order
+        self._postings = {} if keyword_index else None
+        self._doc_lengths = array("I")
+        self._subjects = {}
+        self._entries = bytearray()
+        self._blocks = bytearray()
+        self._pending = bytearray()
+        self._blob = None
+        self._blob_size = 0
+
+    def __enter__(self):
+        self._blob = open(self.blob_path, "w+b")
+        return self
+
+    def write(self, chunk: dict):
+        data = chunk["content"].encode("utf-8")
+        subject = self._subjects.setdefault(chunk.get("subject", self.subject), len(self._subjects))
+        chunk_id = chunk.get("id", self.count)
+        self.checksum = zlib.crc32(data, self.checksum)
+
+        if self._postings is not None:
+            counts = Counter(analyze(chunk["content"]))
+            self._doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = (array("I"), array("I"))
+                postings[0].append(self.count)
+                postings[1].append(tf)
+
+        if self.compress:
+            self._entries += ENTRY.pack(len(self._pending), len(data), subject, chunk_id)
+            self._pending += data
+        else:
+            self._entries += ENTRY.pack(self._blob_size, len(data), subject, chunk_id)
+            self._blob.write(data)
+            self._blob_size += len(data)
+
+        self.count += 1
+        if self.compress and self.count % self.block_chunks == 0:
+            self._flush_block()
+
+    def _flush_block(self):
+        if not self._pending:
+            return
+        stored = zlib.compress(bytes(self._pending), 6)
+        self._blocks += BLOCK.pack(self._blob_size, len(stored), len(self._pending))
+        self._blob.write(stored)
+        self._blob_size += len(stored)
+        self._pending = bytearray()
+
+    def _assemble(self):
+        if self.compress:
+            self._flush_block()
+
+        names = sorted(self._subjects, key=self._subjects.get) or [self.subject]
+        subjects = json.dumps(names, ensure_ascii=False).encode("utf-8")
+        header = HEADER.pack(
+            MAGIC, VERSION, FLAG_ZLIB if self.compress else 0, self.count,
+            len(self._blocks) // BLOCK.size, self.block_chunks, len(names), len(subjects)
+        )
+
+        end = HEADER.size + STATS.size + len(subjects) + len(self._entries) + len(self._blocks) + self._blob_size
+        keyword, keyword_bytes = end + _pad8(end), 0
+        if self._postings is not None:
+            vocab = "\n".join(self._postings).encode("utf-8")
+            n_postings = sum(len(ids) for ids, _ in self._postings.values())
+            lengths = 4 * self.count
+            keyword_bytes = (KEYWORD.size + len(vocab) + _pad8(len(vocab)) + lengths + _pad8(lengths)
+                             + 8 * (len(self._postings) + 1) + 8 * n_postings)
+
+        with open(self.tmp_path, "wb") as out:
+            out.write(header)
+            out.write(STATS.pack(self.checksum, ANALYZER_VERSION, keyword if keyword_bytes else 0, keyword_bytes))
+            out.write(subjects)
+            out.write(self._entries)
+            out.write(self._blocks)
+            self._blob.seek(0)
+            shutil.copyfileobj(self._blob, out)
+            if keyword_bytes:
+                out.write(bytes(keyword - end))
+                self._write_keyword(out, vocab, n_postings)
+        os.replace(self.tmp_path, self.path)
+
+    def _write_keyword(self, out, vocab: bytes, n_postings: int):
+        out.write(KEYWORD.pack(len(self._postings), len(vocab), n_postings))
+        out.write(vocab + bytes(_pad8(len(vocab))))
+        out.write(_little_endian(self._doc_lengths) + bytes(_pad8(4 * self.count)))
+
+        indptr = array("Q", [0])
+        for ids, _ in self._postings.values():
+            indptr.append(indptr[-1] + len(ids))
+        out.write(_little_endian(indptr))
+        for ids, _ in self._postings.values():
+            out.write(_little_endian(ids))
+        for _, tfs in self._postings.values():
+            out.write(_little_endian(tfs))
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self._assemble()
+        finally:
+            self._blob.close()
+            os.remove(self.blob_path)
+            if os.path.exists(self.tmp_path):
+                os.remove(self.tmp_path)
+        return False
+
+
+def convert(path: str, compress: bool = False) -> str:
+    """Write <subject>.chunks next to a .json/.jsonl chunk file; returns its path."""
+    output = os.path.splitext(path)[0] + ".chunks"
+    with ChunkFileWriter(output, compress=compress) as writer:
+        for chunk in iter_chunks(path):
+            writer.write(chunk)
+    return output
+
+
+# =========================
+# MAIN
+# =========================
+if __name__ == "__main__":
+    from config import VECTOR_DIR
+
+    parser = argparse.ArgumentParser(description="Convert vector_store JSON/JSONL chunk files to .chunks")
+    parser.add_argument("paths", nargs="*", help="Files to convert (default: every vector_store/*.json(l))")
+    parser.add_argument("--compress", action="store_true", help="zlib-compress the text in blocks")
+    args = parser.parse_args()
+
+    paths = args.paths or [
+        os.path.join(VECTOR_DIR, file) for file in sorted(os.listdir(VECTOR_DIR))
+        if file.endswith((".json", ".jsonl"))
+    ]
+
+    for path in paths:
+        start = time.perf_counter()
+        output = convert(path, args.compress)
+        chunk_file = ChunkFile(output)
+        print(
+            f"✅ {os.path.basename(path)} -> {os.path.basename(output)}: {len(chunk_file)} chunks, "
+            f"{os.path.getsize(path) / 1024:.1f} KiB -> {chunk_file.nbytes / 1024:.1f} KiB "
+            f"in {time.perf_counter() - start:.3f}s"
+        )
+        chunk_file.close()
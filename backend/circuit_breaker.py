@@ -0,0 +1,147 @@
+"""
+Circuit breaker for upstream (online model) endpoints.
+
+States:
+- closed:    requests flow; outcomes are tracked over a rolling window
+- open:      too many failures or slow calls; requests skip the endpoint
+- half_open: a background probe is checking whether it recovered
+
+A background thread probes an open endpoint every cooldown seconds and
+closes the circuit on the first successful probe, so live traffic never
+pays for testing a dead upstream.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+from config import (
+    BREAKER_WINDOW,
+    BREAKER_MIN_CALLS,
+    BREAKER_ERROR_RATE,
+    BREAKER_SLOW_CALL_SECONDS,
+    BREAKER_COOLDOWN,
+)
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Tracks error rate and latency for one endpoint and gates requests."""
+
+    def __init__(self, name: str, probe=None,
+                 window: int = BREAKER_WINDOW,
+                 min_calls: int = BREAKER_MIN_CALLS,
+                 error_rate: float = BREAKER_ERROR_RATE,
+                 slow_call_seconds: float = BREAKER_SLOW_CALL_SECONDS,
+                 cooldown: float = BREAKER_COOLDOWN):
+        self.name = name
+        self.probe = probe
+        self.min_calls = min_calls
+        self.error_rate_threshold = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.cooldown = cooldown
+
+        self.state = CLOSED
+        self.opened_at = None
+        self.reason = None
+        self.last_error = None
+        self.total_calls = 0
+        self.total_failures = 0
+        self.times_opened = 0
+
+        # (ok, latency_seconds) for the most recent calls
+        self._outcomes = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        return self.state == CLOSED
+
+    def record_success(self, latency: float):
+        # A call slower than slow_call_seconds counts against the endpoint
+        self._record(latency <= self.slow_call_seconds, latency, None)
+
+    def record_failure(self, latency: float, error: Exception):
+        self._record(False, latency, error)
+
+    def _record(self, ok: bool, latency: float, error):
+        with self._lock:
+            self._outcomes.append((ok, latency))
+            self.total_calls += 1
+            if not ok:
+                self.total_failures += 1
+                self.last_error = str(error) if error else f"slow call ({latency:.2f}s)"
+
+            if self.state != CLOSED or len(self._outcomes) < self.min_calls:
+                return
+
+            rate = self._error_rate()
+            if rate >= self.error_rate_threshold:
+                self._open(f"error rate {rate:.0%} over last {len(self._outcomes)} calls")
+
+    def _error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return sum(1 for ok, _ in self._outcomes if not ok) / len(self._outcomes)
+
+    def _open(self, reason: str):
+        # Caller holds the lock
+        self.state = OPEN
+        self.opened_at = time.time()
+        self.reason = reason
+        self.times_opened += 1
+        logger.warning("Circuit OPEN for %s: %s; probing every %ss", self.name, reason, self.cooldown)
+
+        thread = threading.Thread(target=self._probe_loop, name=f"breaker-probe-{self.name}", daemon=True)
+        thread.start()
+
+    def _close(self):
+        with self._lock:
+            self.state = CLOSED
+            self.opened_at = None
+            self.reason = None
+            self._outcomes.clear()
+        logger.info("Circuit CLOSED for %s: probe succeeded", self.name)
+
+    def _probe_loop(self):
+        while True:
+            time.sleep(self.cooldown)
+
+            with self._lock:
+                self.state = HALF_OPEN
+
+            try:
+                if self.probe is not None:
+                    self.probe()
+            except Exception as e:
+                with self._lock:
+                    self.state = OPEN
+                    self.opened_at = time.time()
+                    self.last_error = str(e)
+                logger.warning("Circuit still OPEN for %s: probe failed: %s", self.name, e)
+                continue
+
+            self._close()
+            return
+
+    def status(self) -> dict:
+        with self._lock:
+            latencies = [latency for _, latency in self._outcomes]
+            return {
+                "name": self.name,
+                "state": self.state,
+                "reason": self.reason,
+                "opened_at": self.opened_at,
+                "error_rate": round(self._error_rate(), 3),
+                "avg_latency": round(sum(latencies) / len(latencies), 3) if latencies else None,
+                "window_calls": len(self._outcomes),
+                "total_calls": self.total_calls,
+                "total_failures": self.total_failures,
+                "times_opened": self.times_opened,
+                "last_error": self.last_error,
+            }
@@ -32,6 +32,25 @@ CHUNK_MAX_CHARS = int(os.getenv("CHUNK_MAX_CHARS", "2000"))
 CHUNK_NEW_AFTER = int(os.getenv("CHUNK_NEW_AFTER", "1500"))
 CHUNK_COMBINE_UNDER = int(os.getenv("CHUNK_COMBINE_UNDER", "500"))
 
+# ingest.py splits each PDF into page ranges of INGEST_PAGES_PER_TASK pages
+# and partitions them in INGEST_WORKERS processes (0 = one per CPU)
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "0"))
+INGEST_PAGES_PER_TASK = int(os.getenv("INGEST_PAGES_PER_TASK", "8"))
+
+# Per-page strategy routing: pages with fewer than INGEST_MIN_TEXT_CHARS
+# text-layer characters and some images (or text quality below
+# INGEST_MIN_TEXT_QUALITY) are OCRed; pages whose images cover
+# INGEST_HI_RES_IMAGE_COVERAGE of the page go to hi_res; all other pages,
+# short text-only ones included, use the fast text strategy
+INGEST_MIN_TEXT_CHARS = int(os.getenv("INGEST_MIN_TEXT_CHARS", "50"))
+INGEST_MIN_TEXT_QUALITY = float(os.getenv("INGEST_MIN_TEXT_QUALITY", "0.85"))
+INGEST_HI_RES_IMAGE_COVERAGE = float(os.getenv("INGEST_HI_RES_IMAGE_COVERAGE", "0.3"))
+
+# Chunk file written by ingest.py: "binary" (memory-mapped <subject>.chunks,
+# optionally zlib-compressed per block) or "jsonl"
+CHUNK_STORE_FORMAT = os.getenv("CHUNK_STORE_FORMAT", "binary")
+CHUNK_STORE_COMPRESS = os.getenv("CHUNK_STORE_COMPRESS", "false").lower() == "true"
+
 # =========================
 # ONLINE MODEL (Groq)
 # =========================
@@ -43,6 +62,72 @@ ONLINE_TEMPERATURE = float(os.getenv("ONLINE_TEMPERATURE", "0.3"))
 ONLINE_TOP_P = float(os.getenv("ONLINE_TOP_P", "0.9"))
 ONLINE_MAX_TOKENS = int(os.getenv("ONLINE_MAX_TOKENS", "1024"))
 
+# Shared HTTP transport for all online endpoints (HTTP/2 needs the h2 package)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30.0"))
+HTTP2 = os.getenv("HTTP2", "false").lower() == "true"
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5.0"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30.0"))
+HTTP_WRITE_TIMEOUT = float(os.getenv("HTTP_WRITE_TIMEOUT", "10.0"))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "5.0"))
+
+# Total seconds a request may spend in the router; each online call gets
+# whatever is left of it as its timeout
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "30.0"))
+
+# Async router: seconds to wait for the online model before answering
+# from the (concurrently computed) offline RAG result
+ONLINE_LATENCY_BUDGET = float(os.getenv("ONLINE_LATENCY_BUDGET", "8.0"))
+
+# Concurrent requests with the same normalized (question, language) share
+# one online/offline computation
+SINGLEFLIGHT = os.getenv("SINGLEFLIGHT", "true").lower() == "true"
+
+# /predict/stream: switch to the offline answer if the online stream goes
+# this many seconds without a token (the first token gets
+# ONLINE_LATENCY_BUDGET)
+STREAM_STALL_TIMEOUT = float(os.getenv("STREAM_STALL_TIMEOUT", "5.0"))
+
+# /predict/batch: at most BATCH_CONCURRENCY online calls in flight per
+# batch, and at most BATCH_MAX_ITEMS questions per request
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+
+# online_first: always ask the online model (hedged by offline RAG)
+# confidence_gated: retrieve first; answer offline when retrieval
+#   confidence >= OFFLINE_ANSWER_THRESHOLD, else call the online model
+#   with the retrieved chunks (up to ONLINE_CONTEXT_CHARS) as context
+ROUTING_POLICY = os.getenv("ROUTING_POLICY", "online_first")
+OFFLINE_ANSWER_THRESHOLD = float(os.getenv("OFFLINE_ANSWER_THRESHOLD", "0.8"))
+ONLINE_CONTEXT_CHARS = int(os.getenv("ONLINE_CONTEXT_CHARS", "3000"))
+
+# Failover pool: comma-separated base URLs tried in order. Keys pair with
+# URLs by position; a single key is reused for every URL.
+GROQ_BASE_URLS = [
+    url.strip() for url in (os.getenv("GROQ_BASE_URLS") or GROQ_BASE_URL).split(",") if url.strip()
+]
+GROQ_API_KEYS = [
+    key.strip()
+    for key in (os.getenv("GROQ_API_KEYS") or GROQ_API_KEY or os.getenv("OPENAI_API_KEY") or "").split(",")
+    if key.strip()
+]
+
+# =========================
+# CIRCUIT BREAKER (per online endpoint)
+# =========================
+# Rolling window of recent calls used for the error rate
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+# Minimum calls in the window before the circuit may open
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+# Failure fraction (errors + slow calls) that opens the circuit
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+# Successful calls slower than this count as failures
+BREAKER_SLOW_CALL_SECONDS = float(os.getenv("BREAKER_SLOW_CALL_SECONDS", "10.0"))
+# Seconds between background probes of an open endpoint
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "30.0"))
+BREAKER_PROBE_TIMEOUT = float(os.getenv("BREAKER_PROBE_TIMEOUT", "5.0"))
+
 # =========================
 # RAG CONFIGURATION
 # =========================
@@ -51,6 +136,47 @@ TOP_K = int(os.getenv("TOP_K", "3"))
 ONLINE_CONFIDENCE = float(os.getenv("ONLINE_CONFIDENCE", "0.92"))
 OFFLINE_CONFIDENCE_BASE = float(os.getenv("OFFLINE_CONFIDENCE_BASE", "0.75"))
 
+# Load the offline index in a background thread at API startup
+# (otherwise it is loaded on the first offline request)
+OFFLINE_WARMUP = os.getenv("OFFLINE_WARMUP", "true").lower() == "true"
+
+# Poll vector_store for re-ingested files every N seconds (0 disables)
+VECTOR_RELOAD_INTERVAL = float(os.getenv("VECTOR_RELOAD_INTERVAL", "10"))
+
+# Offline answers are composed from the best sentences of the top chunks,
+# up to ANSWER_CHAR_BUDGET characters; ANSWER_QUERY_WEIGHT balances query
+# similarity against TextRank centrality when scoring sentences
+ANSWER_CHAR_BUDGET = int(os.getenv("ANSWER_CHAR_BUDGET", "600"))
+ANSWER_QUERY_WEIGHT = float(os.getenv("ANSWER_QUERY_WEIGHT", "0.7"))
+
+# Each vector_store/<subject>.json is its own index shard. Unfiltered
+# queries search at most SHARD_MAX_SHARDS shards (0 = all that match),
+# using SHARD_SEARCH_THREADS threads (0/1 = sequential with early stop)
+SHARD_MAX_SHARDS = int(os.getenv("SHARD_MAX_SHARDS", "0"))
+SHARD_SEARCH_THREADS = int(os.getenv("SHARD_SEARCH_THREADS", "0"))
+
+# =========================
+# DENSE RETRIEVAL (optional, faiss-cpu)
+# =========================
+DENSE_RETRIEVAL = os.getenv("DENSE_RETRIEVAL", "false").lower() == "true"
+
+# Local sentence-transformers model directory; if missing, a deterministic
+# hashing embedder of EMBEDDING_DIM dimensions is used instead
+EMBEDDING_MODEL_DIR = os.getenv("EMBEDDING_MODEL_DIR", str(BASE_DIR / "models" / "embedder"))
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "384"))
+
+# auto | flat | ivf_sq8 | ivf_pq | hnsw  ("auto" = flat up to DENSE_FLAT_MAX chunks)
+DENSE_INDEX_TYPE = os.getenv("DENSE_INDEX_TYPE", "auto")
+DENSE_FLAT_MAX = int(os.getenv("DENSE_FLAT_MAX", "20000"))
+DENSE_NPROBE = int(os.getenv("DENSE_NPROBE", "8"))
+
+# Candidates taken from each retriever before reciprocal-rank fusion
+DENSE_FUSION_DEPTH = int(os.getenv("DENSE_FUSION_DEPTH", "20"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Dense hits the keyword retriever did not find are dropped below this
+# cosine similarity, so off-topic queries still get no results
+DENSE_MIN_SIMILARITY = float(os.getenv("DENSE_MIN_SIMILARITY", "0.2"))
+
 # =========================
 # API SERVER
 # =========================
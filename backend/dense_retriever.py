@@ -0,0 +1,308 @@
+"""
+Optional dense retrieval for the offline RAG (CPU-only, faiss).
+
+At ingest time every vector_store/<subject>.json(l) gets a sibling
+<subject>.faiss index plus a <subject>.faiss.meta JSON file describing
+how it was built. offline_rag loads them when DENSE_RETRIEVAL is on and
+fuses dense and keyword rankings with reciprocal-rank fusion.
+
+Embeddings come from a local sentence-transformers model directory
+(EMBEDDING_MODEL_DIR) or, when that is missing, a deterministic hashing
+embedder that needs no model files.
+
+Build indexes for the current vector_store:
+    python dense_retriever.py
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+import zlib
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+from config import (
+    VECTOR_DIR,
+    EMBEDDING_MODEL_DIR,
+    EMBEDDING_DIM,
+    DENSE_INDEX_TYPE,
+    DENSE_FLAT_MAX,
+    DENSE_NPROBE,
+    RRF_K,
+)
+from analyzer import analyze
+from chunk_store import iter_chunks, subject_files
+
+logger = logging.getLogger(__name__)
+
+DENSE_INDEX_SUFFIX = ".faiss"
+DENSE_META_SUFFIX = ".faiss.meta"
+
+
+def dense_available() -> bool:
+    """True if numpy and faiss are importable."""
+    return np is not None and faiss is not None
+
+
+# =========================
+# EMBEDDERS
+# =========================
+class HashingEmbedder:
+    """
+    Deterministic feature-hashing embedder.
+
+    Analyzer terms and their character trigrams are hashed (crc32, so
+    results are stable across processes) into a signed vector, then
+    L2-normalized. Meant for tests and air-gapped boxes without a model.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str):
+        for term in analyze(text):
+            yield term, 1.0
+            padded = f"<{term}>"
+            for i in range(len(padded) - 2):
+                yield padded[i:i + 3], 0.5
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                h = zlib.crc32(feature.encode("utf-8"))
+                sign = -1.0 if h & 0x80000000 else 1.0
+                vectors[row, h % self.dim] += sign * weight
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class SentenceTransformerEmbedder:
+    """sentence-transformers model loaded from a local directory, on CPU."""
+
+    def __init__(self, model_dir: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_dir, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f"st:{os.path.basename(os.path.normpath(model_dir))}"
+
+    def embed(self, texts):
+        vectors = self.model.encode(
+            list(texts),
+            batch_size=32,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        return vectors.astype(np.float32)
+
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    """Shared embedder: local model if EMBEDDING_MODEL_DIR exists, else hashing."""
+    global _embedder
+
+    if _embedder is not None:
+        return _embedder
+
+    with _embedder_lock:
+        if _embedder is None:
+            embedder = None
+            if os.path.isdir(EMBEDDING_MODEL_DIR):
+                try:
+                    embedder = SentenceTransformerEmbedder(EMBEDDING_MODEL_DIR)
+                except Exception as e:
+                    logger.warning("Could not load embedding model from %s: %s", EMBEDDING_MODEL_DIR, e)
+            if embedder is None:
+                embedder = HashingEmbedder()
+            logger.info("Dense embedder: %s (%d dims)", embedder.name, embedder.dim)
+            _embedder = embedder
+
+    return _embedder
+
+
+def content_checksum(documents) -> int:
+    """
+    crc32 over chunk contents; detects a .faiss index built for other data.
+    A .chunks store carries it in its header, so it is not recomputed.
+    """
+    stored = getattr(documents, "checksum", None)
+    if stored is not None:
+        return stored
+
+    checksum = 0
+    for doc in documents:
+        checksum = zlib.crc32(doc["content"].encode("utf-8"), checksum)
+    return checksum
+
+
+# =========================
+# INDEX BUILD
+# =========================
+def _factory_string(n_vectors: int, dim: int) -> str:
+    kind = DENSE_INDEX_TYPE
+    if kind == "auto":
+        kind = "flat" if n_vectors <= DENSE_FLAT_MAX else "ivf_sq8"
+
+    # ~4*sqrt(n) lists, but keep >= 39 training points per list
+    nlist = max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+
+    if kind == "flat":
+        return "Flat"
+    if kind == "ivf_sq8":
+        return f"IVF{nlist},SQ8"
+    if kind == "ivf_pq":
+        m = next(m for m in (64, 48, 32, 24, 16, 12, 8, 4, 2, 1) if dim % m == 0)
+        # 2**nbits centroids per sub-quantizer, again ~39 training points each
+        nbits = 8
+        while nbits > 4 and n_vectors < 39 * 2 ** nbits:
+            nbits -= 1
+        return f"IVF{nlist},PQ{m}x{nbits}"
+    if kind == "hnsw":
+        return "HNSW32"
+
+    raise ValueError(f"Unknown DENSE_INDEX_TYPE: {DENSE_INDEX_TYPE}")
+
+
+def _index_paths(json_path: str):
+    base = os.path.splitext(json_path)[0]
+    return base + DENSE_INDEX_SUFFIX, base + DENSE_META_SUFFIX
+
+
+def build_dense_index(json_path: str, documents=None, embedder=None) -> dict:
+    """
+    Embed the chunks of one subject file and persist a faiss index next to it.
+
+    Returns the metadata written to <subject>.faiss.meta.
+    """
+    if not dense_available():
+        raise RuntimeError("Dense retrieval needs numpy and faiss-cpu installed.")
+
+    if documents is None:
+        documents = list(iter_chunks(json_path))
+
+    embedder = embedder or get_embedder()
+    index_path, meta_path = _index_paths(json_path)
+
+    start = time.perf_counter()
+    vectors = embedder.embed([doc["content"] for doc in documents])
+    embed_time = time.perf_counter() - start
+
+    factory = _factory_string(len(documents), embedder.dim)
+    index = faiss.index_factory(embedder.dim, factory, faiss.METRIC_INNER_PRODUCT)
+    if len(documents) and not index.is_trained:
+        index.train(vectors)
+    if len(documents):
+        index.add(vectors)
+
+    faiss.write_index(index, index_path)
+
+    meta = {
+        "embedder": embedder.name,
+        "dim": embedder.dim,
+        "count": len(documents),
+        "checksum": content_checksum(documents),
+        "factory": factory,
+        "bytes": os.path.getsize(index_path),
+        "embed_time": round(embed_time, 3),
+        "build_time": round(time.perf_counter() - start, 3),
+    }
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    logger.info(
+        "Dense index %s: %d vectors, %s, %.1f KiB, built in %ss",
+        os.path.basename(index_path), meta["count"], factory, meta["bytes"] / 1024, meta["build_time"]
+    )
+    return meta
+
+
+# =========================
+# QUERY TIME
+# =========================
+class DenseSubjectIndex:
+    """A loaded faiss index for one subject file."""
+
+    def __init__(self, index, meta: dict):
+        self.index = index
+        self.meta = meta
+        self.bytes = meta.get("bytes", 0)
+
+    def search(self, vectors, k: int):
+        """Batch inner-product search. Returns (scores, local_ids) arrays."""
+        k = min(k, self.index.ntotal)
+        if k <= 0:
+            empty = np.empty((len(vectors), 0))
+            return empty, empty.astype(np.int64)
+        return self.index.search(vectors, k)
+
+
+def load_dense_index(json_path: str, documents):
+    """
+    Load the faiss index built for json_path, or None if missing or stale.
+
+    An index is stale when its chunk count, content checksum or embedder
+    no longer match what offline_rag has loaded.
+    """
+    if not dense_available():
+        return None
+
+    index_path, meta_path = _index_paths(json_path)
+    if not (os.path.exists(index_path) and os.path.exists(meta_path)):
+        return None
+
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+
+    embedder = get_embedder()
+    if (meta.get("count") != len(documents)
+            or meta.get("checksum") != content_checksum(documents)
+            or meta.get("embedder") != embedder.name):
+        logger.warning("Ignoring stale dense index %s; re-run: python dense_retriever.py", index_path)
+        return None
+
+    index = faiss.read_index(index_path)
+    if hasattr(index, "nprobe"):
+        index.nprobe = DENSE_NPROBE
+
+    return DenseSubjectIndex(index, meta)
+
+
+def reciprocal_rank_fusion(rankings, top_k: int, k: int = RRF_K):
+    """
+    Fuse several best-first lists of doc ids.
+
+    Returns (score, doc_id) pairs sorted best-first, where score is
+    sum(1 / (k + rank)) over the lists containing the doc.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+
+    fused = sorted(((s, d) for d, s in scores.items()), key=lambda x: x[0], reverse=True)
+    return fused[:top_k]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    for path in subject_files(VECTOR_DIR).values():
+        build_dense_index(path)
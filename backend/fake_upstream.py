@@ -0,0 +1,211 @@
+"""
+Fake OpenAI-compatible upstream for offline load tests.
+
+Implements POST /v1/chat/completions (plain and stream=True) and
+GET /v1/models with configurable latency, error rate and token
+throughput, so main.py can be driven hard without calling Groq:
+
+    python fake_upstream.py --port 9000 --latency lognormal:0.8,0.5 --error-rate 0.02 --tps 80
+    GROQ_BASE_URL=http://127.0.0.1:9000/v1 GROQ_API_KEY=fake uvicorn main:app --port 8000
+    python load_test.py --url http://127.0.0.1:8000 --rps 20 --duration 60
+
+Latency specs (seconds to first token):
+    fixed:0.5   uniform:0.2,1.5   exp:0.8   lognormal:<mu>,<sigma>
+(lognormal takes the median in seconds as mu, i.e. exp(N(ln mu, sigma))).
+
+GET /stats reports request, error and concurrency counters.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Filler vocabulary per script; answers are synthetic
+WORDS = {
+    "latin": "force is a push or pull that changes the motion of an object and is measured in newtons".split(),
+    "devanagari": "बल किसी वस्तु की गति को बदलने वाला धक्का या खिंचाव है जिसे न्यूटन में मापा जाता है".split(),
+}
+
+
+# =========================
+# SETTINGS
+# =========================
+class Settings:
+    def __init__(self, latency: str = "lognormal:0.6,0.4", error_rate: float = 0.0,
+                 tps: float = 100.0, answer_tokens: int = 120, seed: int = None):
+        self.latency = latency
+        self.sample_latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.tps = tps
+        self.answer_tokens = answer_tokens
+        self.random = random.Random(seed)
+
+
+def parse_latency(spec: str):
+    """Return a function(rng) -> seconds for a latency spec string."""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "exp":
+        return lambda rng: rng.expovariate(1.0 / values[0])
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+settings = Settings()
+stats = {"requests": 0, "streams": 0, "errors": 0, "in_flight": 0, "peak_in_flight": 0, "tokens": 0}
+
+app = FastAPI(title="Fake OpenAI-compatible upstream")
+
+
+# =========================
+# HELPERS
+# =========================
+def _answer_tokens(messages, max_tokens: int):
+    text = " ".join(str(m.get("content", "")) for m in messages)
+    script = "devanagari" if any("ऀ" <= ch <= "ॿ" for ch in text) else "latin"
+    words = WORDS[script]
+    count = max(1, min(settings.answer_tokens, max_tokens or settings.answer_tokens))
+    return [words[i % len(words)] + " " for i in range(count)]
+
+
+def _prompt_tokens(messages) -> int:
+    return sum(len(str(m.get("content", "")).split()) for m in messages)
+
+
+def _error_response():
+    stats["errors"] += 1
+    if settings.random.random() < 0.5:
+        return JSONResponse(status_code=429, content={"error": {"message": "Rate limit reached (fake)", "type": "rate_limit"}})
+    return JSONResponse(status_code=500, content={"error": {"message": "Internal error (fake)", "type": "server_error"}})
+
+
+# =========================
+# ROUTES
+# =========================
+@app.get("/v1/models")
+@app.get("/models")
+def list_models():
+    return {"object": "list", "data": [{"id": "fake-model", "object": "model", "owned_by": "fake"}]}
+
+
+@app.get("/stats")
+def get_stats():
+    return {**stats, "latency": settings.latency, "error_rate": settings.error_rate, "tps": settings.tps}
+
+
+@app.post("/v1/chat/completions")
+@app.post("/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+
+    if settings.random.random() < settings.error_rate:
+        await asyncio.sleep(settings.sample_latency(settings.random) / 4)
+        return _error_response()
+
+    messages = body.get("messages", [])
+    tokens = _answer_tokens(messages, body.get("max_tokens"))
+    first_token_delay = settings.sample_latency(settings.random)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    model = body.get("model", "fake-model")
+    usage = {
+        "prompt_tokens": _prompt_tokens(messages),
+        "completion_tokens": len(tokens),
+        "total_tokens": _prompt_tokens(messages) + len(tokens),
+    }
+
+    if body.get("stream"):
+        stats["streams"] += 1
+        return StreamingResponse(
+            _stream(completion_id, model, tokens, first_token_delay),
+            media_type="text/event-stream"
+        )
+
+    stats["in_flight"] += 1
+    stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+    try:
+        await asyncio.sleep(first_token_delay + len(tokens) / settings.tps)
+    finally:
+        stats["in_flight"] -= 1
+    stats["tokens"] += len(tokens)
+
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": "".join(tokens).strip()},
+            "finish_reason": "stop",
+        }],
+        "usage": usage,
+    }
+
+
+async def _stream(completion_id: str, model: str, tokens, first_token_delay: float):
+    stats["in_flight"] += 1
+    stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+    try:
+        await asyncio.sleep(first_token_delay)
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(1.0 / settings.tps)
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+            }
+            stats["tokens"] += 1
+            yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+
+        done = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        }
+        yield f"data: {json.dumps(done)}\n\n"
+        yield "data: [DONE]\n\n"
+    finally:
+        stats["in_flight"] -= 1
+
+
+# =========================
+# MAIN
+# =========================
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible upstream")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", default="lognormal:0.6,0.4", help="Time-to-first-token distribution")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429/500")
+    parser.add_argument("--tps", type=float, default=100.0, help="Generated tokens per second per request")
+    parser.add_argument("--answer-tokens", type=int, default=120, help="Tokens per answer (capped by max_tokens)")
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible runs")
+    args = parser.parse_args()
+
+    settings = Settings(args.latency, args.error_rate, args.tps, args.answer_tokens, args.seed)
+    print(f"[INFO] Fake upstream on http://{args.host}:{args.port}/v1 "
+          f"(latency={args.latency}, error_rate={args.error_rate}, tps={args.tps})")
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
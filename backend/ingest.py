@@ -1,12 +1,42 @@
-﻿import os
+﻿import argparse
+import hashlib
+import io
+import os
 import json
+import logging
 import re
+import shutil
+import sys
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 import pypdf
-from unstructured.documents.elements import Text
+from pypdf.generic import ContentStream
+from unstructured.documents.elements import Text, Title
+
+try:
+    import resource
+except ImportError:  # not on Windows; peak RSS is then not reported
+    resource = None
+
+from chunk_store import CHUNK_SUFFIXES, ChunkFileWriter, JsonlWriter
+from config import (
+    CHUNK_STORE_COMPRESS,
+    CHUNK_STORE_FORMAT,
+    INGEST_HI_RES_IMAGE_COVERAGE,
+    INGEST_MIN_TEXT_CHARS,
+    INGEST_MIN_TEXT_QUALITY,
+    INGEST_PAGES_PER_TASK,
+    INGEST_WORKERS,
+)
+from dense_retriever import build_dense_index, dense_available
 
 try:
     from unstructured.partition.pdf import partition_pdf
     from unstructured.chunking.title import chunk_by_title
+    from unstructured.staging.base import elements_from_json, elements_to_json
+    from unstructured.__version__ import __version__ as UNSTRUCTURED_VERSION
 except ImportError as exc:
     if "open_filename" in str(exc):
         raise ImportError(
@@ -19,6 +49,46 @@ except ImportError as exc:
 DOCS_FOLDER = "docs"
 OUTPUT_FOLDER = "vector_store"
 
+# Not *.json: offline_rag loads every vector_store/*.json as a subject
+MANIFEST_PATH = os.path.join(OUTPUT_FOLDER, "ingest.manifest")
+PARTITION_CACHE_DIR = os.path.join(OUTPUT_FOLDER, ".partition_cache")
+
+# Bump when clean_text / is_valid_chunk change so every PDF is re-chunked
+# (2: JSONL output)
+INGEST_VERSION = 2
+
+# Per-page strategy -> partition_pdf strategies tried in order (then pypdf
+# text); "empty" pages are not partitioned at all
+STRATEGY_CHAINS = {
+    "fast": ["fast"],
+    "hi_res": ["hi_res", "fast"],
+    "ocr_only": ["ocr_only", "hi_res"],
+    "empty": [],
+}
+
+# Partitioned pages are cached under the PDF hash + these params; chunk
+# params only affect the manifest, so changing them reuses the cache
+PARTITION_PARAMS = {
+    "chains": STRATEGY_CHAINS,
+    "router": {
+        # 2: short text-only pages go to fast, images in forms counted
+        "version": 2,
+        "min_text_chars": INGEST_MIN_TEXT_CHARS,
+        "min_text_quality": INGEST_MIN_TEXT_QUALITY,
+        "hi_res_image_coverage": INGEST_HI_RES_IMAGE_COVERAGE,
+    },
+    "languages": ["eng", "mar"],
+    "unstructured": UNSTRUCTURED_VERSION,
+}
+CHUNK_PARAMS = {
+    "max_characters": 1500,
+    "new_after_n_chars": 1200,
+    "combine_text_under_n_chars": 300,
+}
+
+# Elements are chunked in windows of about this many, cut before a Title
+CHUNK_WINDOW = 200
+
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
 
@@ -51,95 +121,701 @@ def is_valid_chunk(text: str) -> bool:
 
 
 # -----------------------------
-# SINGLE PDF PROCESSOR
+# PAGE-RANGE PARTITIONING (worker processes)
 # -----------------------------
 
-def process_pdf(pdf_path):
+def page_count(pdf_path):
+    try:
+        return len(pypdf.PdfReader(pdf_path).pages)
+    except Exception as e:
+        print(f"⚠️ Could not count pages of {pdf_path} ({e}); partitioning it whole.")
+        return None
 
-    print(f"\n📄 Processing: {pdf_path}")
-    elements = []
 
-    # Using 'hi_res' and 'mar' (Marathi) + 'eng' as requested previously
+def page_ranges(pages, pages_per_task):
+    """Split sorted 0-based page numbers into contiguous [start, end) ranges of at most pages_per_task."""
+    size = max(1, pages_per_task)
+    ranges = []
+    for page in pages:
+        if ranges and ranges[-1][1] == page and page - ranges[-1][0] < size:
+            ranges[-1][1] = page + 1
+        else:
+            ranges.append([page, page + 1])
+    return [tuple(r) for r in ranges]
+
+
+# -----------------------------
+# PAGE PROBE + STRATEGY ROUTER
+# -----------------------------
+
+# Punctuation a healthy text layer (English / Devanagari) is made of
+TEXT_PUNCTUATION = set(".,;:!?'\"()[]-–—/%+=*&@#°।॥")
+CID_PATTERN = re.compile(r"\(cid:\d+\)")
+
+
+def text_quality(text: str) -> float:
+    """
+    Fraction of characters that look like real text: letters, combining
+    marks (Devanagari matras), digits, spaces and common punctuation.
+    Broken font mappings show up as (cid:N), U+FFFD, private-use and
+    control characters.
+    """
+    cid_chars = sum(len(match) for match in CID_PATTERN.findall(text))
+    text = CID_PATTERN.sub("", text)
+    total = len(text) + cid_chars
+    if not total:
+        return 0.0
+
+    good = sum(
+        1 for ch in text
+        if unicodedata.category(ch)[0] in "LMNZ" or ch in TEXT_PUNCTUATION or ch in "\n\t"
+    )
+    return good / total
+
+
+def _image_area(content, resources, pdf, det=1.0, depth=0):
+    """
+    Area (in square points) covered by images drawn from a content stream,
+    following Form XObjects into their own content. Only the CTM's
+    determinant matters: the unit square an image is drawn into covers
+    |det| square points.
+    """
+    xobjects = resources.get("/XObject") if resources is not None else None
+    xobjects = xobjects.get_object() if xobjects is not None else {}
+
+    stack, area = [], 0.0
+    for operands, operator in ContentStream(content, pdf).operations:
+        if operator == b"q":
+            stack.append(det)
+        elif operator == b"Q":
+            det = stack.pop() if stack else det
+        elif operator == b"cm":
+            a, b, c, d = (float(x) for x in operands[:4])
+            det *= a * d - b * c
+        elif operator == b"Do" and operands[0] in xobjects:
+            xobject = xobjects[operands[0]].get_object()
+            subtype = xobject.get("/Subtype")
+            if subtype == "/Image":
+                area += abs(det)
+            elif subtype == "/Form" and depth < 8:
+                a, b, c, d = (float(x) for x in xobject.get("/Matrix", [1, 0, 0, 1, 0, 0])[:4])
+                form_resources = xobject.get("/Resources")
+                form_resources = form_resources.get_object() if form_resources is not None else resources
+                area += _image_area(xobject, form_resources, pdf, det * (a * d - b * c), depth + 1)
+    return area
+
+
+def image_coverage(page):
+    """
+    Fraction of the page area covered by image XObjects, including those
+    nested in Form XObjects. None if the page could not be parsed.
+    """
     try:
-        elements = partition_pdf(
-            filename=pdf_path,
-            strategy="hi_res",
-            languages=["eng", "mar"]
-        )
-    except Exception as e:
-        error_msg = str(e).lower()
-        if "poppler" in error_msg or "page count" in error_msg:
-            print(f"⚠️ Missing Poppler (required for Hi-Res). Hint: Add Poppler to your PATH.")
+        page_area = float(page.mediabox.width) * float(page.mediabox.height)
+        resources = page["/Resources"].get_object() if "/Resources" in page else None
+        if resources is None or resources.get("/XObject") is None or not page_area:
+            return 0.0
+        return min(1.0, _image_area(page.get_contents(), resources, page.pdf) / page_area)
+    except Exception:
+        return None
+
+
+def probe_page(page) -> dict:
+    """Cheap pypdf probe of one page and the extraction strategy it needs."""
+    try:
+        text = page.extract_text() or ""
+    except Exception:
+        text = ""
+    chars = len(text.strip())
+    quality = text_quality(text) if chars else 0.0
+    coverage = image_coverage(page)
+    # Unknown coverage (unparsable content) is treated as a page of images
+    has_images = coverage is None or coverage > 0
+
+    if chars < INGEST_MIN_TEXT_CHARS:
+        if has_images:
+            # Little or no text layer but images: a scan, OCR it
+            strategy = "ocr_only"
         else:
-            print(f"⚠️ Hi-Res partition failed: {e}")
-        
-        print("💡 Attempting 'fast' strategy...")
-        try:
-            elements = partition_pdf(
-                filename=pdf_path,
-                strategy="fast",
-                languages=["eng", "mar"]
-            )
-        except Exception as e2:
-            print(f"⚠️ 'fast' strategy also failed: {e2}")
-
-    # FINAL FALLBACK: If still 0 elements, use pypdf directly
-    if not elements:
-        print("🔍 Unstructured failed to extract elements. Falling back to basic pypdf extraction...")
+            # A short text-only page (a caption, a heading); blank if no text at all
+            strategy = "fast" if chars else "empty"
+    elif quality < INGEST_MIN_TEXT_QUALITY:
+        # Text layer present but garbled (bad font mapping): OCR instead
+        strategy = "ocr_only"
+    elif coverage is None or coverage >= INGEST_HI_RES_IMAGE_COVERAGE:
+        # Figures / tables take much of the page: worth the layout model
+        strategy = "hi_res"
+    else:
+        strategy = "fast"
+
+    return {
+        "strategy": strategy,
+        "chars": chars,
+        "quality": round(quality, 3),
+        "image_coverage": round(coverage, 3) if coverage is not None else None,
+    }
+
+
+# -----------------------------
+# PAGE-RANGE PARTITIONING (worker processes)
+# -----------------------------
+
+def _partition(pdf_path, reader, start, end, strategy):
+    if end is None:
+        return partition_pdf(filename=pdf_path, strategy=strategy, languages=PARTITION_PARAMS["languages"])
+
+    # Partition only this page run, from an in-memory sub-PDF
+    writer = pypdf.PdfWriter()
+    for page in reader.pages[start:end]:
+        writer.add_page(page)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    buffer.seek(0)
+
+    elements = partition_pdf(file=buffer, strategy=strategy, languages=PARTITION_PARAMS["languages"])
+    for element in elements:
+        if element.metadata.page_number is not None:
+            element.metadata.page_number += start
+    return elements
+
+
+def _pypdf_elements(reader, start, end):
+    elements = []
+    for page_number, page in enumerate(reader.pages[start:end], start=start + 1):
+        page_text = page.extract_text()
+        if page_text and page_text.strip():
+            element = Text(text=page_text)
+            element.metadata.page_number = page_number
+            elements.append(element)
+    return elements
+
+
+def _partition_run(pdf_path, reader, start, end, strategy):
+    """
+    Partition one run of pages with the same strategy, falling back along
+    its chain and finally to plain pypdf text. Returns (elements, used,
+    degraded): degraded when a strategy errored (e.g. missing Tesseract or
+    Poppler) or nothing could be extracted, so the pages are worth retrying.
+    """
+    label = f"{os.path.basename(pdf_path)} p{start + 1}-{end if end is not None else 'end'}"
+    degraded = False
+
+    for attempt in STRATEGY_CHAINS[strategy]:
         try:
-            reader = pypdf.PdfReader(pdf_path)
-            for page in reader.pages:
-                page_text = page.extract_text()
-                if page_text and page_text.strip():
-                    elements.append(Text(text=page_text))
-        except Exception as e3:
-            print(f"❌ pypdf fallback failed: {e3}")
-
-    if not elements:
-        print(f"❌ Critical: Could not extract any text from {pdf_path}. Skipping.")
-        return
+            elements = _partition(pdf_path, reader, start, end, attempt)
+        except Exception as e:
+            degraded = True
+            error_msg = str(e).lower()
+            if "poppler" in error_msg or "page count" in error_msg:
+                print(f"⚠️ [{label}] Missing Poppler (required for {attempt}). Hint: Add Poppler to your PATH.")
+            elif "tesseract" in error_msg:
+                print(f"⚠️ [{label}] Missing Tesseract (required for {attempt}).")
+            else:
+                print(f"⚠️ [{label}] '{attempt}' partition failed: {e}")
+            continue
+        if elements:
+            return elements, attempt, degraded
+
+    if strategy == "empty":
+        return [], "empty", False
+
+    # FINAL FALLBACK: use pypdf directly
+    print(f"🔍 [{label}] Unstructured failed to extract elements. Falling back to basic pypdf extraction...")
+    try:
+        return _pypdf_elements(reader or pypdf.PdfReader(pdf_path), start, end), "pypdf", degraded
+    except Exception as e3:
+        print(f"❌ [{label}] pypdf fallback failed: {e3}")
+        return [], "failed", True
+
+
+def partition_range(pdf_path, start, end):
+    """
+    Partition pages [start, end) of a PDF (end=None: the whole file).
+
+    Each page is probed and routed to its own strategy; consecutive pages
+    with the same strategy are partitioned together, so only scanned or
+    figure-heavy pages pay for hi_res/OCR. An unreadable file is
+    partitioned whole with the hi_res chain.
+
+    Runs in a worker process; returns (elements, cpu_seconds, pages) where
+    pages is the per-page report (page, strategy, used, degraded, probe
+    stats, seconds: the run's wall time split evenly over its pages). A
+    whole-file run reports a single entry with page None.
+    """
+    cpu_start = time.process_time()
+
+    if end is None:
+        run_timer = time.perf_counter()
+        elements, used, degraded = _partition_run(pdf_path, None, start, end, "hi_res")
+        page = {"page": None, "strategy": "hi_res", "used": used, "degraded": degraded,
+                "seconds": round(time.perf_counter() - run_timer, 4)}
+        return elements, time.process_time() - cpu_start, [page]
+
+    try:
+        reader = pypdf.PdfReader(pdf_path)
+        probes = [probe_page(page) for page in reader.pages[start:end]]
+    except Exception as e:
+        print(f"⚠️ Probe of {pdf_path} p{start + 1}-{end} failed ({e}); using hi_res.")
+        reader = pypdf.PdfReader(pdf_path)
+        probes = [{"strategy": "hi_res"} for _ in range(start, end)]
 
-    print(f"🔍 Found {len(elements)} elements. Chunking...")
+    elements = []
+    pages = []
+    run_start = start
+    for page in range(start, end + 1):
+        if page < end and probes[page - start]["strategy"] == probes[run_start - start]["strategy"]:
+            continue
+
+        strategy = probes[run_start - start]["strategy"]
+        run_timer = time.perf_counter()
+        run_elements, used, degraded = _partition_run(pdf_path, reader, run_start, page, strategy)
+        per_page = (time.perf_counter() - run_timer) / (page - run_start)
+
+        elements.extend(run_elements)
+        for run_page in range(run_start, page):
+            pages.append({
+                "page": run_page + 1,
+                **probes[run_page - start],
+                "used": used,
+                "degraded": degraded,
+                "seconds": round(per_page, 4),
+            })
+        run_start = page
+
+    return elements, time.process_time() - cpu_start, pages
 
-    chunks = chunk_by_title(
-        elements,
-        max_characters=1500,
-        new_after_n_chars=1200,
-        combine_text_under_n_chars=300
-    )
 
-    documents = []
+# -----------------------------
+# STREAMING CHUNKING + OUTPUT
+# -----------------------------
+
+class NoTextExtracted(Exception):
+    pass
+
+
+def iter_windowed_chunks(elements, window=CHUNK_WINDOW):
+    """
+    chunk_by_title over a stream of elements, about `window` at a time.
+    Windows end just before a Title, where chunk_by_title starts a new
+    section anyway; without titles they are cut at 4x the window.
+    """
+    buffer = []
+    for element in elements:
+        if buffer and (len(buffer) >= 4 * window or (len(buffer) >= window and isinstance(element, Title))):
+            yield from chunk_by_title(buffer, **CHUNK_PARAMS)
+            buffer = []
+        buffer.append(element)
+
+    if buffer:
+        yield from chunk_by_title(buffer, **CHUNK_PARAMS)
+
+
+def iter_documents(chunks):
     index = 0
 
     for chunk in chunks:
         text = clean_text(chunk.text)
 
         if is_valid_chunk(text):
-            documents.append({
+            yield {
                 "id": index,
                 "content": text
-            })
+            }
             index += 1
-        else:
-            if len(text.strip()) > 0:
-                # Debug skipped chunks
-                pass 
 
+
+def output_path_for(pdf_path):
     # Output filename = same name as PDF
     pdf_name = os.path.splitext(os.path.basename(pdf_path))[0]
-    output_path = os.path.join(OUTPUT_FOLDER, f"{pdf_name}.json")
+    suffix = ".chunks" if CHUNK_STORE_FORMAT == "binary" else ".jsonl"
+    return os.path.join(OUTPUT_FOLDER, pdf_name + suffix)
+
+
+def save_documents(pdf_path, documents):
+    """Stream documents into the subject's chunk file (renamed into place when complete); returns the count."""
+    output_path = output_path_for(pdf_path)
+    writer = (
+        ChunkFileWriter(output_path, compress=CHUNK_STORE_COMPRESS)
+        if output_path.endswith(".chunks") else JsonlWriter(output_path)
+    )
 
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(documents, f, ensure_ascii=False, indent=2)
+    with writer:
+        for document in documents:
+            writer.write(document)
 
-    print(f"✅ Saved {len(documents)} chunks → {output_path}")
+    print(f"✅ Saved {writer.count} chunks → {output_path}")
+
+    # Chunk files of the same subject in other formats are now stale
+    base = os.path.splitext(output_path)[0]
+    for suffix in CHUNK_SUFFIXES:
+        stale_path = base + suffix
+        if stale_path != output_path and os.path.exists(stale_path):
+            os.remove(stale_path)
+            print(f"🧹 Removed superseded {stale_path}")
+
+    # Dense index next to the chunk file (used when DENSE_RETRIEVAL=true)
+    if dense_available():
+        try:
+            build_dense_index(output_path)
+        except Exception as e:
+            print(f"⚠️ Dense index build failed: {e}")
+    else:
+        print("💡 numpy/faiss-cpu not installed, skipping dense index.")
+
+    return writer.count
+
+
+def _iter_pdf_elements(pdf_path, entry, stats):
+    """A PDF's elements in page order, read one cached page at a time."""
+    count = 0
+
+    if entry["cache_dir"] is None:
+        pages = [entry.pop("whole", [])]
+    else:
+        pages = (load_cached_page(entry["cache_dir"], page) for page in range(stats["pages"]))
+
+    for page, elements in enumerate(pages):
+        if elements is None:
+            print(f"⚠️ Page {page + 1} of {pdf_path} is missing from the partition cache.")
+            continue
+        count += len(elements)
+        yield from elements
+
+    stats["elements"] = count
+    if not count:
+        raise NoTextExtracted(pdf_path)
+
+
+def _finish_pdf(pdf_path, entry, stats):
+    """Stream a fully partitioned PDF through chunking and cleaning into its chunk file."""
+    print(f"🔍 {os.path.basename(pdf_path)}: chunking...")
+    chunk_start = time.perf_counter()
+    try:
+        stats["chunks"] = save_documents(
+            pdf_path, iter_documents(iter_windowed_chunks(_iter_pdf_elements(pdf_path, entry, stats)))
+        )
+    except NoTextExtracted:
+        print(f"❌ Critical: Could not extract any text from {pdf_path}. Skipping.")
+        return False
+    stats["chunk_save_s"] = round(time.perf_counter() - chunk_start, 3)
+    return True
+
+
+def peak_rss_mb(children=False):
+    """Peak resident set size of this process (or of its reaped children) in MiB."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+# -----------------------------
+# MANIFEST + PARTITION CACHE
+# -----------------------------
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def ingest_params():
+    return {
+        "version": INGEST_VERSION,
+        "partition": PARTITION_PARAMS,
+        "chunk": CHUNK_PARAMS,
+        "store": {"format": CHUNK_STORE_FORMAT, "compress": CHUNK_STORE_COMPRESS},
+    }
+
+
+def load_manifest():
+    """PDF file name -> {sha256, params, output, chunks, cache, ingested_at}."""
+    try:
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_atomic(path, text):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def save_manifest(manifest):
+    _write_atomic(MANIFEST_PATH, json.dumps(manifest, ensure_ascii=False, indent=2))
+
+
+def partition_cache_dir(sha256):
+    params_hash = hashlib.sha256(json.dumps(PARTITION_PARAMS, sort_keys=True).encode()).hexdigest()
+    return os.path.join(PARTITION_CACHE_DIR, f"{sha256[:24]}-{params_hash[:8]}")
+
+
+def cached_page_path(cache_dir, page, degraded=False):
+    return os.path.join(cache_dir, f"{page + 1:05d}{'.degraded' if degraded else ''}.json")
+
+
+def load_cached_page(cache_dir, page):
+    """Elements of one 0-based page (a degraded one if that is all there is), or None if not cached."""
+    for degraded in (False, True):
+        try:
+            with open(cached_page_path(cache_dir, page, degraded), "r", encoding="utf-8") as f:
+                text = f.read()
+        except OSError:
+            continue
+        try:
+            return elements_from_json(text=text)
+        except Exception:
+            return None
+    return None
+
+
+def save_cached_pages(cache_dir, start, end, elements, degraded=()):
+    """
+    Write the elements of pages [start, end) to the cache, one file per page
+    (empty pages included). Pages in `degraded` are written aside as
+    .degraded.json: they feed this run's output but count as cache misses,
+    so the next run partitions them again.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    by_page = {page: [] for page in range(start, end)}
+    for element in elements:
+        page = (element.metadata.page_number or start + 1) - 1
+        by_page.setdefault(page, []).append(element)
+
+    for page, page_elements in by_page.items():
+        text = elements_to_json(page_elements) if page_elements else "[]"
+        if page in degraded:
+            _write_atomic(cached_page_path(cache_dir, page, degraded=True), text)
+            continue
+        _write_atomic(cached_page_path(cache_dir, page), text)
+        try:
+            os.remove(cached_page_path(cache_dir, page, degraded=True))
+        except FileNotFoundError:
+            pass
+
+
+# -----------------------------
+# PARALLEL INGEST
+# -----------------------------
+
+def _complete(pdf_path, entry, manifest):
+    """Chunk and save a PDF whose pages are all partitioned, then record it in the manifest."""
+    stats = entry["stats"]
+    stats["partition_s"] = round(time.perf_counter() - entry["submitted"], 3)
+    stats["partition_cpu_s"] = round(stats["partition_cpu_s"], 3)
+
+    if entry.get("failed"):
+        # Chunking what did partition would overwrite a good chunk file with a
+        # truncated one; keep the previous output and manifest entry instead
+        stats["failed"] = True
+        print(f"❌ Some pages of {pdf_path} failed to partition; keeping the previous output. Re-run ingest to retry.")
+        return
+    if not _finish_pdf(pdf_path, entry, stats):
+        return
+
+    degraded = sorted(stats["degraded_pages"], key=lambda page: page or 0)
+    if degraded:
+        # Written from pypdf text or a fallback strategy: recorded without a
+        # matching hash so the next run retries instead of skipping it
+        print(f"⚠️ {len(degraded)} page(s) of {pdf_path} fell back to a weaker extraction; "
+              f"they will be partitioned again on the next run.")
+
+    name = os.path.basename(pdf_path)
+    previous = manifest.get(name, {})
+    cache = os.path.basename(entry["cache_dir"]) if entry["cache_dir"] else None
+    stale = previous.get("cache")
+    if stale and stale != cache and not any(
+        other.get("cache") == stale for other_name, other in manifest.items() if other_name != name
+    ):
+        # The PDF changed and no other PDF has the old content
+        shutil.rmtree(os.path.join(PARTITION_CACHE_DIR, stale), ignore_errors=True)
+
+    manifest[name] = {
+        "sha256": entry["sha256"],
+        "params": ingest_params(),
+        "output": os.path.basename(output_path_for(pdf_path)),
+        "pages": stats["pages"],
+        "chunks": stats["chunks"],
+        "cache": cache,
+        "ingested_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    if degraded:
+        manifest[name]["sha256"] = None
+        manifest[name]["degraded_pages"] = degraded
+    save_manifest(manifest)
+
+
+def ingest_files(pdf_files, workers=None, pages_per_task=None, force=False):
+    """
+    Partition all page ranges of all PDFs in one process pool, so several
+    PDFs are in flight at once. Finished ranges go straight to the on-disk
+    partition cache; each PDF is then streamed page by page through
+    chunking into its chunk file as soon as its last range completes, so
+    memory stays bounded by the ranges in flight. Returns a per-file and
+    overall timing and peak RSS report.
+
+    Unless force is set, PDFs whose hash and ingest params match the
+    manifest are skipped, and pages already in the partition cache are not
+    partitioned again.
+    """
+    workers = workers or INGEST_WORKERS or os.cpu_count() or 1
+    pages_per_task = pages_per_task or INGEST_PAGES_PER_TASK
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    worker_cpu = 0.0
+
+    manifest = load_manifest()
+    params = ingest_params()
+    files = {}
+    futures = {}
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for pdf_path in pdf_files:
+            sha256 = file_sha256(pdf_path)
+            previous = manifest.get(os.path.basename(pdf_path), {})
+            if (not force and previous.get("sha256") == sha256 and previous.get("params") == params
+                    and os.path.exists(output_path_for(pdf_path))):
+                print(f"\n⏭️ Unchanged, skipping: {pdf_path}")
+                files[pdf_path] = {"stats": {"skipped": True, "pages": previous.get("pages"),
+                                             "chunks": previous.get("chunks")}}
+                continue
+
+            print(f"\n📄 Processing: {pdf_path}")
+            n_pages = page_count(pdf_path)
+            cache_dir = partition_cache_dir(sha256) if n_pages is not None else None
+            cached = 0
+
+            if n_pages is None:
+                ranges = [(0, None)]
+            else:
+                missing = [
+                    page for page in range(n_pages)
+                    if force or not os.path.exists(cached_page_path(cache_dir, page))
+                ]
+                cached = n_pages - len(missing)
+                ranges = page_ranges(missing, pages_per_task)
+
+            entry = files[pdf_path] = {
+                "pending": len(ranges),
+                "submitted": time.perf_counter(),
+                "sha256": sha256,
+                "cache_dir": cache_dir,
+                "stats": {
+                    "pages": n_pages,
+                    "cached_pages": cached,
+                    "ranges": len(ranges),
+                    "partition_cpu_s": 0.0,
+                    "strategies": {},
+                    "page_report": [],
+                    "degraded_pages": [],
+                },
+            }
+            if cached:
+                print(f"♻️ {cached}/{n_pages} pages from the partition cache")
+
+            if not ranges:
+                _complete(pdf_path, entry, manifest)
+            for start, end in ranges:
+                futures[executor.submit(partition_range, pdf_path, start, end)] = (pdf_path, start, end)
+
+        for future in as_completed(futures):
+            pdf_path, start, end = futures.pop(future)
+            entry = files[pdf_path]
+            try:
+                elements, cpu_seconds, pages = future.result()
+            except Exception as e:
+                # Not cached and not recorded in the manifest: retried next run
+                print(f"❌ Partition of {pdf_path} from page {start + 1} failed: {e}")
+                elements, cpu_seconds, pages = [], 0.0, []
+                entry["failed"] = True
+            else:
+                degraded = {page["page"] - 1 for page in pages if page["degraded"] and page["page"]}
+                if end is None:
+                    entry["whole"] = elements
+                else:
+                    save_cached_pages(entry["cache_dir"], start, end, elements, degraded)
+                entry["stats"]["degraded_pages"].extend(page["page"] for page in pages if page["degraded"])
+            elements = None
+
+            for page in pages:
+                summary = entry["stats"]["strategies"].setdefault(page["strategy"], {"pages": 0, "seconds": 0.0})
+                summary["pages"] += 1
+                summary["seconds"] = round(summary["seconds"] + page["seconds"], 3)
+            entry["stats"]["page_report"].extend(pages)
+
+            entry["stats"]["partition_cpu_s"] += cpu_seconds
+            worker_cpu += cpu_seconds
+            entry["pending"] -= 1
+
+            if entry["pending"] == 0:
+                _complete(pdf_path, entry, manifest)
+
+    wall = time.perf_counter() - wall_start
+    cpu = worker_cpu + time.process_time() - cpu_start
+    return {
+        "workers": workers,
+        "pages_per_task": pages_per_task,
+        "wall_s": round(wall, 3),
+        "cpu_s": round(cpu, 3),
+        # Fraction of the pool's capacity (workers x wall time) spent on CPU
+        "cpu_utilization": round(cpu / (wall * workers), 3) if wall else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        # Largest single worker (workers are reaped when the pool shuts down)
+        "worker_peak_rss_mb": peak_rss_mb(children=True),
+        "files": {pdf_path: entry["stats"] for pdf_path, entry in files.items()},
+    }
+
+
+def print_report(report):
+    print(f"\n⏱️ {len(report['files'])} file(s) in {report['wall_s']}s with {report['workers']} workers "
+          f"(cpu {report['cpu_s']}s, utilization {report['cpu_utilization']:.0%}, "
+          f"peak RSS {report['peak_rss_mb']} MiB main / {report['worker_peak_rss_mb']} MiB worker)")
+    for pdf_path, stats in report["files"].items():
+        if stats.get("skipped"):
+            print(f"  {os.path.basename(pdf_path)}: unchanged, skipped (chunks={stats.get('chunks')})")
+            continue
+        if stats.get("failed"):
+            print(f"  {os.path.basename(pdf_path)}: FAILED, previous output kept (pages={stats['pages']})")
+            continue
+        print(
+            f"  {os.path.basename(pdf_path)}: pages={stats['pages']} cached={stats['cached_pages']} "
+            f"ranges={stats['ranges']} partition={stats.get('partition_s')}s (cpu {stats['partition_cpu_s']}s) "
+            f"chunk+save={stats.get('chunk_save_s')}s chunks={stats.get('chunks', 0)}"
+        )
+        if stats["strategies"]:
+            print("    strategies: " + ", ".join(
+                f"{strategy}={summary['pages']}p/{summary['seconds']}s"
+                for strategy, summary in sorted(stats["strategies"].items())
+            ))
+        # Text pages are the common case; list only the pages routed elsewhere
+        for page in sorted(stats["page_report"], key=lambda p: p["page"] or 0):
+            if page["strategy"] != "fast" or page["used"] != "fast":
+                print(
+                    f"    p{page['page'] or '*'}: {page['strategy']} -> {page['used']}"
+                    f"{' (degraded)' if page['degraded'] else ''} in {page['seconds']}s "
+                    f"(chars={page.get('chars')}, quality={page.get('quality')}, "
+                    f"images={page.get('image_coverage')})"
+                )
+
+
+def process_pdf(pdf_path, workers=None, pages_per_task=None, force=False):
+    report = ingest_files([pdf_path], workers, pages_per_task, force)
+    print_report(report)
+    return report
 
 
 # -----------------------------
 # MAIN INGEST
 # -----------------------------
 
-def ingest():
+def ingest(workers=None, pages_per_task=None, force=False, report_path=None):
 
     print("ðŸš€ MULTI-PDF INGEST STARTED")
 
@@ -150,14 +826,39 @@ def ingest():
     ]
 
     if not pdf_files:
-        print("âŒ No PDFs found in docs folder.")
+        print("âŒ No PDFs found in docs folder.")
+        return
+
+    report = ingest_files(pdf_files, workers, pages_per_task, force)
+    print_report(report)
+
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"📝 Per-page report written to {report_path}")
+
+    failed = [os.path.basename(path) for path, stats in report["files"].items() if stats.get("failed")]
+    if failed:
+        print(f"\n❌ {len(failed)} PDF(s) failed and kept their previous output: {', '.join(failed)}")
         return
 
-    for pdf_path in pdf_files:
-        process_pdf(pdf_path)
+    degraded = [os.path.basename(path) for path, stats in report["files"].items() if stats.get("degraded_pages")]
+    if degraded:
+        print(f"\n⚠️ {len(degraded)} PDF(s) have degraded pages and will be retried next run: {', '.join(degraded)}")
+        return report
 
     print("\nðŸŽ‰ All PDFs processed successfully!")
+    return report
 
 
 if __name__ == "__main__":
-    ingest()
+    # Dense index builds and other library messages log at INFO
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(description="Ingest docs/*.pdf into vector_store")
+    parser.add_argument("--workers", type=int, help="Partition processes (default: INGEST_WORKERS or CPU count)")
+    parser.add_argument("--pages-per-task", type=int, help="Pages per partition task (default: INGEST_PAGES_PER_TASK)")
+    parser.add_argument("--force", action="store_true", help="Ignore the manifest and partition cache; re-ingest everything")
+    parser.add_argument("--report", help="Write the full report (incl. per-page strategy and time) to this JSON file")
+    args = parser.parse_args()
+
+    ingest(args.workers, args.pages_per_task, args.force, args.report)
@@ -0,0 +1,210 @@
+"""
+Fast, deterministic language detection for en / hi / mr questions.
+
+1. One pass over the text counts Devanagari and Latin letters.
+2. Devanagari text is scored by a character n-gram Hindi-vs-Marathi
+   classifier (naive Bayes log-odds, precomputed in language_ngrams.json).
+3. Latin text goes through a cached marker-word check that catches
+   romanized Hindi (Hinglish) and romanized Marathi; everything else is
+   English.
+
+Regenerate the n-gram weights after editing language_samples.json:
+    python language_detector.py --train
+"""
+
+import argparse
+import json
+import logging
+import math
+import re
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+
+from config import BASE_DIR
+
+logger = logging.getLogger(__name__)
+
+WEIGHTS_PATH = BASE_DIR / "language_ngrams.json"
+SAMPLES_PATH = BASE_DIR / "language_samples.json"
+
+NGRAM_RANGE = (1, 3)
+MIN_NGRAM_COUNT = 2
+SMOOTHING = 0.5
+
+_DEVANAGARI_WORD_RE = re.compile(r"[ऀ-ॿ]+")
+_LATIN_WORD_RE = re.compile(r"[a-z]+")
+
+# Romanized marker words and their weights. Shared words ("nahi",
+# "hote") count for both languages.
+HINGLISH_MARKERS = {
+    "kya": 2, "hai": 2, "hain": 2, "kaise": 2, "kaisa": 2, "kaisi": 2,
+    "kyu": 2, "kyun": 2, "kyon": 2, "nahin": 2, "batao": 2, "bataiye": 2,
+    "samjhao": 2, "samjhaiye": 2, "yaani": 2, "matlab": 2, "kaun": 2,
+    "kitna": 2, "kitne": 2, "hota": 2, "hoti": 2, "aur": 2, "mujhe": 2,
+    "nahi": 1, "mein": 1, "hote": 1, "ka": 1, "ki": 1, "ke": 1, "ko": 1,
+    "bhi": 1, "tha": 1, "thi": 1, "se": 1,
+}
+MARATHI_MARKERS = {
+    "aahe": 2, "ahe": 2, "aahet": 2, "ahet": 2, "kay": 2, "kasa": 2,
+    "kashi": 2, "kasha": 2, "mhanje": 2, "sang": 2, "sanga": 2,
+    "samjav": 2, "samjava": 2, "samjavun": 2, "madhye": 2, "ani": 2,
+    "aani": 2, "kuthe": 2, "kiti": 2, "mala": 2, "kase": 1, "nahi": 1,
+    "hote": 1,
+}
+MIN_MARKER_SCORE = 2
+MIN_MARKER_SHARE = 0.15
+
+
+# =========================
+# SCRIPT CLASSIFICATION
+# =========================
+def classify_script(text: str) -> str:
+    """
+    Dominant script in one pass: 'devanagari', 'latin' or 'other'.
+
+    Any Devanagari letter makes the text Devanagari, matching how mixed
+    questions ("What is प्रकाश?") were always routed.
+    """
+    latin = 0
+    other = 0
+
+    for ch in text:
+        code = ord(ch)
+        if 0x0900 <= code <= 0x097F:
+            return "devanagari"
+        if ch.isalpha():
+            if code < 0x0250:
+                latin += 1
+            else:
+                other += 1
+
+    if latin >= other:
+        return "latin"
+    return "other"
+
+
+# =========================
+# HINDI VS MARATHI (char n-grams)
+# =========================
+def _ngrams(text: str):
+    for word in _DEVANAGARI_WORD_RE.findall(text):
+        padded = f" {word} "
+        for n in range(NGRAM_RANGE[0], NGRAM_RANGE[1] + 1):
+            for i in range(len(padded) - n + 1):
+                gram = padded[i:i + n]
+                if gram != " ":
+                    yield gram
+
+
+def train_weights(samples: dict) -> dict:
+    """
+    Naive Bayes log-odds per n-gram from {"hi": [...], "mr": [...]}.
+
+    Positive weights favour Marathi. N-grams seen fewer than
+    MIN_NGRAM_COUNT times overall are dropped.
+    """
+    counts = {
+        lang: Counter(g for text in samples[lang] for g in _ngrams(unicodedata.normalize("NFC", text)))
+        for lang in ("hi", "mr")
+    }
+    vocab = [
+        g for g in set(counts["hi"]) | set(counts["mr"])
+        if counts["hi"][g] + counts["mr"][g] >= MIN_NGRAM_COUNT
+    ]
+    totals = {lang: sum(counts[lang][g] for g in vocab) for lang in counts}
+
+    weights = {}
+    for gram in vocab:
+        p_mr = (counts["mr"][gram] + SMOOTHING) / (totals["mr"] + SMOOTHING * len(vocab))
+        p_hi = (counts["hi"][gram] + SMOOTHING) / (totals["hi"] + SMOOTHING * len(vocab))
+        weights[gram] = round(math.log(p_mr / p_hi), 3)
+
+    return {
+        "ngram_range": list(NGRAM_RANGE),
+        "bias": round(math.log(len(samples["mr"]) / len(samples["hi"])), 3),
+        "weights": dict(sorted(weights.items())),
+    }
+
+
+def _load_weights():
+    try:
+        with open(WEIGHTS_PATH, "r", encoding="utf-8") as f:
+            model = json.load(f)
+        return model["weights"], model.get("bias", 0.0)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning("Language n-gram weights unavailable (%s); Devanagari defaults to Hindi", e)
+        return {}, 0.0
+
+
+_WEIGHTS, _BIAS = _load_weights()
+
+
+def marathi_score(text: str) -> float:
+    """Log-odds that Devanagari text is Marathi rather than Hindi."""
+    text = unicodedata.normalize("NFC", text)
+    return _BIAS + sum(_WEIGHTS.get(gram, 0.0) for gram in _ngrams(text))
+
+
+# =========================
+# LATIN SCRIPT
+# =========================
+@lru_cache(maxsize=4096)
+def _detect_latin(text_lower: str) -> str:
+    words = _LATIN_WORD_RE.findall(text_lower)
+    if not words:
+        return "en"
+
+    hi_score = mr_score = 0
+    marked = 0
+    for word in words:
+        hi = HINGLISH_MARKERS.get(word, 0)
+        mr = MARATHI_MARKERS.get(word, 0)
+        hi_score += hi
+        mr_score += mr
+        if hi or mr:
+            marked += 1
+
+    if max(hi_score, mr_score) < MIN_MARKER_SCORE or marked < MIN_MARKER_SHARE * len(words):
+        return "en"
+    return "mr" if mr_score > hi_score else "hi"
+
+
+# =========================
+# PUBLIC API
+# =========================
+def detect_language(text: str) -> str:
+    """
+    Detect the question language.
+
+    Returns:
+        Language code: 'en', 'hi', or 'mr'
+    """
+    if not text or len(text.strip()) < 2:
+        return "en"
+
+    script = classify_script(text)
+
+    if script == "devanagari":
+        # Ties (no known n-grams) default to Hindi
+        return "mr" if marathi_score(text) > 0 else "hi"
+
+    if script == "latin":
+        return _detect_latin(text.lower().strip())
+
+    return "en"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Language detector utilities")
+    parser.add_argument("--train", action="store_true", help=f"Rebuild {WEIGHTS_PATH.name} from {SAMPLES_PATH.name}")
+    args = parser.parse_args()
+
+    if args.train:
+        with open(SAMPLES_PATH, "r", encoding="utf-8") as f:
+            model = train_weights(json.load(f))
+        with open(WEIGHTS_PATH, "w", encoding="utf-8") as f:
+            json.dump(model, f, ensure_ascii=False, indent=0)
+        print(f"✅ Wrote {len(model['weights'])} n-gram weights to {WEIGHTS_PATH}")
+    else:
+        parser.print_help()
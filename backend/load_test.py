@@ -0,0 +1,209 @@
+"""
+Open-loop load generator for the tutor API.
+
+Fires POST /predict at a fixed arrival rate (requests are started on
+schedule whether or not earlier ones have finished, so queueing shows up
+as latency instead of a lower send rate) using the en/hi/mr questions of
+the relevance suite, then reports achieved throughput, latency
+percentiles, status codes and the online/offline/error split per language.
+
+Fully offline with fake_upstream.py standing in for Groq:
+
+    python fake_upstream.py --port 9000 --latency lognormal:0.8,0.5 --error-rate 0.02
+    GROQ_BASE_URL=http://127.0.0.1:9000/v1 GROQ_API_KEY=fake uvicorn main:app --port 8000
+    python load_test.py --url http://127.0.0.1:8000 --rps 20 --duration 60
+
+--unique appends a request number to every question so singleflight
+cannot coalesce them; --mix weights the languages (default equal).
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+import httpx
+
+from benchmark_rag import RESULTS_DIR, _git_commit, _load_questions, _percentiles
+
+
+# =========================
+# WORKLOAD
+# =========================
+def _question_pool(mix: dict):
+    by_language = defaultdict(list)
+    for q in _load_questions():
+        by_language[q["language"]].append(q["question"])
+
+    languages = [lang for lang in mix if by_language.get(lang)]
+    if not languages:
+        raise ValueError(f"No questions for languages: {', '.join(mix)}")
+    return by_language, languages, [mix[lang] for lang in languages]
+
+
+def _parse_mix(spec: str) -> dict:
+    mix = {}
+    for part in spec.split(","):
+        lang, _, weight = part.partition("=")
+        mix[lang.strip()] = float(weight) if weight else 1.0
+    return mix
+
+
+# =========================
+# LOAD GENERATOR
+# =========================
+async def _send(client, url: str, question: str, language: str, results: list):
+    start = time.perf_counter()
+    entry = {"language": language}
+    try:
+        response = await client.post(url, json={"query": question})
+        entry["status"] = response.status_code
+        if response.status_code == 200:
+            entry["mode"] = response.json().get("mode", "unknown")
+    except httpx.TimeoutException:
+        entry["status"] = "timeout"
+    except httpx.HTTPError as e:
+        entry["status"] = type(e).__name__
+    entry["latency_ms"] = (time.perf_counter() - start) * 1000
+    results.append(entry)
+
+
+async def run_load(url: str, rps: float, duration: float, mix: dict, unique: bool,
+                   timeout: float, max_in_flight: int, seed: int = 0):
+    by_language, languages, weights = _question_pool(mix)
+    rng = random.Random(seed)
+    results = []
+    tasks = set()
+    dropped = 0
+
+    limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        n = 0
+        while True:
+            scheduled = start + n / rps
+            if scheduled - start >= duration:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            if len(tasks) >= max_in_flight:
+                # Client-side limit reached: count the arrival as dropped
+                # rather than silently slowing the send rate
+                dropped += 1
+            else:
+                language = rng.choices(languages, weights)[0]
+                question = rng.choice(by_language[language])
+                if unique:
+                    question = f"{question} ({n})"
+                task = asyncio.create_task(_send(client, url, question, language, results))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            n += 1
+
+        send_elapsed = time.perf_counter() - start
+        if tasks:
+            await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    return _summarize(results, n, dropped, send_elapsed, elapsed)
+
+
+def _summarize(results, scheduled: int, dropped: int, send_elapsed: float, elapsed: float):
+    ok = [r for r in results if r["status"] == 200]
+    modes = defaultdict(Counter)
+    for r in ok:
+        modes[r["language"]][r["mode"]] += 1
+
+    return {
+        "scheduled": scheduled,
+        "sent": len(results),
+        "dropped": dropped,
+        "ok": len(ok),
+        "offered_rps": round(scheduled / send_elapsed, 2) if send_elapsed else 0.0,
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "elapsed_s": round(elapsed, 2),
+        "status": dict(Counter(str(r["status"]) for r in results)),
+        "latency": _percentiles([r["latency_ms"] for r in ok]) if ok else {},
+        "latency_max_ms": round(max(r["latency_ms"] for r in ok), 2) if ok else None,
+        "modes": dict(sum(modes.values(), Counter())),
+        "modes_by_language": {lang: dict(counts) for lang, counts in sorted(modes.items())},
+    }
+
+
+async def _fetch_upstream(base_url: str):
+    """Breaker state from /upstream after the run (None if unavailable)."""
+    try:
+        async with httpx.AsyncClient(timeout=5.0) as client:
+            response = await client.get(f"{base_url}/upstream")
+            return response.json() if response.status_code == 200 else None
+    except httpx.HTTPError:
+        return None
+
+
+# =========================
+# MAIN
+# =========================
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load test for POST /predict")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Tutor API base URL")
+    parser.add_argument("--path", default="/predict", help="Endpoint to drive")
+    parser.add_argument("--rps", type=float, default=10.0, help="Target arrival rate")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of load")
+    parser.add_argument("--mix", default="en=1,hi=1,mr=1", help="Language weights, e.g. en=2,hi=1,mr=1")
+    parser.add_argument("--unique", action="store_true", help="Make every question distinct (defeats singleflight)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request client timeout")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="Client-side concurrency cap")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Result JSON path (default: benchmarks/results/load-<commit>-<time>.json)")
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip("/")
+    print(f"[LOAD] {args.rps} rps for {args.duration}s -> {base_url}{args.path}")
+
+    summary = asyncio.run(run_load(
+        base_url + args.path, args.rps, args.duration, _parse_mix(args.mix),
+        args.unique, args.timeout, args.max_in_flight, args.seed
+    ))
+    upstream = asyncio.run(_fetch_upstream(base_url))
+
+    latency = summary["latency"]
+    print(
+        f"[LOAD] sent={summary['sent']} ok={summary['ok']} dropped={summary['dropped']}  "
+        f"offered={summary['offered_rps']} rps  throughput={summary['throughput_rps']} rps"
+    )
+    if latency:
+        print(
+            f"[LOAD] p50={latency['p50_ms']:.1f}ms  p95={latency['p95_ms']:.1f}ms  "
+            f"p99={latency['p99_ms']:.1f}ms  max={summary['latency_max_ms']}ms"
+        )
+    print(f"[LOAD] status: {summary['status']}")
+    print(f"[LOAD] modes:  {summary['modes']}")
+    for lang, counts in summary["modes_by_language"].items():
+        print(f"        {lang}: {counts}")
+
+    commit = _git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": vars(args),
+        **summary,
+        "upstream": upstream,
+    }
+
+    output = Path(args.output) if args.output else (
+        RESULTS_DIR / f"load-{commit}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"\n✅ Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
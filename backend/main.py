@@ -1,16 +1,22 @@
-from fastapi import FastAPI, HTTPException
+﻿from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
-from router import tutor_router
+from router import tutor_router, tutor_router_async, tutor_router_stream, tutor_router_batch
+from config import OFFLINE_WARMUP, VECTOR_RELOAD_INTERVAL, LOG_LEVEL, BATCH_MAX_ITEMS
+import metrics
+import offline_rag
+import online_model
+import json
 import logging
-from typing import Optional
+from typing import List, Optional
 import time
 
 # =========================
 # LOGGING SETUP
 # =========================
 logging.basicConfig(
-    level=logging.INFO,
+    level=LOG_LEVEL,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
@@ -33,6 +39,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def warmup_offline_index():
+    """Start loading the offline RAG index without blocking startup."""
+    if OFFLINE_WARMUP:
+        logger.info("Warming up offline RAG index in background...")
+        offline_rag.warmup_in_background()
+
+    if VECTOR_RELOAD_INTERVAL > 0:
+        logger.info(f"Watching vector_store for changes every {VECTOR_RELOAD_INTERVAL}s")
+        offline_rag.start_reload_watcher(VECTOR_RELOAD_INTERVAL)
+
+@app.on_event("shutdown")
+def stop_offline_watcher():
+    offline_rag.stop_reload_watcher()
+
 # =========================
 # REQUEST/RESPONSE MODELS
 # =========================
@@ -47,6 +68,18 @@ class PredictionResponse(BaseModel):
     confidence: float = Field(..., ge=0.0, le=1.0, description="Confidence score 0-1")
     language: str = Field(..., description="Detected language: 'en', 'hi', or 'mr'")
     processing_time: float = Field(..., description="Processing time in seconds")
+    sources: Optional[List[str]] = Field(None, description="Source chunk ids ('<subject>:<id>') for offline answers")
+
+class BatchItemResponse(BaseModel):
+    """One question of a batch: a result or an error."""
+    index: int = Field(..., description="Position of the question in the request")
+    result: Optional[PredictionResponse] = Field(None, description="Answer, if the item succeeded")
+    error: Optional[str] = Field(None, description="Error message, if the item failed")
+
+class BatchPredictionResponse(BaseModel):
+    """Response model for batch prediction."""
+    results: List[BatchItemResponse]
+    processing_time: float = Field(..., description="Processing time for the whole batch in seconds")
 
 # =========================
 # HEALTH CHECK
@@ -70,11 +103,45 @@ def health_check():
         "timestamp": time.time()
     }
 
+@app.get("/ready")
+def readiness_check():
+    """
+    Readiness check for orchestrators.
+
+    Returns 200 once the offline RAG index is loaded, 503 while it is
+    still loading (or failed to load). "retrieval" carries the cumulative
+    retrieval counters, also exported at /metrics.
+    """
+    state = offline_rag.get_load_state()
+    body = {
+        "ready": state["status"] == "ready",
+        "offline_index": state,
+        "retrieval": offline_rag.get_retrieval_stats(),
+        "timestamp": time.time()
+    }
+    return JSONResponse(status_code=200 if body["ready"] else 503, content=body)
+
+@app.get("/upstream")
+def upstream_status():
+    """Circuit breaker state of each online model endpoint."""
+    return {
+        **online_model.get_upstream_status(),
+        "timestamp": time.time()
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Request and per-stage latency histograms in Prometheus text format."""
+    return PlainTextResponse(
+        metrics.render_prometheus(),
+        media_type="text/plain; version=0.0.4"
+    )
+
 # =========================
 # MAIN PREDICTION ENDPOINT
 # =========================
 @app.post("/predict", response_model=PredictionResponse)
-def predict(data: QueryRequest):
+async def predict(data: QueryRequest):
     """
     Process student question and return AI-generated answer.
     
@@ -92,8 +159,8 @@ def predict(data: QueryRequest):
     try:
         logger.info(f"Received query: {data.query[:100]}...")
         
-        # Route to appropriate model
-        result = tutor_router(data.query)
+        # Route to appropriate model (online hedged by offline RAG)
+        result = await tutor_router_async(data.query)
         
         processing_time = time.time() - start_time
         
@@ -102,7 +169,8 @@ def predict(data: QueryRequest):
             "mode": result["mode"],
             "confidence": result["confidence"],
             "language": result["language"],
-            "processing_time": round(processing_time, 2)
+            "processing_time": round(processing_time, 2),
+            "sources": result.get("sources")
         }
         
         logger.info(f"Response generated - Mode: {result['mode']}, "
@@ -118,6 +186,80 @@ def predict(data: QueryRequest):
             detail=f"Failed to process question: {str(e)}"
         )
 
+# =========================
+# BATCH PREDICTION ENDPOINT
+# =========================
+@app.post("/predict/batch", response_model=BatchPredictionResponse)
+async def predict_batch(data: List[QueryRequest]):
+    """
+    Answer a list of questions in one request.
+    
+    Offline retrieval runs as one batched pass and online calls fan out
+    with bounded concurrency (BATCH_CONCURRENCY). A failing item gets an
+    error entry; the rest of the batch is still answered.
+    """
+    if not data:
+        raise HTTPException(status_code=422, detail="Batch must contain at least one query")
+    if len(data) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(data)} queries (max {BATCH_MAX_ITEMS})"
+        )
+    
+    start_time = time.time()
+    logger.info(f"Received batch of {len(data)} queries")
+    
+    results = await tutor_router_batch([item.query for item in data])
+    
+    items = []
+    for index, result in enumerate(results):
+        if "error" in result:
+            items.append({"index": index, "error": result["error"]})
+            continue
+        items.append({"index": index, "result": {
+            "text": result["text"],
+            "mode": result["mode"],
+            "confidence": result["confidence"],
+            "language": result["language"],
+            "processing_time": result["processing_time"],
+            "sources": result.get("sources")
+        }})
+    
+    processing_time = time.time() - start_time
+    logger.info(f"Batch done - {len(items)} items, "
+               f"errors: {sum(1 for i in items if 'error' in i)}, "
+               f"Time: {processing_time:.2f}s")
+    
+    return {"results": items, "processing_time": round(processing_time, 2)}
+
+# =========================
+# STREAMING PREDICTION ENDPOINT
+# =========================
+@app.post("/predict/stream")
+async def predict_stream(data: QueryRequest):
+    """
+    Stream the answer as server-sent events.
+    
+    Events: meta (language, mode), token (text piece), switch (online
+    stream abandoned; discard text so far), done (mode, confidence,
+    sources, time_to_first_token, processing_time) and error.
+    """
+    logger.info(f"Received streaming query: {data.query[:100]}...")
+    
+    async def events():
+        try:
+            async for event in tutor_router_stream(data.query):
+                yield f"event: {event['event']}\ndata: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
+        except Exception as e:
+            logger.error(f"Error streaming query: {e}", exc_info=True)
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # =========================
 # TESTING ENDPOINT (Optional)
 # =========================
@@ -0,0 +1,230 @@
+"""
+Per-request timing spans and Prometheus metrics (no client library).
+
+A RequestTrace is bound to the current context with start_trace(); code
+anywhere on the request path (router, online_model, offline_rag) adds
+spans to it via current_trace(). contextvars follow asyncio tasks and
+asyncio.to_thread, so hedged online/offline work lands in one trace.
+
+finish() folds the spans into histograms labeled by final mode and
+language and logs one structured line per request. render_prometheus()
+produces the text exposition format served at GET /metrics.
+"""
+
+import contextvars
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans range from sub-millisecond detection to multi-second LLM calls
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+
+# =========================
+# METRIC TYPES
+# =========================
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value) -> str:
+    # "%g" would round large counts (postings, tokens) to 6 significant digits
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def values(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # key -> [per-bucket counts..., +Inf count, sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    le = f'le="{bound:g}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {count}")
+                count = series[len(self.buckets)]
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {series[-1]:.6f}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+# =========================
+# REGISTRY
+# =========================
+REQUESTS = Counter(
+    "tutor_requests_total", "Answered tutor requests", ("mode", "language")
+)
+REQUEST_LATENCY = Histogram(
+    "tutor_request_duration_seconds", "End-to-end router latency", ("mode", "language")
+)
+STAGE_LATENCY = Histogram(
+    "tutor_stage_duration_seconds", "Latency of one request stage",
+    ("stage", "mode", "language")
+)
+ONLINE_TOKENS = Counter(
+    "tutor_online_tokens_total", "Tokens reported by the online model", ("kind", "language")
+)
+
+REGISTRY = [REQUESTS, REQUEST_LATENCY, STAGE_LATENCY, ONLINE_TOKENS]
+
+
+def register(metric):
+    """Add a metric defined elsewhere to the /metrics output."""
+    REGISTRY.append(metric)
+    return metric
+
+
+def render_prometheus() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# =========================
+# REQUEST TRACES
+# =========================
+class RequestTrace:
+    """
+    Spans (stage -> seconds) and attributes collected for one request,
+    plus its deadline (perf_counter() value, or None for no deadline).
+    """
+
+    def __init__(self, deadline_seconds: float = None):
+        self.start = time.perf_counter()
+        self.deadline = self.start + deadline_seconds if deadline_seconds else None
+        self.spans = {}
+        self.attributes = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self.spans[stage] = self.spans.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def span(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def set(self, **attributes):
+        with self._lock:
+            self.attributes.update(attributes)
+
+    def remaining(self):
+        """Seconds left before the deadline (may be negative), or None."""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.perf_counter()
+
+    def finish(self, mode: str, language: str):
+        total = time.perf_counter() - self.start
+
+        REQUESTS.inc(mode=mode, language=language)
+        REQUEST_LATENCY.observe(total, mode=mode, language=language)
+        with self._lock:
+            spans = dict(self.spans)
+            attributes = dict(self.attributes)
+        for stage, seconds in spans.items():
+            STAGE_LATENCY.observe(seconds, stage=stage, mode=mode, language=language)
+        for kind in ("prompt_tokens", "completion_tokens"):
+            if attributes.get(kind):
+                ONLINE_TOKENS.inc(attributes[kind], kind=kind[:-len("_tokens")], language=language)
+
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("request trace %s", json.dumps({
+                "mode": mode,
+                "language": language,
+                "total_ms": round(total * 1000, 2),
+                "spans_ms": {stage: round(s * 1000, 2) for stage, s in spans.items()},
+                **attributes,
+            }, ensure_ascii=False))
+
+
+class _NullTrace(RequestTrace):
+    """Trace used outside a request (CLI, benchmarks); records nothing."""
+
+    def record(self, stage: str, seconds: float):
+        pass
+
+    def set(self, **attributes):
+        pass
+
+    def finish(self, mode: str, language: str):
+        pass
+
+
+_NULL_TRACE = _NullTrace()
+_current = contextvars.ContextVar("request_trace", default=_NULL_TRACE)
+
+
+def start_trace(deadline_seconds: float = None) -> RequestTrace:
+    trace = RequestTrace(deadline_seconds)
+    _current.set(trace)
+    return trace
+
+
+def current_trace() -> RequestTrace:
+    return _current.get()
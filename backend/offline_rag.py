@@ -1,115 +1,1019 @@
 ﻿# offline_rag.py
-import json
-import re
+import logging
+import math
 import os
-from collections import Counter
+import heapq
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; batch queries fall back to the index
+    np = None
+
+from config import (
+    VECTOR_DIR,
+    TOP_K,
+    DENSE_RETRIEVAL,
+    DENSE_MIN_SIMILARITY,
+    DENSE_FUSION_DEPTH,
+    SHARD_SEARCH_THREADS,
+    SHARD_MAX_SHARDS,
+)
+from analyzer import analyze
+from chunk_store import ChunkFile, iter_chunks, subject_files
+import dense_retriever
+from answer_builder import compose_answer
+from metrics import Counter as MetricsCounter, current_trace, register
+
+logger = logging.getLogger(__name__)
+
+# BM25 parameters (standard Robertson/Sparck Jones defaults)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Retrieval work (pruning, shard routing, dense search), exported at
+# /metrics and summarized by get_retrieval_stats(); updated from the
+# request threads and the shard pool, hence the locked metric counters
+RETRIEVAL_WORK = register(MetricsCounter(
+    "tutor_offline_retrieval_total",
+    "Offline retrieval work: keyword queries, documents scored, postings evaluated "
+    "and skipped by pruning, shards searched and skipped, dense queries",
+    ("stat",)
+))
+DENSE_SECONDS = register(MetricsCounter(
+    "tutor_offline_dense_seconds_total",
+    "Time spent embedding questions and searching dense indexes"
+))
 
-VECTOR_FOLDER = "vector_store"
-TOP_K = 3
 
-print("[INFO] Loading Keyword-Based Offline RAG...")
+# ---------------------------
+# LOAD ALL JSON FILES
+# ---------------------------
+def scan_vector_dir(vector_dir=VECTOR_DIR):
+    """
+    Map subject -> (path, signature) for every subject chunk file in vector_dir.
+
+    The signature (mtime_ns, size, dense meta mtime_ns) is what the
+    reload watcher compares to decide which subject files changed.
+    """
+    if not os.path.isdir(vector_dir):
+        raise FileNotFoundError(f"[ERROR] vector_store folder not found: {vector_dir}")
+
+    files = {}
+    for subject, path in subject_files(vector_dir).items():
+        stat = os.stat(path)
+        dense_meta = os.path.splitext(path)[0] + dense_retriever.DENSE_META_SUFFIX
+        dense_mtime = os.stat(dense_meta).st_mtime_ns if os.path.exists(dense_meta) else None
+        files[subject] = (path, (stat.st_mtime_ns, stat.st_size, dense_mtime))
+    return files
+
+
+def load_subject_file(path: str, subject_name: str):
+    """
+    Documents of one subject chunk file. A .chunks store is returned as a
+    lazy, memory-mapped sequence; .json/.jsonl are read into dicts.
+    """
+    if path.endswith(".chunks"):
+        return ChunkFile(path, subject_name)
+
+    return [
+        {"subject": subject_name, "id": item.get("id", position), "content": item["content"]}
+        for position, item in enumerate(iter_chunks(path))
+    ]
 
-documents = []
 
 # ---------------------------
-# LOAD ALL JSON FILES
+# TOKENIZER
 # ---------------------------
-if not os.path.exists(VECTOR_FOLDER):
-    raise FileNotFoundError("[ERROR] vector_store folder not found.")
+def tokenize(text: str):
+    # Same multilingual analyzer for chunks (at index build) and queries
+    return analyze(text)
 
-for file in os.listdir(VECTOR_FOLDER):
-    if file.endswith(".json"):
-        path = os.path.join(VECTOR_FOLDER, file)
-        subject_name = os.path.splitext(file)[0]
 
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+# ---------------------------
+# INVERTED INDEX (BM25)
+# ---------------------------
+class PostingsView(Mapping):
+    """
+    term -> list of (doc_id, term_frequency) over the postings arrays
+    stored in a .chunks file; a term's list is decoded on first use.
+    """
+
+    def __init__(self, terms, indptr, doc_ids, tfs):
+        self.columns = dict(zip(terms, range(len(terms))))
+        self._indptr = indptr
+        self._doc_ids = doc_ids
+        self._tfs = tfs
+        self._decoded = {}
+
+    def __getitem__(self, term: str):
+        plist = self._decoded.get(term)
+        if plist is None:
+            col = self.columns[term]
+            start, end = int(self._indptr[col]), int(self._indptr[col + 1])
+            plist = list(zip(self._doc_ids[start:end].tolist(), self._tfs[start:end].tolist()))
+            self._decoded[term] = plist
+        return plist
+
+    def __contains__(self, term) -> bool:
+        return term in self.columns
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def __len__(self):
+        return len(self.columns)
+
+
+class BM25Index:
+    """
+    Inverted index over chunk texts, built once at load time.
+
+    postings maps term -> list of (doc_id, term_frequency), so a query
+    only touches documents that share at least one term with it.
+
+    stored: ChunkFile.keyword_index() postings written at ingest time.
+    With them (and NumPy) nothing is decoded or tokenized: IDF, length
+    norms and MaxScore bounds are computed over the mapped arrays.
+    """
+
+    def __init__(self, docs, k1: float = BM25_K1, b: float = BM25_B, stored=None):
+        self.docs = docs
+        self.k1 = k1
+        self.b = b
+        # (indptr, doc ids, BM25 weights) in CSR-by-term order, for BM25Matrix
+        self.csr = None
+
+        if stored is not None and np is not None:
+            self._load_stored(stored)
+            return
+
+        postings = defaultdict(list)
+        self.doc_lengths = []
+
+        for doc_id, doc in enumerate(docs):
+            counts = Counter(tokenize(doc["content"]))
+            self.doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings[term].append((doc_id, tf))
+
+        self.postings = dict(postings)
+
+        n_docs = len(docs)
+        self.avg_doc_length = sum(self.doc_lengths) / n_docs if n_docs else 0.0
+
+        self.idf = {
+            term: math.log(1 + (n_docs - len(plist) + 0.5) / (len(plist) + 0.5))
+            for term, plist in self.postings.items()
+        }
+        # IDF a term would get if it appeared in no document; used so that
+        # query words missing from the corpus still lower the confidence.
+        self.max_idf = math.log(1 + (n_docs + 0.5) / 0.5)
+
+        # Per-document length normalisation: k1 * (1 - b + b * dl / avgdl)
+        avg = self.avg_doc_length or 1.0
+        self.doc_norms = [
+            k1 * (1 - b + b * length / avg) for length in self.doc_lengths
+        ]
+
+        # Per-term score upper bounds for MaxScore pruning
+        self.max_scores = {
+            term: max(self.term_score(term, doc_id, tf) for doc_id, tf in plist)
+            for term, plist in self.postings.items()
+        }
+
+    def _load_stored(self, stored):
+        k1, b = self.k1, self.b
+        n_docs = len(self.docs)
+        doc_lengths = np.frombuffer(stored["doc_lengths"], dtype="<u4")
+        indptr = np.frombuffer(stored["indptr"], dtype="<u8").astype(np.int64)
+        doc_ids = np.frombuffer(stored["doc_ids"], dtype="<u4")
+        tfs = np.frombuffer(stored["tfs"], dtype="<u4")
+        terms = stored["terms"]
+
+        self.postings = PostingsView(terms, indptr, doc_ids, tfs)
+        self.doc_lengths = doc_lengths.tolist()
+        self.avg_doc_length = float(doc_lengths.mean()) if n_docs else 0.0
+
+        df = np.diff(indptr)
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+        self.idf = dict(zip(terms, idf.tolist()))
+        self.max_idf = math.log(1 + (n_docs + 0.5) / 0.5)
+
+        norms = k1 * (1 - b + b * doc_lengths / (self.avg_doc_length or 1.0))
+        self.doc_norms = norms.tolist()
+
+        weights = np.repeat(idf, df) * tfs * (k1 + 1) / (tfs + norms[doc_ids])
+        max_scores = np.maximum.reduceat(weights, indptr[:-1]) if len(terms) else weights
+        self.max_scores = dict(zip(terms, max_scores.tolist()))
+        self.csr = (indptr, doc_ids, weights, idf)
+
+    def term_score(self, term: str, doc_id: int, tf: int) -> float:
+        """BM25 contribution of one (term, document) posting."""
+        norm = self.doc_norms[doc_id]
+        return self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+
+    def upper_bound(self, query_counts) -> float:
+        """Highest score any document in this index can reach for a query."""
+        return sum(
+            qtf * self.max_scores.get(term, 0.0) for term, qtf in query_counts.items()
+        )
+
+    def search(self, query_terms, top_k: int = TOP_K):
+        """
+        Top-K BM25 search with MaxScore dynamic pruning.
+
+        Query terms are ordered by their score upper bound. Once the
+        k-th best score so far exceeds the summed upper bounds of the
+        weakest terms, those terms become non-essential: documents that
+        only appear in them can never enter the top-K and are not visited,
+        and for other documents they are looked up (by bisect) only while
+        they can still lift the score over the threshold.
+
+        Returns:
+            (hits, coverage) where hits is a list of (score, doc_id) sorted
+            best-first, and coverage maps doc_id -> fraction of the query's
+            IDF mass matched by that document.
+        """
+        query_counts = Counter(query_terms)
+
+        total_idf = 0.0
+        terms = []
+        for term, qtf in query_counts.items():
+            total_idf += self.idf.get(term, self.max_idf) * qtf
+            if term in self.postings:
+                terms.append((qtf * self.max_scores[term], term, qtf))
+
+        # Weakest terms first so non-essential ones form a prefix
+        terms.sort(key=lambda x: x[0])
+        n_terms = len(terms)
+        plists = [self.postings[term] for _, term, _ in terms]
+
+        prefix_ub = []
+        running = 0.0
+        for ub, _, _ in terms:
+            running += ub
+            prefix_ub.append(running)
+
+        cursors = [0] * n_terms
+        heap = []  # min-heap of (score, -doc_id), at most top_k entries
+        threshold = 0.0
+        first_essential = 0
+        evaluated = 0
+        scored = 0
+
+        while True:
+            while first_essential < n_terms and prefix_ub[first_essential] <= threshold:
+                first_essential += 1
+            if first_essential == n_terms:
+                break
+
+            # Next candidate: smallest doc id under an essential cursor
+            doc_id = None
+            for i in range(first_essential, n_terms):
+                if cursors[i] < len(plists[i]):
+                    candidate = plists[i][cursors[i]][0]
+                    if doc_id is None or candidate < doc_id:
+                        doc_id = candidate
+            if doc_id is None:
+                break
+
+            score = 0.0
+            for i in range(first_essential, n_terms):
+                plist = plists[i]
+                if cursors[i] < len(plist) and plist[cursors[i]][0] == doc_id:
+                    _, term, qtf = terms[i]
+                    score += qtf * self.term_score(term, doc_id, plist[cursors[i]][1])
+                    cursors[i] += 1
+                    evaluated += 1
+
+            # Non-essential terms, strongest first, while they can still matter
+            for i in range(first_essential - 1, -1, -1):
+                if score + prefix_ub[i] <= threshold:
+                    break
+                plist = plists[i]
+                pos = bisect_left(plist, (doc_id,), cursors[i])
+                cursors[i] = pos
+                if pos < len(plist) and plist[pos][0] == doc_id:
+                    _, term, qtf = terms[i]
+                    score += qtf * self.term_score(term, doc_id, plist[pos][1])
+                    evaluated += 1
+
+            scored += 1
+            entry = (score, -doc_id)
+            if len(heap) < top_k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+            if len(heap) == top_k:
+                threshold = heap[0][0]
+
+        RETRIEVAL_WORK.inc(stat="queries")
+        RETRIEVAL_WORK.inc(scored, stat="documents_scored")
+        RETRIEVAL_WORK.inc(evaluated, stat="postings_evaluated")
+        RETRIEVAL_WORK.inc(sum(len(p) for p in plists) - evaluated, stat="postings_skipped")
+
+        hits = [(score, -neg_doc) for score, neg_doc in sorted(heap, reverse=True)]
+
+        coverage = {}
+        for _, doc_id in hits:
+            matched = 0.0
+            for _, term, qtf in terms:
+                plist = self.postings[term]
+                pos = bisect_left(plist, (doc_id,))
+                if pos < len(plist) and plist[pos][0] == doc_id:
+                    matched += self.idf[term] * qtf
+            coverage[doc_id] = matched / total_idf if total_idf else 0.0
+
+        return hits, coverage
 
-            for item in data:
-                documents.append({
-                    "subject": subject_name,
-                    "content": item["content"]
-                })
 
-print(f"[INFO] Loaded {len(documents)} total chunks from all subjects")
+# ---------------------------
+# SPARSE MATRIX VIEW (NumPy)
+# ---------------------------
+# Upper bound on the query x doc score cells BM25Matrix.search_batch
+# holds at once (two float64 arrays): queries are scored in blocks of
+# about this many cells instead of one queries x docs array
+BATCH_SCORE_CELLS = 1 << 22
+
+
+class BM25Matrix:
+    """
+    NumPy view of a BM25Index for scoring many queries at once.
+
+    The doc x term matrix of precomputed BM25 weights is stored
+    compressed by term (indptr / indices / weights), which is the layout a
+    query x doc product needs: each query term selects one contiguous
+    slice of documents.
+    """
+
+    def __init__(self, index: BM25Index):
+        self.docs = index.docs
+        self.n_docs = len(index.docs)
+        self.max_idf = index.max_idf
+
+        if index.csr is not None:
+            # Stored postings: the arrays are already in this layout
+            self.vocab = index.postings.columns
+            self.indptr, indices, self.weights, self.idf = index.csr
+            self.indices = indices.astype(np.int64)
+            return
+
+        self.vocab = {term: col for col, term in enumerate(index.postings)}
+
+        indptr = [0]
+        indices = []
+        weights = []
+        k1 = index.k1
+
+        for term, plist in index.postings.items():
+            for doc_id, tf in plist:
+                norm = index.doc_norms[doc_id]
+                indices.append(doc_id)
+                weights.append(index.idf[term] * tf * (k1 + 1) / (tf + norm))
+            indptr.append(len(indices))
+
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.idf = np.asarray(
+            [index.idf[term] for term in self.vocab], dtype=np.float64
+        )
+
+    def search_batch(self, batch_terms, top_k: int = TOP_K):
+        """
+        Score a batch of tokenized queries as sparse products, one block
+        of queries at a time so memory stays within BATCH_SCORE_CELLS.
+
+        Returns one (hits, coverage) pair per query, in the same shape as
+        BM25Index.search.
+        """
+        if not self.n_docs:
+            return [([], {}) for _ in batch_terms]
+
+        block = max(1, BATCH_SCORE_CELLS // self.n_docs)
+        results = []
+        for start in range(0, len(batch_terms), block):
+            results.extend(self._search_block(batch_terms[start:start + block], top_k))
+        return results
+
+    def _search_block(self, batch_terms, top_k: int):
+        n_queries = len(batch_terms)
+        results = [([], {}) for _ in range(n_queries)]
+
+        # Query matrix in COO form; unknown terms only count towards the
+        # IDF mass used for confidence.
+        q_rows, q_cols, q_vals = [], [], []
+        total_idf = np.zeros(n_queries)
+
+        for row, terms in enumerate(batch_terms):
+            for term, qtf in Counter(terms).items():
+                col = self.vocab.get(term)
+                if col is None:
+                    total_idf[row] += self.max_idf * qtf
+                    continue
+                total_idf[row] += self.idf[col] * qtf
+                q_rows.append(row)
+                q_cols.append(col)
+                q_vals.append(qtf)
+
+        if not q_rows:
+            return results
+
+        q_rows = np.asarray(q_rows, dtype=np.int64)
+        q_cols = np.asarray(q_cols, dtype=np.int64)
+        q_vals = np.asarray(q_vals, dtype=np.float64)
+
+        # Expand every (query, term) pair into its postings slice without a
+        # Python loop: positions start_i + 0..len_i-1 for each pair.
+        starts = self.indptr[q_cols]
+        lengths = self.indptr[q_cols + 1] - starts
+        total = int(lengths.sum())
+        positions = (
+            np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+            + np.arange(total)
+        )
+
+        doc_ids = self.indices[positions]
+        rows = np.repeat(q_rows, lengths)
+        qtf = np.repeat(q_vals, lengths)
+        flat = rows * self.n_docs + doc_ids
+        size = n_queries * self.n_docs
+
+        scores = np.bincount(
+            flat, weights=qtf * self.weights[positions], minlength=size
+        ).reshape(n_queries, self.n_docs)
+        matched_idf = np.bincount(
+            flat, weights=qtf * self.idf[np.repeat(q_cols, lengths)], minlength=size
+        ).reshape(n_queries, self.n_docs)
+
+        k = min(top_k, self.n_docs)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+        for row in range(n_queries):
+            candidates = top[row]
+            candidates = candidates[np.argsort(-scores[row, candidates], kind="stable")]
+            hits = [
+                (float(scores[row, doc_id]), int(doc_id))
+                for doc_id in candidates
+                if scores[row, doc_id] > 0
+            ]
+            coverage = {
+                doc_id: float(matched_idf[row, doc_id] / total_idf[row])
+                for _, doc_id in hits
+            }
+            results[row] = (hits, coverage)
+
+        return results
 
 
 # ---------------------------
-# STOPWORDS
+# LAZY STORE
 # ---------------------------
-STOPWORDS = set([
-    "is", "are", "was", "were", "the", "a", "an",
-    "what", "why", "how", "when", "where",
-    "and", "or", "of", "to", "in", "on", "for",
-    "क्या", "कैसे", "क्यों", "है", "में",
-    "आहे", "का", "मध्ये"
-])
+class SubjectFile:
+    """
+    One shard: the chunks of one vector_store/<subject> file and the
+    indexes built over them alone.
+    """
+
+    def __init__(self, subject: str, path: str, signature):
+        self.subject = subject
+        self.path = path
+        self.signature = signature
+        self.documents = load_subject_file(path, subject)
+        stored = self.documents.keyword_index() if isinstance(self.documents, ChunkFile) else None
+        self.index = BM25Index(self.documents, stored=stored)
+        self.matrix = BM25Matrix(self.index) if np is not None else None
+        self.dense = (
+            dense_retriever.load_dense_index(path, self.documents)
+            if DENSE_RETRIEVAL else None
+        )
+
+
+# Optional pool for searching routed shards concurrently
+_shard_pool = (
+    ThreadPoolExecutor(SHARD_SEARCH_THREADS, thread_name_prefix="offline-rag-shard")
+    if SHARD_SEARCH_THREADS > 1 else None
+)
+
+
+class DocumentView:
+    """Global doc id -> document dict across shards, without copying them."""
+
+    def __init__(self, shards):
+        self._offsets = [offset for offset, _ in shards]
+        self._shards = [shard for _, shard in shards]
+        self._count = sum(len(shard.documents) for shard in self._shards)
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, doc_id: int):
+        if not 0 <= doc_id < self._count:
+            raise IndexError(doc_id)
+        i = bisect_right(self._offsets, doc_id) - 1
+        return self._shards[i].documents[doc_id - self._offsets[i]]
+
+    def __iter__(self):
+        for shard in self._shards:
+            yield from shard.documents
+
+
+class OfflineStore:
+    """
+    Immutable snapshot of the per-subject shards.
+
+    Readers grab one snapshot per query and use it throughout, so a reload
+    swapping in a new snapshot never exposes a half-built index. Doc ids
+    returned by the search methods are global: shard offset + local id.
+    """
+
+    def __init__(self, subject_files):
+        self.subject_files = subject_files
+
+        self.shards = []  # (doc_id offset, SubjectFile)
+        offset = 0
+        for subject in sorted(subject_files):
+            subject_file = subject_files[subject]
+            self.shards.append((offset, subject_file))
+            offset += len(subject_file.documents)
+
+        self.documents = DocumentView(self.shards)
+
+        self.shards_by_subject = {shard.subject: (offset, shard) for offset, shard in self.shards}
+        self.terms = sum(len(shard.index.postings) for _, shard in self.shards)
+        self.has_dense = any(shard.dense is not None for _, shard in self.shards)
+        self.dense_bytes = sum(shard.dense.bytes for _, shard in self.shards if shard.dense is not None)
+
+    def _target_shards(self, subject: str = None):
+        if not subject:
+            return self.shards
+        entry = self.shards_by_subject.get(subject)
+        return [entry] if entry else []
+
+    def route(self, query_terms):
+        """
+        Pick shards for an unfiltered query from per-shard term statistics.
+
+        Returns (upper_bound, offset, shard) for every shard containing a
+        query term, highest bound first, capped at SHARD_MAX_SHARDS.
+        """
+        query_counts = Counter(query_terms)
+        routed = []
+        for offset, shard in self.shards:
+            bound = shard.index.upper_bound(query_counts)
+            if bound > 0:
+                routed.append((bound, offset, shard))
+
+        routed.sort(key=lambda x: x[0], reverse=True)
+        if SHARD_MAX_SHARDS > 0:
+            routed = routed[:SHARD_MAX_SHARDS]
+        return routed
+
+    def keyword_search(self, query_terms, subject: str = None, top_k: int = TOP_K):
+        """
+        BM25 top-K over the subject's shard, or over routed shards.
+
+        Shards are visited in upper-bound order and the walk stops once
+        the k-th best score so far beats the next shard's bound, since no
+        document there can enter the top-K. With SHARD_SEARCH_THREADS > 1
+        the routed shards are searched concurrently instead.
+        """
+        if subject:
+            routed = [(math.inf, offset, shard) for offset, shard in self._target_shards(subject)]
+        else:
+            routed = self.route(query_terms)
+
+        heap = []  # (score, -doc_id), at most top_k entries
+        coverage = {}
+
+        def merge(offset, hits, shard_coverage):
+            for score, doc_id in hits:
+                entry = (score, -(offset + doc_id))
+                if len(heap) < top_k:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+                coverage[offset + doc_id] = shard_coverage[doc_id]
+
+        searched = 0
+        if _shard_pool is not None and len(routed) > 1:
+            futures = [
+                (offset, _shard_pool.submit(shard.index.search, query_terms, top_k))
+                for _, offset, shard in routed
+            ]
+            for offset, future in futures:
+                merge(offset, *future.result())
+            searched = len(futures)
+        else:
+            for bound, offset, shard in routed:
+                if len(heap) == top_k and bound <= heap[0][0]:
+                    break
+                merge(offset, *shard.index.search(query_terms, top_k))
+                searched += 1
+
+        RETRIEVAL_WORK.inc(searched, stat="shards_searched")
+        RETRIEVAL_WORK.inc(len(self.shards) - searched, stat="shards_skipped")
+
+        hits = [(score, -neg_doc) for score, neg_doc in sorted(heap, reverse=True)]
+        return hits, {doc_id: coverage[doc_id] for _, doc_id in hits}
+
+    def keyword_search_batch(self, batch_terms, subject: str = None, top_k: int = TOP_K):
+        """Batched BM25 over the target shards' NumPy matrices, merged per query."""
+        merged = [([], {}) for _ in batch_terms]
+
+        for offset, shard in self._target_shards(subject):
+            shard_results = shard.matrix.search_batch(batch_terms, top_k)
+            for (hits, coverage), (shard_hits, shard_coverage) in zip(merged, shard_results):
+                for score, doc_id in shard_hits:
+                    hits.append((score, offset + doc_id))
+                    coverage[offset + doc_id] = shard_coverage[doc_id]
+
+        results = []
+        for hits, coverage in merged:
+            hits = sorted(hits, key=lambda x: x[0], reverse=True)[:top_k]
+            results.append((hits, {doc_id: coverage[doc_id] for _, doc_id in hits}))
+        return results
+
+    def dense_search(self, vectors, subject: str = None, k: int = DENSE_FUSION_DEPTH):
+        """
+        Search the per-subject faiss indexes for a batch of query vectors.
+
+        Returns one best-first list of (similarity, doc_id) per query.
+        """
+        results = [[] for _ in range(len(vectors))]
+
+        for offset, shard in self._target_shards(subject):
+            if shard.dense is None:
+                continue
+            scores, ids = shard.dense.search(vectors, k)
+            for row in range(len(vectors)):
+                results[row].extend(
+                    (float(score), offset + int(local_id))
+                    for score, local_id in zip(scores[row], ids[row])
+                    if local_id >= 0
+                )
+
+        return [sorted(hits, key=lambda x: x[0], reverse=True)[:k] for hits in results]
+
+
+_store = None
+_store_lock = threading.Lock()
+_watcher_stop = threading.Event()
+
+load_state = {
+    "status": "not_loaded",  # not_loaded | loading | ready | error
+    "chunks": 0,
+    "terms": 0,
+    "load_time": None,
+    "error": None,
+    "reloads": 0,
+    "last_reload": None,
+    "last_reload_time": None,
+    "shards": 0,
+    "dense_shards": 0,
+    "dense_index_bytes": 0,
+}
+
+
+def _update_ready_state(store: OfflineStore):
+    load_state.update({
+        "status": "ready",
+        "chunks": len(store.documents),
+        "terms": store.terms,
+        "error": None,
+        "shards": len(store.shards),
+        "dense_shards": sum(1 for _, shard in store.shards if shard.dense is not None),
+        "dense_index_bytes": store.dense_bytes,
+    })
+
+
+def get_store() -> OfflineStore:
+    """Return the offline store, loading it from VECTOR_DIR on first use."""
+    global _store
+
+    if _store is not None:
+        return _store
+
+    with _store_lock:
+        if _store is not None:
+            return _store
+
+        logger.info("Loading Keyword-Based Offline RAG from %s...", VECTOR_DIR)
+        load_state["status"] = "loading"
+        start = time.perf_counter()
+
+        try:
+            store = OfflineStore({
+                subject: SubjectFile(subject, path, signature)
+                for subject, (path, signature) in scan_vector_dir().items()
+            })
+        except Exception as e:
+            load_state["status"] = "error"
+            load_state["error"] = str(e)
+            raise
+
+        _update_ready_state(store)
+        load_state["load_time"] = round(time.perf_counter() - start, 3)
+        _store = store
+
+        logger.info(
+            "Loaded %d total chunks from all subjects, %d subject shards, %d terms in %ss",
+            len(store.documents), len(store.shards), store.terms, load_state["load_time"]
+        )
+        return _store
+
+
+def reload_store() -> bool:
+    """
+    Re-read subject files whose signature changed and swap in a new snapshot.
+
+    Only the shards of changed subjects are re-read and re-indexed;
+    unchanged shards are reused as they are. Returns True if a new snapshot was installed.
+    Does nothing until the store has been loaded once.
+    """
+    global _store
+
+    with _store_lock:
+        current = _store
+        if current is None:
+            return False
+
+        files = scan_vector_dir()
+        changed = [
+            subject for subject, (_, signature) in files.items()
+            if subject not in current.subject_files
+            or current.subject_files[subject].signature != signature
+        ]
+        removed = [subject for subject in current.subject_files if subject not in files]
+
+        if not changed and not removed:
+            return False
+
+        start = time.perf_counter()
+
+        subject_files = {
+            subject: subject_file
+            for subject, subject_file in current.subject_files.items()
+            if subject in files and subject not in changed
+        }
+        for subject in changed:
+            path, signature = files[subject]
+            subject_files[subject] = SubjectFile(subject, path, signature)
+
+        store = OfflineStore(subject_files)
+        elapsed = time.perf_counter() - start
+
+        # Single reference assignment: in-flight queries keep the old snapshot
+        _store = store
+        _update_ready_state(store)
+        load_state["reloads"] += 1
+        load_state["last_reload"] = time.time()
+        load_state["last_reload_time"] = round(elapsed, 3)
 
+        delta = len(store.documents) - len(current.documents)
+        logger.info(
+            "Reloaded vector_store in %.3fs (changed: %s; removed: %s; chunks %d -> %d, %+d)",
+            elapsed, ", ".join(changed) or "-", ", ".join(removed) or "-",
+            len(current.documents), len(store.documents), delta
+        )
+        return True
 
-def tokenize(text: str):
-    text = text.lower()
-    words = re.findall(r'\w+', text)
-    return [w for w in words if w not in STOPWORDS and len(w) > 2]
 
+def start_reload_watcher(interval: float) -> threading.Thread:
+    """
+    Poll VECTOR_DIR every interval seconds and hot-reload changed subjects.
 
-def keyword_score(question_words, chunk_text):
-    chunk_words = tokenize(chunk_text)
-    counter = Counter(chunk_words)
-    score = 0
-    for word in question_words:
-        score += counter[word]
-    return score
+    A file that fails to parse (e.g. ingest is still writing it) keeps the
+    previous snapshot and is retried on the next poll.
+    """
+    _watcher_stop.clear()
 
+    def _watch():
+        while not _watcher_stop.wait(interval):
+            try:
+                reload_store()
+            except Exception as e:
+                logger.warning("vector_store reload failed, keeping current index: %s", e)
 
-def retrieve_context(question: str, subject: str = None):
+    thread = threading.Thread(target=_watch, name="offline-rag-watcher", daemon=True)
+    thread.start()
+    return thread
+
+
+def stop_reload_watcher():
+    _watcher_stop.set()
+
+
+def warmup_in_background() -> threading.Thread:
+    """Start loading the offline store on a daemon thread."""
+
+    def _warmup():
+        try:
+            get_store()
+        except Exception as e:
+            logger.error("Offline RAG warmup failed: %s", e)
+
+    thread = threading.Thread(target=_warmup, name="offline-rag-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def get_load_state():
+    """Snapshot of the offline store load state for readiness checks."""
+    return dict(load_state)
+
+
+def _top_documents(store, hits, coverage):
+    if not hits:
+        return [], 0.0
+
+    top_documents = [store.documents[doc_id] for _, doc_id in hits]
+
+    confidence = min(1.0, coverage[hits[0][1]])
+
+    return top_documents, confidence
+
+
+def _build_context(store, hits, coverage):
+    top_documents, confidence = _top_documents(store, hits, coverage)
+
+    if not top_documents:
+        return "", 0.0
+
+    context = "\n\n---\n\n".join(doc["content"] for doc in top_documents)
+
+    return context, confidence
+
+
+def _fuse_dense(store, questions, keyword_results, subject: str = None, top_k: int = TOP_K):
+    """
+    Reciprocal-rank-fuse keyword hits with dense hits for each question.
+
+    Confidence for a fused document is its keyword IDF coverage when the
+    keyword retriever found it, otherwise its dense cosine similarity.
+    Dense-only hits below DENSE_MIN_SIMILARITY are dropped: nearest
+    neighbours always exist, even for an off-topic query.
+    """
+    start = time.perf_counter()
+    vectors = dense_retriever.get_embedder().embed(questions)
+    dense_results = store.dense_search(vectors, subject, max(DENSE_FUSION_DEPTH, top_k))
+    RETRIEVAL_WORK.inc(len(questions), stat="dense_queries")
+    DENSE_SECONDS.inc(time.perf_counter() - start)
+
+    fused = []
+    for (hits, coverage), dense_hits in zip(keyword_results, dense_results):
+        dense_hits = [
+            (score, doc_id) for score, doc_id in dense_hits
+            if score >= DENSE_MIN_SIMILARITY or doc_id in coverage
+        ]
+        ranking = dense_retriever.reciprocal_rank_fusion(
+            [[doc_id for _, doc_id in hits], [doc_id for _, doc_id in dense_hits]],
+            top_k=top_k
+        )
+        similarity = {doc_id: score for score, doc_id in dense_hits}
+        fused_coverage = {
+            doc_id: coverage.get(doc_id, max(0.0, similarity.get(doc_id, 0.0)))
+            for _, doc_id in ranking
+        }
+        fused.append((ranking, fused_coverage))
+
+    return fused
+
+
+def _search(store, question: str, subject: str = None, top_k: int = TOP_K):
     question_words = tokenize(question)
 
     if not question_words:
-        return "", 0.0
+        return [], {}
 
-    scores = []
+    if not store.has_dense:
+        return store.keyword_search(question_words, subject, top_k)
 
-    for doc in documents:
+    keyword = store.keyword_search(question_words, subject, max(DENSE_FUSION_DEPTH, top_k))
+    return _fuse_dense(store, [question], [keyword], subject, top_k)[0]
 
-        # If subject filtering is enabled
-        if subject and doc["subject"] != subject:
-            continue
 
-        score = keyword_score(question_words, doc["content"])
-        scores.append((score, doc["content"]))
+def _search_batch(store, questions, subject: str = None):
+    batch_terms = [tokenize(q) for q in questions]
 
-    if not scores:
-        return "", 0.0
+    if not store.has_dense:
+        return store.keyword_search_batch(batch_terms, subject, TOP_K)
 
-    scores.sort(reverse=True, key=lambda x: x[0])
+    results = store.keyword_search_batch(batch_terms, subject, DENSE_FUSION_DEPTH)
+    rows = [row for row, terms in enumerate(batch_terms) if terms]
+    if rows:
+        fused = _fuse_dense(store, [questions[row] for row in rows], [results[row] for row in rows], subject)
+        for row, result in zip(rows, fused):
+            results[row] = result
 
-    top_chunks = [c for s, c in scores[:TOP_K] if s > 0]
+    return results
 
-    if not top_chunks:
-        return "", 0.0
 
-    confidence = min(1.0, scores[0][0] / len(question_words))
+def retrieve_context(question: str, subject: str = None):
+    store = get_store()
+    hits, coverage = _search(store, question, subject)
 
-    context = "\n\n---\n\n".join(top_chunks)
+    return _build_context(store, hits, coverage)
 
-    return context, confidence
 
+def retrieve_chunks(question: str, subject: str = None, top_k: int = TOP_K):
+    """Like retrieve_context, but returns the top document dicts (with ids)."""
+    store = get_store()
+    hits, coverage = _search(store, question, subject, top_k)
 
-def generate_answer(context: str, question: str, language: str):
-    if not context:
-        return None
+    return _top_documents(store, hits, coverage)
 
-    # Keep simple structured answer for offline mode
-    return context
 
+def get_retrieval_stats():
+    """
+    Cumulative retrieval counters: queries, documents scored, postings
+    skipped by pruning, and dense query count / average latency.
+    """
+    stats = {key[0]: int(value) for key, value in RETRIEVAL_WORK.values().items()}
+    if stats.get("dense_queries"):
+        stats["dense_time_ms"] = round(DENSE_SECONDS.values().get((), 0.0) * 1000, 3)
+        stats["dense_avg_ms"] = round(stats["dense_time_ms"] / stats["dense_queries"], 3)
+    return stats
 
-def run_offline_rag(question: str, language: str, subject: str = None):
 
-    context, confidence = retrieve_context(question, subject)
+def retrieve_chunks_batch(questions, subject: str = None):
+    """Batched retrieve_chunks: a list of (documents, confidence) tuples."""
+    if np is None:
+        return [retrieve_chunks(q, subject) for q in questions]
 
-    if not context:
+    store = get_store()
+    results = _search_batch(store, questions, subject)
+
+    return [_top_documents(store, hits, coverage) for hits, coverage in results]
+
+
+def generate_answer(chunks, question: str, language: str):
+    """
+    Compose a compact extractive answer from the retrieved chunks.
+
+    Returns a dict with "text" and "sources", or None.
+    """
+    if not chunks:
         return None
 
-    answer = generate_answer(context, question, language)
+    return compose_answer(question, chunks)
+
+
+def answer_offline(question: str, language: str, subject: str = None, retrieved=None):
+    """
+    Offline answer with metadata.
+
+    retrieved: optional (chunks, confidence) from an earlier
+    retrieve_chunks call, to skip retrieval.
+
+    Returns a dict with "text", "sources" and "confidence", or None when
+    nothing relevant was retrieved.
+    """
+    trace = current_trace()
 
+    if retrieved is None:
+        with trace.span("retrieval"):
+            retrieved = retrieve_chunks(question, subject)
+    chunks, confidence = retrieved
+
+    with trace.span("answer_building"):
+        answer = generate_answer(chunks, question, language)
+
+    if not answer:
+        return None
+
+    answer["confidence"] = confidence
     return answer
+
+
+def answer_offline_batch(questions, languages, subject: str = None):
+    """
+    answer_offline for many questions with one batched retrieval pass.
+
+    Returns a list aligned with questions of answer dicts or None.
+    """
+    answers = []
+    for (chunks, confidence), question, language in zip(
+            retrieve_chunks_batch(questions, subject), questions, languages):
+        answer = generate_answer(chunks, question, language)
+        if answer:
+            answer["confidence"] = confidence
+        answers.append(answer)
+
+    return answers
+
+
+def run_offline_rag(question: str, language: str, subject: str = None):
+
+    answer = answer_offline(question, language, subject)
+
+    if not answer:
+        return None
+
+    return answer["text"]
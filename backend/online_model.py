@@ -1,8 +1,15 @@
-﻿import os
+﻿import asyncio
+import contextvars
+import importlib.util
+import logging
+import threading
+import time
 from pathlib import Path
+from typing import Optional
 
+import httpx
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import APIConnectionError, APIStatusError, AsyncOpenAI, OpenAI
 
 # =========================
 # CONFIG
@@ -11,25 +18,295 @@ BASE_DIR = Path(__file__).resolve().parent
 load_dotenv(BASE_DIR / ".env")
 load_dotenv(BASE_DIR.parent / ".env")
 
-_client = None
+from config import (
+    GROQ_BASE_URLS,
+    GROQ_API_KEYS,
+    ONLINE_MODEL,
+    ONLINE_TEMPERATURE,
+    ONLINE_TOP_P,
+    ONLINE_MAX_TOKENS,
+    ONLINE_CONTEXT_CHARS,
+    BREAKER_PROBE_TIMEOUT,
+    BREAKER_SLOW_CALL_SECONDS,
+    ONLINE_LATENCY_BUDGET,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP2,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    HTTP_WRITE_TIMEOUT,
+    HTTP_POOL_TIMEOUT,
+)
+from circuit_breaker import CircuitBreaker
+from metrics import Counter, current_trace, register
 
+logger = logging.getLogger(__name__)
 
-def _get_client() -> OpenAI:
-    global _client
+# =========================
+# HTTP TRANSPORT (shared by every endpoint and thread)
+# =========================
+# perf_counter() when the current upstream attempt was sent
+_attempt_start = contextvars.ContextVar("online_attempt_start", default=None)
+
+HTTP_CONNECTIONS = register(Counter(
+    "tutor_online_http_requests_total",
+    "Upstream HTTP requests by connection reuse (hit = pooled keep-alive connection)",
+    ("pool",)
+))
+
+_http_client = None
+_async_http_client = None
+_async_http_loop = None
+_http_lock = threading.Lock()
+
+
+def _http2_enabled() -> bool:
+    if HTTP2 and importlib.util.find_spec("h2") is None:
+        logger.warning("HTTP2=true but the h2 package is not installed; using HTTP/1.1")
+        return False
+    return HTTP2
+
+
+def _transport_settings() -> dict:
+    return {
+        "timeout": httpx.Timeout(
+            connect=HTTP_CONNECT_TIMEOUT,
+            read=HTTP_READ_TIMEOUT,
+            write=HTTP_WRITE_TIMEOUT,
+            pool=HTTP_POOL_TIMEOUT
+        ),
+        "limits": httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        ),
+        "http2": _http2_enabled(),
+        "follow_redirects": True,
+    }
+
+
+def _pool_tracer():
+    """httpcore trace callback: a request is a pool miss if it opened a connection."""
+    connected = False
+
+    def trace(event: str, info: dict):
+        nonlocal connected
+        if event == "connection.connect_tcp.started":
+            connected = True
+        elif event.endswith("send_request_headers.started"):
+            HTTP_CONNECTIONS.inc(pool="miss" if connected else "hit")
+
+    return trace
+
+
+def _pool_tracer_async():
+    trace = _pool_tracer()
+
+    async def async_trace(event: str, info: dict):
+        trace(event, info)
+
+    return async_trace
+
+
+def _on_request(request: httpx.Request):
+    request.extensions["trace"] = _pool_tracer()
 
-    if _client is not None:
-        return _client
 
-    api_key = (os.getenv("GROQ_API_KEY") or os.getenv("OPENAI_API_KEY") or "").strip()
-    if not api_key:
-        raise RuntimeError(
-            "Missing API key. Set GROQ_API_KEY in Gyaan_Setu/backend/.env "
-            "or export OPENAI_API_KEY."
+async def _on_request_async(request: httpx.Request):
+    request.extensions["trace"] = _pool_tracer_async()
+
+
+def _record_ttfb(response: httpx.Response):
+    # httpx runs response hooks once headers arrive, before the body is read
+    start = _attempt_start.get()
+    if start is not None:
+        current_trace().record("online_ttfb", time.perf_counter() - start)
+
+
+async def _record_ttfb_async(response: httpx.Response):
+    _record_ttfb(response)
+
+
+def _get_http_client() -> httpx.Client:
+    """Process-wide connection pool for sync calls (httpx.Client is thread-safe)."""
+    global _http_client
+
+    if _http_client is None:
+        with _http_lock:
+            if _http_client is None:
+                _http_client = httpx.Client(
+                    **_transport_settings(),
+                    event_hooks={"request": [_on_request], "response": [_record_ttfb]}
+                )
+    return _http_client
+
+
+def _get_async_http_client() -> httpx.AsyncClient:
+    """Connection pool for async calls, one per running event loop."""
+    global _async_http_client, _async_http_loop
+
+    loop = asyncio.get_running_loop()
+    if _async_http_client is None or _async_http_loop is not loop:
+        _async_http_client = httpx.AsyncClient(
+            **_transport_settings(),
+            event_hooks={"request": [_on_request_async], "response": [_record_ttfb_async]}
         )
+        _async_http_loop = loop
+    return _async_http_client
+
+
+def _call_timeout() -> httpx.Timeout:
+    """
+    Timeout for one upstream attempt: the configured timeouts, capped by
+    what is left of the request deadline. Raises TimeoutError if none is.
+    """
+    remaining = current_trace().remaining()
+    if remaining is None:
+        return httpx.Timeout(
+            connect=HTTP_CONNECT_TIMEOUT, read=HTTP_READ_TIMEOUT,
+            write=HTTP_WRITE_TIMEOUT, pool=HTTP_POOL_TIMEOUT
+        )
+    if remaining <= 0:
+        raise TimeoutError("Request deadline exceeded before the online call")
+    return httpx.Timeout(
+        connect=min(HTTP_CONNECT_TIMEOUT, remaining),
+        read=min(HTTP_READ_TIMEOUT, remaining),
+        write=min(HTTP_WRITE_TIMEOUT, remaining),
+        pool=min(HTTP_POOL_TIMEOUT, remaining)
+    )
+
+
+def _within_deadline(awaitable):
+    """
+    Bound awaitable by what is left of the request deadline (None: no
+    limit). asyncio.wait_for rather than asyncio.timeout (3.11+).
+    """
+    return asyncio.wait_for(awaitable, current_trace().remaining())
+
+
+def get_pool_stats() -> dict:
+    """Upstream HTTP requests served on pooled vs new connections."""
+    counts = {key[0]: int(value) for key, value in HTTP_CONNECTIONS.values().items()}
+    total = sum(counts.values())
+    return {
+        "hits": counts.get("hit", 0),
+        "misses": counts.get("miss", 0),
+        "hit_rate": round(counts.get("hit", 0) / total, 4) if total else None,
+        "http2": _http2_enabled(),
+    }
 
-    base_url = (os.getenv("GROQ_BASE_URL") or "https://api.groq.com/openai/v1").strip()
-    _client = OpenAI(api_key=api_key, base_url=base_url)
-    return _client
+
+# =========================
+# ENDPOINT POOL (failover + circuit breakers)
+# =========================
+class CircuitOpenError(RuntimeError):
+    """Every online endpoint is unavailable; callers should go offline."""
+
+
+class Endpoint:
+    """
+    One OpenAI-compatible upstream with lazily created clients and a breaker.
+
+    The SDK clients never retry; max_retries is applied by _create and
+    _create_async so the request deadline bounds every attempt together.
+    """
+
+    def __init__(self, base_url: str, api_key: str, max_retries: int = 2):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.max_retries = max_retries
+        self.breaker = CircuitBreaker(base_url, probe=self.probe)
+        self._client = None
+        self._async_client = None
+        self._async_http_client = None
+
+    @property
+    def client(self) -> OpenAI:
+        if self._client is None:
+            self._client = OpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                max_retries=0,
+                http_client=_get_http_client()
+            )
+        return self._client
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        http_client = _get_async_http_client()
+        if self._async_client is None or self._async_http_client is not http_client:
+            self._async_client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                max_retries=0,
+                http_client=http_client
+            )
+            self._async_http_client = http_client
+        return self._async_client
+
+    def probe(self):
+        """Cheap health check used while the circuit is open."""
+        self.client.with_options(timeout=BREAKER_PROBE_TIMEOUT, max_retries=0).models.list()
+
+
+_endpoints = None
+_endpoints_lock = threading.Lock()
+
+
+def _get_endpoints():
+    global _endpoints
+
+    if _endpoints is not None:
+        return _endpoints
+
+    with _endpoints_lock:
+        if _endpoints is None:
+            if not GROQ_API_KEYS:
+                raise RuntimeError(
+                    "Missing API key. Set GROQ_API_KEY in Gyaan_Setu/backend/.env "
+                    "or export OPENAI_API_KEY."
+                )
+            # With several endpoints, failing over beats SDK retries on a dead one
+            max_retries = 2 if len(GROQ_BASE_URLS) == 1 else 0
+            _endpoints = [
+                Endpoint(url, GROQ_API_KEYS[min(i, len(GROQ_API_KEYS) - 1)], max_retries)
+                for i, url in enumerate(GROQ_BASE_URLS)
+            ]
+            logger.info("Online endpoints: %s", ", ".join(e.base_url for e in _endpoints))
+
+    return _endpoints
+
+
+def _available_endpoints():
+    """Endpoints with a closed circuit, in failover order."""
+    available = [e for e in _get_endpoints() if e.breaker.allow_request()]
+    if not available:
+        raise CircuitOpenError("All online endpoints have open circuits")
+    return available
+
+
+def is_online_available() -> bool:
+    """True if an API key is configured and some endpoint's circuit is closed."""
+    try:
+        return any(e.breaker.allow_request() for e in _get_endpoints())
+    except RuntimeError:
+        return False
+
+
+def get_upstream_status() -> dict:
+    """Breaker state per online endpoint (for the API and logs)."""
+    try:
+        endpoints = _get_endpoints()
+    except RuntimeError as e:
+        return {"available": False, "error": str(e), "endpoints": []}
+
+    statuses = [e.breaker.status() for e in endpoints]
+    return {
+        "available": any(s["state"] == "closed" for s in statuses),
+        "endpoints": statuses,
+        "connection_pool": get_pool_stats(),
+    }
 
 # =========================
 # LANGUAGE-SPECIFIC SYSTEM PROMPTS
@@ -112,47 +389,268 @@ Provide a focused, educational response.""",
 }
 
 
-def run_online_model(question: str, language: str) -> str:
+# =========================
+# RETRIEVED CONTEXT (confidence-gated routing)
+# =========================
+CONTEXT_INSTRUCTIONS = {
+    "en": "Use the following textbook excerpts if they are relevant:\n\n{context}\n\n",
+    "hi": "यदि प्रासंगिक हों तो पाठ्यपुस्तक के निम्नलिखित अंशों का उपयोग करें:\n\n{context}\n\n",
+    "mr": "संबंधित असल्यास पाठ्यपुस्तकातील खालील उतारे वापरा:\n\n{context}\n\n"
+}
+
+
+def _build_messages(question: str, language: str, context: Optional[str] = None):
+    # Validate language
+    if language not in SYSTEM_PROMPTS:
+        logger.warning("Unsupported language '%s', defaulting to English", language)
+        language = "en"
+    
+    # Get language-specific prompts
+    system_prompt = SYSTEM_PROMPTS[language]
+    user_prompt = LANGUAGE_INSTRUCTIONS[language].format(question=question)
+    
+    if context:
+        user_prompt = CONTEXT_INSTRUCTIONS[language].format(
+            context=context[:ONLINE_CONTEXT_CHARS]
+        ) + user_prompt
+
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+def _generation_params() -> dict:
+    return {
+        "model": ONLINE_MODEL,
+        "temperature": ONLINE_TEMPERATURE,  # Slightly creative but mostly deterministic
+        "top_p": ONLINE_TOP_P,
+        "max_tokens": ONLINE_MAX_TOKENS,
+    }
+
+
+def _record_success(endpoint: Endpoint, start: float, response, latency: Optional[float] = None):
+    endpoint.breaker.record_success(time.perf_counter() - start if latency is None else latency)
+    
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        current_trace().set(
+            endpoint=endpoint.base_url,
+            prompt_tokens=usage.prompt_tokens,
+            completion_tokens=usage.completion_tokens
+        )
+
+
+def _record_failure(endpoint: Endpoint, start: float, error: Exception):
+    endpoint.breaker.record_failure(time.perf_counter() - start, error)
+    logger.error("Online model error (%s): %s", endpoint.base_url, error)
+
+
+def _record_cancelled(endpoint: Endpoint, start: float):
+    """
+    A call cancelled after running past the latency budget was abandoned
+    for being slow (hedge, wait_for, stream timeout) and counts as a slow
+    call; an earlier cancel (client gone, offline answered first) says
+    nothing about the endpoint.
+    """
+    elapsed = time.perf_counter() - start
+    if elapsed >= min(ONLINE_LATENCY_BUDGET, BREAKER_SLOW_CALL_SECONDS):
+        _record_failure(endpoint, start, TimeoutError(f"cancelled after {elapsed:.2f}s"))
+
+
+# Retries of one endpoint back off 0.5s, 1s, ... (as the SDK did)
+RETRY_BACKOFF = 0.5
+
+
+def _retry_delay(endpoint: Endpoint, attempt: int, error: Exception) -> Optional[float]:
+    """Seconds to wait before retrying after a failed attempt, or None to give up."""
+    if attempt >= endpoint.max_retries:
+        return None
+    if isinstance(error, APIStatusError):
+        retryable = error.status_code in (408, 409, 429) or error.status_code >= 500
+    else:
+        retryable = isinstance(error, APIConnectionError)
+    if not retryable:
+        return None
+
+    delay = RETRY_BACKOFF * 2 ** attempt
+    remaining = current_trace().remaining()
+    if remaining is not None and remaining <= delay:
+        return None  # the retry could not finish before the deadline
+    return delay
+
+
+def _create(endpoint: Endpoint, **params):
+    """One chat completion from endpoint, retried within the request deadline."""
+    attempt = 0
+    while True:
+        timeout = _call_timeout()  # not the endpoint's fault: raised outside the try
+        start = time.perf_counter()
+        _attempt_start.set(start)
+        try:
+            response = endpoint.client.chat.completions.create(**params, timeout=timeout)
+        except Exception as e:
+            _record_failure(endpoint, start, e)
+            delay = _retry_delay(endpoint, attempt, e)
+            if delay is None:
+                raise
+            time.sleep(delay)
+            attempt += 1
+            continue
+        return response, start
+
+
+async def _create_async(endpoint: Endpoint, **params):
+    """
+    Async _create. The attempt is also bounded by the request deadline,
+    since httpx timeouts limit each socket operation, not the whole call.
+    """
+    attempt = 0
+    while True:
+        timeout = _call_timeout()  # not the endpoint's fault: raised outside the try
+        start = time.perf_counter()
+        _attempt_start.set(start)
+        try:
+            response = await _within_deadline(
+                endpoint.async_client.chat.completions.create(**params, timeout=timeout)
+            )
+        except asyncio.CancelledError:
+            _record_cancelled(endpoint, start)
+            raise
+        except Exception as e:
+            _record_failure(endpoint, start, e)
+            delay = _retry_delay(endpoint, attempt, e)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        return response, start
+
+
+def _extract_answer(response) -> str:
+    answer = response.choices[0].message.content.strip()
+    
+    # Validate response is not empty
+    if not answer:
+        raise ValueError("Empty response from model")
+    
+    return answer
+
+
+def run_online_model(question: str, language: str, context: Optional[str] = None) -> str:
     """
     Generate educational response using online LLM.
     
+    Endpoints are tried in failover order, skipping any whose circuit is
+    open. Raises CircuitOpenError at once when none is available.
+    
     Args:
         question: The student's question
         language: Language code ('en', 'hi', 'mr')
+        context: Optional retrieved textbook text to ground the answer
     
     Returns:
         AI-generated answer in the requested language
     """
-    # Validate language
-    if language not in SYSTEM_PROMPTS:
-        print(f"⚠ Unsupported language '{language}', defaulting to English")
-        language = "en"
-    
-    # Get language-specific prompts
-    system_prompt = SYSTEM_PROMPTS[language]
-    user_prompt = LANGUAGE_INSTRUCTIONS[language].format(question=question)
+    with current_trace().span("online"):
+        return _call_endpoints(_build_messages(question, language, context))
+
+
+def _call_endpoints(messages) -> str:
+    last_error = None
     
-    try:
-        response = _get_client().chat.completions.create(
-            model="llama-3.1-8b-instant",
-            temperature=0.3,  # Slightly creative but mostly deterministic
-            top_p=0.9,
-            max_tokens=1024,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ]
-        )
+    for endpoint in _available_endpoints():
+        try:
+            response, start = _create(endpoint, **_generation_params(), messages=messages)
+        except Exception as e:
+            last_error = e
+            continue
         
-        answer = response.choices[0].message.content.strip()
+        _record_success(endpoint, start, response)
+        return _extract_answer(response)
+    
+    raise last_error  # Re-raise to allow router to fallback to offline
+
+
+async def run_online_model_async(question: str, language: str, context: Optional[str] = None) -> str:
+    """
+    Async variant of run_online_model using AsyncOpenAI.
+
+    Cancelling the awaiting task aborts the upstream HTTP request; a
+    call cancelled past the latency budget counts as a slow call.
+    """
+    with current_trace().span("online"):
+        return await _call_endpoints_async(_build_messages(question, language, context))
+
+
+async def _call_endpoints_async(messages) -> str:
+    last_error = None
+    
+    for endpoint in _available_endpoints():
+        try:
+            response, start = await _create_async(endpoint, **_generation_params(), messages=messages)
+        except Exception as e:
+            last_error = e
+            continue
         
-        # Validate response is not empty
-        if not answer:
-            raise ValueError("Empty response from model")
+        _record_success(endpoint, start, response)
+        return _extract_answer(response)
+    
+    raise last_error
+
+
+async def stream_online_model(question: str, language: str):
+    """
+    Stream the online answer as text deltas (OpenAI-compatible stream=True).
+
+    Fails over to the next endpoint only while nothing has been yielded;
+    an error mid-stream is raised to the caller. Time to the first token
+    is recorded as the online_ttft span and is the latency the breaker
+    sees for a completed stream.
+    """
+    messages = _build_messages(question, language)
+    last_error = None
+    
+    for endpoint in _available_endpoints():
+        ttft = None
+        yielded = False
+        try:
+            stream, start = await _create_async(
+                endpoint, **_generation_params(), messages=messages, stream=True
+            )
+        except Exception as e:
+            last_error = e
+            continue
         
-        return answer
+        try:
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                if not yielded:
+                    ttft = time.perf_counter() - start
+                    current_trace().record("online_ttft", ttft)
+                    yielded = True
+                yield delta
+        except asyncio.CancelledError:
+            if not yielded:
+                _record_cancelled(endpoint, start)
+            raise
+        except Exception as e:
+            _record_failure(endpoint, start, e)
+            if yielded:
+                raise
+            last_error = e
+            continue
+        finally:
+            # Also runs when the consumer abandons a stalled stream
+            await stream.response.aclose()
         
-    except Exception as e:
-        print(f"[ERROR] Online model error: {e}")
-        raise  # Re-raise to allow router to fallback to offline
-
+        # A long healthy answer is not a slow endpoint: the breaker judges
+        # streams by time to first token
+        _record_success(endpoint, start, None, ttft)
+        current_trace().record("online", time.perf_counter() - start)
+        return
+    
+    raise last_error
@@ -1,83 +1,251 @@
-﻿from online_model import run_online_model
-from offline_rag import run_offline_rag
-from langdetect import detect, LangDetectException
+﻿from online_model import run_online_model, run_online_model_async, stream_online_model, is_online_available
+from offline_rag import answer_offline, answer_offline_batch, retrieve_chunks
+from config import (
+    ONLINE_LATENCY_BUDGET,
+    SINGLEFLIGHT,
+    STREAM_STALL_TIMEOUT,
+    BATCH_CONCURRENCY,
+    ROUTING_POLICY,
+    OFFLINE_ANSWER_THRESHOLD,
+    REQUEST_DEADLINE,
+)
+from language_detector import detect_language
+from metrics import Counter, Histogram, RequestTrace, current_trace, register, start_trace
+from singleflight import AsyncSingleFlight, SingleFlight
+import asyncio
+import contextlib
+import logging
+import time
+import unicodedata
 import re
-from typing import Dict, Tuple
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
 
 # =========================
 # LANGUAGE DETECTION
 # =========================
 def detect_language_robust(text: str) -> str:
     """
-    Robust multilingual detection with multiple fallback strategies.
-    
-    Priority:
-    1. Script detection (Devanagari)
-    2. Keyword matching for Hindi vs Marathi
-    3. langdetect library
-    4. Default to English
+    Detect the question language without langdetect on the hot path.
+
+    Devanagari text is split into Hindi/Marathi by a character n-gram
+    classifier; Latin text is English unless it carries romanized
+    Hindi (Hinglish) or Marathi marker words. See language_detector.py.
     
     Returns:
         Language code: 'en', 'hi', or 'mr'
     """
-    if not text or len(text.strip()) < 2:
-        return "en"
+    return detect_language(text)
+
+
+# =========================
+# CONFIDENCE THRESHOLDS
+# =========================
+ONLINE_CONFIDENCE = 0.92
+OFFLINE_CONFIDENCE_BASE = 0.75
+
+
+# =========================
+# RESULT BUILDERS
+# =========================
+def _is_usable(answer: str) -> bool:
+    return bool(answer) and len(answer.strip()) > 10
+
+
+def _online_result(answer: str, language: str) -> Dict:
+    return {
+        "mode": "online",
+        "text": answer,
+        "confidence": ONLINE_CONFIDENCE,
+        "language": language
+    }
+
+
+def _offline_result(offline: Optional[Dict], language: str, confidence: Optional[float] = None) -> Dict:
+    """
+    Turn an answer_offline() result into a router response. The
+    confidence-gated policy passes its retrieval confidence to report
+    instead of OFFLINE_CONFIDENCE_BASE.
+    """
+    sources = []
     
-    text_lower = text.lower().strip()
+    if not offline or len(offline["text"].strip()) < 10:
+        answer = get_fallback_response(language)
+        confidence = 0.3
+    else:
+        answer = offline["text"]
+        sources = offline["sources"]
+        confidence = OFFLINE_CONFIDENCE_BASE if confidence is None else round(confidence, 4)
     
-    # Check for Devanagari script (Unicode range)
-    has_devanagari = bool(re.search(r'[\u0900-\u097F]', text))
+    return {
+        "mode": "offline",
+        "text": answer,
+        "confidence": confidence,
+        "language": language,
+        "sources": sources
+    }
+
+
+def _error_result(language: str) -> Dict:
+    return {
+        "mode": "error",
+        "text": get_error_response(language),
+        "confidence": 0.0,
+        "language": language
+    }
+
+
+def _finish(trace: RequestTrace, result: Dict) -> Dict:
+    trace.finish(result["mode"], result["language"])
+    return result
+
+
+def _start(question: str) -> Tuple[RequestTrace, str]:
+    """Open the request trace and detect the question language."""
+    trace = start_trace(REQUEST_DEADLINE)
     
-    if has_devanagari:
-        # Marathi-specific keywords and patterns
-        marathi_keywords = [
-            "आहे", "आहेत", "का", "कसा", "कसे", "कशी",
-            "म्हणजे", "सांग", "सांगा", "समजाव", "समजावा",
-            "मध्ये", "ला", "ना", "नाही", "होते"
-        ]
-        
-        # Hindi-specific keywords
-        hindi_keywords = [
-            "है", "हैं", "क्या", "कैसा", "कैसे", "कैसी",
-            "यानी", "बताओ", "बताइए", "समझाओ", "समझाइए",
-            "में", "को", "नहीं", "था", "थी", "थे"
-        ]
-        
-        marathi_count = sum(1 for word in marathi_keywords if word in text_lower)
-        hindi_count = sum(1 for word in hindi_keywords if word in text_lower)
-        
-        # If clear indicator exists
-        if marathi_count > hindi_count:
-            return "mr"
-        elif hindi_count > marathi_count:
-            return "hi"
-        else:
-            # Default Devanagari to Hindi if unclear
-            return "hi"
+    with trace.span("language_detection"):
+        language = detect_language_robust(question)
     
-    # Try langdetect for non-Devanagari text
-    try:
-        detected = detect(text)
-        
-        # Map detected language to supported languages
-        if detected in ["hi", "mr"]:
-            return detected
-        elif detected == "en":
-            return "en"
-        else:
-            # Unsupported language, default to English
-            return "en"
-            
-    except LangDetectException:
-        # Detection failed, default to English
-        return "en"
+    logger.info("Detected language: %s", language)
+    logger.debug("Question: %s...", question[:100])
+    return trace, language
 
 
 # =========================
-# CONFIDENCE THRESHOLDS
+# SINGLEFLIGHT (request coalescing)
 # =========================
-ONLINE_CONFIDENCE = 0.92
-OFFLINE_CONFIDENCE_BASE = 0.75
+SINGLEFLIGHT_REQUESTS = register(Counter(
+    "tutor_singleflight_requests_total",
+    "Router requests that ran the computation (leader) or shared one (coalesced)",
+    ("role",)
+))
+
+_flight = SingleFlight()
+_async_flight = AsyncSingleFlight()
+
+
+def _flight_key(question: str, language: str) -> Tuple[str, str]:
+    """Case, whitespace and trailing punctuation don't change the answer."""
+    normalized = " ".join(unicodedata.normalize("NFC", question).casefold().split())
+    return normalized.rstrip("?.!।॥ "), language
+
+
+def _record_flight(trace: RequestTrace, leader: bool, start: float):
+    role = "leader" if leader else "coalesced"
+    SINGLEFLIGHT_REQUESTS.inc(role=role)
+    trace.set(singleflight=role)
+    
+    if not leader:
+        trace.record("coalesced_wait", time.perf_counter() - start)
+        logger.info("Coalesced with an in-flight identical question")
+
+
+# =========================
+# CONFIDENCE-GATED ROUTING
+# =========================
+ROUTING_DECISIONS = register(Counter(
+    "tutor_routing_decisions_total",
+    "Confidence-gated routing decisions",
+    ("decision", "language")
+))
+RETRIEVAL_CONFIDENCE = register(Histogram(
+    "tutor_routing_retrieval_confidence",
+    "Retrieval confidence seen by the confidence-gated policy",
+    ("decision",),
+    buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 1.0)
+))
+
+
+def _retrieve(question: str):
+    """(chunks, confidence); retrieval errors count as no match."""
+    try:
+        with current_trace().span("retrieval"):
+            return retrieve_chunks(question)
+    except Exception as e:
+        logger.error("Retrieval failed: %s", e)
+        return [], 0.0
+
+
+def _gate(retrieved, language: str) -> bool:
+    """Record the routing decision; True means answer offline."""
+    chunks, confidence = retrieved
+    offline = bool(chunks) and confidence >= OFFLINE_ANSWER_THRESHOLD
+    decision = "offline_confident" if offline else "online_with_context"
+    
+    ROUTING_DECISIONS.inc(decision=decision, language=language)
+    RETRIEVAL_CONFIDENCE.observe(confidence, decision=decision)
+    current_trace().set(route_decision=decision, retrieval_confidence=round(confidence, 4))
+    logger.info("Routing decision: %s (retrieval confidence %.3f)", decision, confidence)
+    return offline
+
+
+def _context_text(chunks) -> Optional[str]:
+    return "\n\n---\n\n".join(doc["content"] for doc in chunks) or None
+
+
+def _route_gated(question: str, language: str) -> Dict:
+    retrieved = _retrieve(question)
+    
+    if _gate(retrieved, language):
+        try:
+            result = _offline_result(answer_offline(question, language, retrieved=retrieved), language, retrieved[1])
+            if result["sources"]:
+                return result
+            logger.info("Confident retrieval gave no usable answer, asking online model...")
+        except Exception as e:
+            logger.error("Offline RAG failed on a confident retrieval, asking online model: %s", e)
+    
+    try:
+        answer = run_online_model(question, language, context=_context_text(retrieved[0]))
+        if _is_usable(answer):
+            logger.info("Online model succeeded")
+            return _online_result(answer, language)
+        raise ValueError("Online response too short or empty")
+    except Exception as e:
+        logger.warning("Online model failed: %s", e)
+        current_trace().set(online_fallback=True)
+    
+    try:
+        return _offline_result(answer_offline(question, language, retrieved=retrieved), language, retrieved[1])
+    except Exception as e:
+        logger.error("Offline RAG also failed: %s", e)
+        return _error_result(language)
+
+
+async def _route_gated_async(question: str, language: str, budget: float) -> Dict:
+    retrieved = await asyncio.to_thread(_retrieve, question)
+    
+    if _gate(retrieved, language):
+        try:
+            offline = await asyncio.to_thread(answer_offline, question, language, None, retrieved)
+            result = _offline_result(offline, language, retrieved[1])
+            if result["sources"]:
+                return result
+            logger.info("Confident retrieval gave no usable answer, asking online model...")
+        except Exception as e:
+            logger.error("Offline RAG failed on a confident retrieval, asking online model: %s", e)
+    
+    try:
+        answer = await asyncio.wait_for(
+            run_online_model_async(question, language, context=_context_text(retrieved[0])),
+            budget
+        )
+        if _is_usable(answer):
+            logger.info("Online model succeeded")
+            return _online_result(answer, language)
+        raise ValueError("Online response too short or empty")
+    except Exception as e:
+        logger.warning("Online model failed: %r", e)
+        current_trace().set(online_fallback=True)
+    
+    try:
+        offline = await asyncio.to_thread(answer_offline, question, language, None, retrieved)
+        return _offline_result(offline, language, retrieved[1])
+    except Exception as e:
+        logger.error("Offline RAG also failed: %s", e)
+        return _error_result(language)
 
 
 # =========================
@@ -87,71 +255,358 @@ def tutor_router(question: str) -> Dict:
     """
     Route question to appropriate model (online or offline).
     
-    Strategy:
+    Strategy (ROUTING_POLICY=online_first, the default):
     1. Always try online model first (better quality)
     2. Fallback to offline RAG if online fails
     3. Detect language and pass to both models
     
+    With ROUTING_POLICY=confidence_gated, retrieval runs first and the
+    question is answered offline when its confidence reaches
+    OFFLINE_ANSWER_THRESHOLD; otherwise the retrieved chunks are passed
+    to the online model as context.
+    
+    Concurrent calls with the same normalized question and language
+    share one computation (see SINGLEFLIGHT).
+    
     Args:
         question: Student's question
     
     Returns:
         Dictionary with keys: mode, text, confidence, language
+        (plus sources: chunk ids, in offline mode)
     """
-    # Detect language
-    language = detect_language_robust(question)
+    trace, language = _start(question)
     
-    print(f"[INFO] Detected language: {language}")
-    print(f"[INFO] Question: {question[:100]}...")
+    if not SINGLEFLIGHT:
+        return _finish(trace, _route(question, language))
+    
+    start = time.perf_counter()
+    result, leader = _flight.do(_flight_key(question, language), lambda: _route(question, language))
+    _record_flight(trace, leader, start)
+    return _finish(trace, dict(result))
+
+
+def _route(question: str, language: str) -> Dict:
+    if ROUTING_POLICY == "confidence_gated":
+        return _route_gated(question, language)
     
     # Try online model first
     try:
-        print("[INFO] Attempting online model...")
+        logger.info("Attempting online model...")
         answer = run_online_model(question, language)
         
-        if answer and len(answer.strip()) > 10:
-            print("[INFO] Online model succeeded")
-            return {
-                "mode": "online",
-                "text": answer,
-                "confidence": ONLINE_CONFIDENCE,
-                "language": language
-            }
+        if _is_usable(answer):
+            logger.info("Online model succeeded")
+            return _online_result(answer, language)
         else:
             raise ValueError("Online response too short or empty")
     
     except Exception as e:
-        print(f"[WARN] Online model failed: {str(e)}")
-        print("[INFO] Falling back to offline RAG...")
+        logger.warning("Online model failed: %s", e)
+        logger.info("Falling back to offline RAG...")
     
     # Fallback to offline RAG
     try:
-        answer = run_offline_rag(question, language)
-        
-        if not answer or len(answer.strip()) < 10:
-            answer = get_fallback_response(language)
-            confidence = 0.3
-        else:
-            confidence = OFFLINE_CONFIDENCE_BASE
-        
-        print("[INFO] Offline RAG completed")
-        return {
-            "mode": "offline",
-            "text": answer,
-            "confidence": confidence,
-            "language": language
-        }
+        result = _offline_result(answer_offline(question, language), language)
+        logger.info("Offline RAG completed")
+        return result
     
     except Exception as e:
-        print(f"[ERROR] Offline RAG also failed: {str(e)}")
+        logger.error("Offline RAG also failed: %s", e)
         
         # Last resort fallback
-        return {
-            "mode": "error",
-            "text": get_error_response(language),
-            "confidence": 0.0,
-            "language": language
-        }
+        return _error_result(language)
+
+
+# =========================
+# ASYNC ROUTER (HEDGED)
+# =========================
+async def _cancel(task: asyncio.Task):
+    if not task.done():
+        task.cancel()
+        with contextlib.suppress(BaseException):
+            await task
+
+
+async def tutor_router_async(question: str, latency_budget: Optional[float] = None) -> Dict:
+    """
+    Async router that hedges the online call with offline RAG.
+    
+    Strategy:
+    1. Start the online model and offline retrieval concurrently
+    2. Online answer within latency_budget seconds wins; offline is dropped
+    3. Past the budget, a usable offline answer wins and the online call
+       is cancelled; if offline has nothing, keep waiting for online
+    4. If online fails, answer from offline (or the fallback text)
+    
+    Args:
+        question: Student's question
+        latency_budget: Seconds to wait for online before taking offline
+            (defaults to ONLINE_LATENCY_BUDGET)
+    
+    Returns:
+        Same dictionary shape as tutor_router
+    """
+    budget = ONLINE_LATENCY_BUDGET if latency_budget is None else latency_budget
+    trace, language = _start(question)
+    
+    if not SINGLEFLIGHT:
+        return _finish(trace, await _route_async(question, language, budget))
+    
+    start = time.perf_counter()
+    result, leader = await _async_flight.do(
+        (*_flight_key(question, language), budget),
+        lambda: _route_async(question, language, budget)
+    )
+    _record_flight(trace, leader, start)
+    return _finish(trace, dict(result))
+
+
+async def _route_async(question: str, language: str, budget: float) -> Dict:
+    if ROUTING_POLICY == "confidence_gated":
+        return await _route_gated_async(question, language, budget)
+    
+    online_task = asyncio.create_task(run_online_model_async(question, language))
+    offline_task = asyncio.create_task(asyncio.to_thread(answer_offline, question, language))
+    
+    try:
+        done, _ = await asyncio.wait({online_task}, timeout=budget)
+        
+        if not done:
+            logger.warning("Online model exceeded %ss budget, checking offline answer...", budget)
+            try:
+                offline = await offline_task
+            except Exception as e:
+                logger.error("Offline RAG failed: %s", e)
+                offline = None
+            
+            if offline and _is_usable(offline["text"]):
+                await _cancel(online_task)
+                logger.info("Offline RAG won the race")
+                return _offline_result(offline, language)
+            
+            # Nothing useful offline: the online answer is the only option
+            await asyncio.wait({online_task})
+        
+        try:
+            answer = online_task.result()
+            if _is_usable(answer):
+                await _cancel(offline_task)
+                logger.info("Online model succeeded")
+                return _online_result(answer, language)
+            raise ValueError("Online response too short or empty")
+        except Exception as e:
+            logger.warning("Online model failed: %s", e)
+            logger.info("Falling back to offline RAG...")
+        
+        try:
+            result = _offline_result(await offline_task, language)
+            logger.info("Offline RAG completed")
+            return result
+        except Exception as e:
+            logger.error("Offline RAG also failed: %s", e)
+            return _error_result(language)
+    
+    finally:
+        # Client disconnects cancel this coroutine; don't leak the racers
+        await _cancel(online_task)
+        await _cancel(offline_task)
+
+
+# =========================
+# STREAMING ROUTER
+# =========================
+# Offline answers are already complete; they are streamed a few words at
+# a time so clients render them the same way as online tokens
+OFFLINE_STREAM_WORDS = 6
+
+
+def _offline_pieces(text: str):
+    words = re.findall(r"\S+\s*", text)
+    for i in range(0, len(words), OFFLINE_STREAM_WORDS):
+        yield "".join(words[i:i + OFFLINE_STREAM_WORDS])
+
+
+async def tutor_router_stream(question: str, stall_timeout: Optional[float] = None) -> AsyncIterator[Dict]:
+    """
+    Streaming router: yields events as {"event": name, "data": dict}.
+    
+    Events:
+    - meta:   first event; detected language and the mode being tried
+    - token:  a piece of answer text
+    - switch: the online stream failed or stalled after it started;
+              discard the text so far, the offline answer follows
+    - done:   final mode, confidence, sources and timings
+    
+    The online stream gets ONLINE_LATENCY_BUDGET seconds for its first
+    token and stall_timeout (STREAM_STALL_TIMEOUT) between tokens;
+    offline retrieval runs concurrently so the fallback is ready.
+    """
+    stall = STREAM_STALL_TIMEOUT if stall_timeout is None else stall_timeout
+    trace, language = _start(question)
+    first_token_at = None
+    result = None
+    
+    offline_task = asyncio.create_task(asyncio.to_thread(answer_offline, question, language))
+    online = stream_online_model(question, language)
+    
+    def token(text: str) -> Dict:
+        nonlocal first_token_at
+        if first_token_at is None:
+            first_token_at = time.perf_counter()
+            trace.record("first_token", first_token_at - trace.start)
+        return {"event": "token", "data": {"text": text}}
+    
+    try:
+        mode = "online" if is_online_available() else "offline"
+        yield {"event": "meta", "data": {"language": language, "mode": mode}}
+        
+        if mode == "online":
+            parts = []
+            reason = None
+            timeout = ONLINE_LATENCY_BUDGET
+            try:
+                while True:
+                    try:
+                        piece = await asyncio.wait_for(online.__anext__(), timeout)
+                    except StopAsyncIteration:
+                        break
+                    parts.append(piece)
+                    yield token(piece)
+                    timeout = stall
+            except asyncio.TimeoutError:
+                reason = "stalled" if parts else "timeout"
+            except Exception as e:
+                logger.warning("Online stream failed: %s", e)
+                reason = "error"
+            
+            answer = "".join(parts)
+            if reason is None and _is_usable(answer):
+                await _cancel(offline_task)
+                logger.info("Online stream completed")
+                result = _online_result(answer, language)
+            else:
+                logger.warning("Online stream %s, switching to offline RAG", reason or "unusable")
+                if parts:
+                    yield {"event": "switch", "data": {"mode": "offline", "reason": reason or "unusable"}}
+        
+        if result is None:
+            try:
+                result = _offline_result(await offline_task, language)
+            except Exception as e:
+                logger.error("Offline RAG failed: %s", e)
+                result = _error_result(language)
+            
+            for piece in _offline_pieces(result["text"]):
+                yield token(piece)
+        
+        yield {"event": "done", "data": {
+            "mode": result["mode"],
+            "confidence": result["confidence"],
+            "language": language,
+            "sources": result.get("sources"),
+            "time_to_first_token": round(first_token_at - trace.start, 3) if first_token_at else None,
+            "processing_time": round(time.perf_counter() - trace.start, 2)
+        }}
+    
+    finally:
+        await online.aclose()
+        await _cancel(offline_task)
+        # A client that disconnects mid-stream is recorded as "aborted"
+        trace.finish(result["mode"] if result else "aborted", language)
+
+
+# =========================
+# BATCH ROUTER
+# =========================
+async def tutor_router_batch(
+    questions: List[str],
+    concurrency: Optional[int] = None,
+    latency_budget: Optional[float] = None
+) -> List[Dict]:
+    """
+    Route a worksheet of questions in one call.
+    
+    Strategy:
+    1. Detect all languages up front
+    2. Run offline retrieval for the whole batch as one batched scoring
+       pass, concurrently with the online calls
+    3. Fan out online calls, at most `concurrency` (BATCH_CONCURRENCY) in
+       flight; identical questions in the batch share one call
+    4. Items whose online call fails or exceeds latency_budget take
+       their offline answer
+    
+    Returns:
+        One entry per question, in order: a router result dict (with
+        "processing_time" since the batch started) or {"error": message}
+        if that item failed unexpectedly.
+    """
+    limit = max(1, BATCH_CONCURRENCY if concurrency is None else concurrency)
+    budget = ONLINE_LATENCY_BUDGET if latency_budget is None else latency_budget
+    batch_start = time.perf_counter()
+    
+    languages = [detect_language_robust(q) for q in questions]
+    detect_time = (time.perf_counter() - batch_start) / max(len(questions), 1)
+    logger.info("Batch of %d questions, online concurrency %d", len(questions), limit)
+    
+    async def offline_pass():
+        start = time.perf_counter()
+        answers = await asyncio.to_thread(answer_offline_batch, questions, languages)
+        return answers, time.perf_counter() - start
+    
+    offline_task = asyncio.create_task(offline_pass())
+    use_online = is_online_available()
+    semaphore = asyncio.Semaphore(limit)
+    online_calls = {}  # flight key -> task
+    
+    async def call_online(question: str, language: str) -> str:
+        async with semaphore:
+            return await asyncio.wait_for(run_online_model_async(question, language), budget)
+    
+    async def route_item(index: int) -> Dict:
+        question, language = questions[index], languages[index]
+        trace = start_trace(REQUEST_DEADLINE)
+        trace.record("language_detection", detect_time)
+        result = None
+        
+        if use_online:
+            key = _flight_key(question, language)
+            if key not in online_calls:
+                online_calls[key] = asyncio.create_task(call_online(question, language))
+            try:
+                answer = await online_calls[key]
+                if not _is_usable(answer):
+                    raise ValueError("Online response too short or empty")
+                result = _online_result(answer, language)
+            except Exception as e:
+                logger.warning("Batch item %d: online model failed: %r", index, e)
+        
+        if result is None:
+            try:
+                answers, elapsed = await offline_task
+                trace.record("offline_batch", elapsed)
+                result = _offline_result(answers[index], language)
+            except Exception as e:
+                logger.error("Batch item %d: offline RAG failed: %s", index, e)
+                result = _error_result(language)
+        
+        _finish(trace, result)
+        return {**result, "processing_time": round(time.perf_counter() - batch_start, 2)}
+    
+    try:
+        results = await asyncio.gather(
+            *(route_item(i) for i in range(len(questions))),
+            return_exceptions=True
+        )
+    finally:
+        for task in online_calls.values():
+            await _cancel(task)
+        await _cancel(offline_task)
+    
+    return [
+        {"error": str(r) or type(r).__name__} if isinstance(r, BaseException) else r
+        for r in results
+    ]
 
 
 # =========================
@@ -190,6 +645,8 @@ if __name__ == "__main__":
         "गुरुत्वाकर्षण बल समझाइए"
     ]
     
+    logging.basicConfig(level=logging.INFO)
+    
     for q in test_questions:
         print("\n" + "="*60)
         result = tutor_router(q)
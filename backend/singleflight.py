@@ -0,0 +1,95 @@
+"""
+Singleflight: collapse concurrent calls with the same key into one.
+
+The first caller for a key (the leader) runs the function; callers that
+arrive while it is in flight wait and receive the same result (or
+exception). The key is forgotten as soon as the call completes, so this
+deduplicates bursts without caching answers.
+"""
+
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Thread-based singleflight for the sync router."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """
+        Run fn() once per in-flight key.
+
+        Returns (result, leader) where leader is True for the caller that
+        actually ran fn.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, False
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result, True
+
+
+class AsyncSingleFlight:
+    """asyncio singleflight for the async router (one event loop)."""
+
+    def __init__(self):
+        # key -> [task, waiter count]
+        self._calls = {}
+
+    async def do(self, key, coro_fn):
+        """
+        Await coro_fn() once per in-flight key.
+
+        The shared work runs in its own task. A cancelled waiter only
+        cancels that task when it was the last one waiting.
+        """
+        entry = self._calls.get(key)
+        leader = entry is None
+        if leader:
+            task = asyncio.ensure_future(coro_fn())
+            entry = self._calls[key] = [task, 0]
+            task.add_done_callback(lambda _: self._forget(key, task))
+
+        task = entry[0]
+        entry[1] += 1
+        try:
+            return await asyncio.shield(task), leader
+        except asyncio.CancelledError:
+            if entry[1] == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            entry[1] -= 1
+
+    def _forget(self, key, task):
+        entry = self._calls.get(key)
+        if entry is not None and entry[0] is task:
+            del self._calls[key]
@@ -0,0 +1,35 @@
+"""
+Sentence splitting in answer_builder.
+
+Run from backend/:  python -m pytest -q test_answer_builder.py
+"""
+
+from answer_builder import split_sentences
+
+
+def test_splits_on_space_after_full_stop():
+    text = "Moving charges get transferred from one object to the other. These are negatively charged particles."
+    assert split_sentences(text) == [
+        "Moving charges get transferred from one object to the other.",
+        "These are negatively charged particles.",
+    ]
+
+
+def test_splits_glued_sentences():
+    # PDF extraction drops the space between sentences
+    text = (
+        "This electric level is called electrostatic potential.Potential difference is the "
+        "difference between the potential of two points.विद्युत धारा को एमीटर से मापा जाता है।"
+        "धारा का मात्रक एम्पियर है और इसे A से दर्शाते हैं।"
+    )
+    assert split_sentences(text) == [
+        "This electric level is called electrostatic potential.",
+        "Potential difference is the difference between the potential of two points.",
+        "विद्युत धारा को एमीटर से मापा जाता है।",
+        "धारा का मात्रक एम्पियर है और इसे A से दर्शाते हैं।",
+    ]
+
+
+def test_keeps_abbreviations_and_decimals():
+    text = "The potential difference of the cell is 1.5 V as measured by the U.S.A standard laboratory."
+    assert split_sentences(text) == [text]
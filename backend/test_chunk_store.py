@@ -0,0 +1,65 @@
+"""
+.chunks files: stored keyword index and checksum.
+
+Run from backend/:  python -m pytest -q test_chunk_store.py
+"""
+
+import pytest
+
+pytest.importorskip("numpy")
+
+import dense_retriever
+import offline_rag
+from chunk_store import ChunkFile, ChunkFileWriter, iter_chunks
+from config import VECTOR_DIR
+
+HINDI = [
+    "विद्युत धारा को एमीटर से मापा जाता है। धारा का मात्रक एम्पियर है।",
+    "शुष्क सेल में कार्बन की छड़ और जस्ते का पात्र होता है।",
+]
+
+
+@pytest.fixture(params=[False, True], ids=["plain", "zlib"])
+def chunk_file(tmp_path, request):
+    chunks = list(iter_chunks(str(VECTOR_DIR / "science.json")))
+    chunks += [{"id": len(chunks) + i, "content": text} for i, text in enumerate(HINDI)]
+
+    path = str(tmp_path / "science.chunks")
+    with ChunkFileWriter(path, compress=request.param, block_chunks=4) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+    return ChunkFile(path, "science"), chunks
+
+
+def test_stored_index_matches_built_index(chunk_file):
+    documents, _ = chunk_file
+    stored = offline_rag.BM25Index(documents, stored=documents.keyword_index())
+    built = offline_rag.BM25Index(documents)
+
+    assert stored.csr is not None
+    assert list(stored.postings) == list(built.postings)
+    assert all(stored.postings[term] == built.postings[term] for term in built.postings)
+    assert stored.doc_lengths == built.doc_lengths
+    assert stored.idf == pytest.approx(built.idf)
+    assert stored.max_scores == pytest.approx(built.max_scores)
+
+    for question in ("How is electric current measured?", "धारा कैसे मापी जाती है?"):
+        terms = offline_rag.tokenize(question)
+        stored_hits, _ = stored.search(terms)
+        built_hits, _ = built.search(terms)
+        assert [doc for _, doc in stored_hits] == [doc for _, doc in built_hits]
+
+        matrix_hits, _ = offline_rag.BM25Matrix(stored).search_batch([terms])[0]
+        assert [doc for _, doc in matrix_hits] == [doc for _, doc in built_hits]
+
+
+def test_checksum_is_stored(chunk_file):
+    documents, chunks = chunk_file
+    assert documents.checksum == dense_retriever.content_checksum(chunks)
+    assert dense_retriever.content_checksum(documents) == documents.checksum
+
+
+def test_other_analyzer_version_is_ignored(chunk_file, monkeypatch):
+    documents, _ = chunk_file
+    monkeypatch.setattr(documents, "analyzer_version", documents.analyzer_version + 1)
+    assert documents.keyword_index() is None
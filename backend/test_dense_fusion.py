@@ -0,0 +1,45 @@
+"""
+Keyword + dense fusion in offline_rag.
+
+Run from backend/:  python -m pytest -q test_dense_fusion.py
+"""
+
+import shutil
+
+import pytest
+
+pytest.importorskip("faiss")
+
+import dense_retriever
+import offline_rag
+from config import VECTOR_DIR
+from metrics import start_trace
+
+
+@pytest.fixture
+def dense_store(tmp_path, monkeypatch):
+    path = str(tmp_path / "science.json")
+    shutil.copy(VECTOR_DIR / "science.json", path)
+
+    monkeypatch.setattr(dense_retriever, "_embedder", dense_retriever.HashingEmbedder())
+    dense_retriever.build_dense_index(path)
+
+    monkeypatch.setattr(offline_rag, "DENSE_RETRIEVAL", True)
+    store = offline_rag.OfflineStore({"science": offline_rag.SubjectFile("science", path, None)})
+    assert store.has_dense
+    monkeypatch.setattr(offline_rag, "_store", store)
+    start_trace()
+    return store
+
+
+def test_nonsense_query_gets_no_chunks(dense_store):
+    for question in ("zxqv blorf quantum giraffe", "how to bake sourdough bread"):
+        chunks, confidence = offline_rag.retrieve_chunks(question)
+        assert chunks == []
+        assert offline_rag.answer_offline(question, "en") is None
+
+
+def test_on_topic_query_still_answers(dense_store):
+    chunks, confidence = offline_rag.retrieve_chunks("What is potential difference?")
+    assert chunks
+    assert confidence > 0.5
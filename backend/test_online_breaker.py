@@ -0,0 +1,146 @@
+"""
+Circuit breaker behaviour of the hedged online call.
+
+Run from backend/:  python -m pytest -q test_online_breaker.py
+"""
+
+import asyncio
+import socket
+import time
+
+import pytest
+import uvicorn
+
+import fake_upstream
+import online_model
+import router
+from circuit_breaker import CircuitBreaker
+from metrics import start_trace
+
+BUDGET = 0.2
+CALLS = 3
+
+
+async def _hung_upstream(reader, writer):
+    # Accept the request and never answer, like a wedged upstream
+    try:
+        await reader.read()
+    finally:
+        writer.close()
+
+
+def _offline_answer(question, language, *args):
+    return {"text": "Force is a push or a pull on an object.", "sources": [{"subject": "science", "id": 0}]}
+
+
+@pytest.fixture
+def hung_endpoint(monkeypatch):
+    async def start():
+        server = await asyncio.start_server(_hung_upstream, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        endpoint = online_model.Endpoint(f"http://127.0.0.1:{port}/v1", "test-key", max_retries=0)
+        endpoint.breaker = CircuitBreaker(
+            endpoint.base_url, window=CALLS, min_calls=CALLS, error_rate=0.5, cooldown=3600
+        )
+        monkeypatch.setattr(online_model, "_endpoints", [endpoint])
+        return server, endpoint
+
+    monkeypatch.setattr(online_model, "ONLINE_LATENCY_BUDGET", BUDGET)
+    monkeypatch.setattr(router, "ROUTING_POLICY", "online_first")
+    monkeypatch.setattr(router, "answer_offline", _offline_answer)
+    return start
+
+
+def test_hung_upstream_opens_breaker(hung_endpoint):
+    async def run():
+        server, endpoint = await hung_endpoint()
+        try:
+            results = []
+            for _ in range(CALLS):
+                start_trace(30.0)
+                results.append(await router._route_async("What is force?", "en", BUDGET))
+            return endpoint, results
+        finally:
+            server.close()
+
+    endpoint, results = asyncio.run(run())
+
+    assert [r["mode"] for r in results] == ["offline"] * CALLS
+    status = endpoint.breaker.status()
+    assert status["total_calls"] == CALLS
+    assert status["total_failures"] == CALLS
+    assert status["state"] == "open"
+    assert not online_model.is_online_available()
+
+
+def test_early_cancel_is_not_counted(hung_endpoint):
+    async def run():
+        server, endpoint = await hung_endpoint()
+        try:
+            start_trace(30.0)
+            task = asyncio.create_task(online_model.run_online_model_async("What is force?", "en"))
+            await asyncio.sleep(BUDGET / 4)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            return endpoint
+        finally:
+            server.close()
+
+    endpoint = asyncio.run(run())
+
+    assert endpoint.breaker.status()["total_calls"] == 0
+
+
+def test_deadline_bounds_retries(hung_endpoint):
+    async def run():
+        server, endpoint = await hung_endpoint()
+        endpoint.max_retries = 2
+        try:
+            start_trace(1.0)
+            start = time.perf_counter()
+            with pytest.raises(Exception):
+                await online_model.run_online_model_async("What is force?", "en")
+            return time.perf_counter() - start
+        finally:
+            server.close()
+
+    # Three attempts each capped by the deadline used to take ~3x as long
+    assert asyncio.run(run()) < 1.5
+
+
+def test_long_healthy_stream_is_not_slow(monkeypatch):
+    # Fast first token, but the whole stream takes ~1s: well past the
+    # breaker's slow-call threshold
+    monkeypatch.setattr(fake_upstream, "settings", fake_upstream.Settings("fixed:0.05", tps=20, answer_tokens=20))
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    async def run():
+        server = uvicorn.Server(uvicorn.Config(fake_upstream.app, host="127.0.0.1", port=port, log_level="warning"))
+        serving = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+
+        endpoint = online_model.Endpoint(f"http://127.0.0.1:{port}/v1", "test-key", max_retries=0)
+        endpoint.breaker = CircuitBreaker(
+            endpoint.base_url, window=CALLS, min_calls=CALLS, slow_call_seconds=0.3, cooldown=3600
+        )
+        monkeypatch.setattr(online_model, "_endpoints", [endpoint])
+        try:
+            for _ in range(CALLS):
+                start_trace(30.0)
+                pieces = [piece async for piece in online_model.stream_online_model("What is force?", "en")]
+                assert len(pieces) == 20
+            return endpoint
+        finally:
+            server.should_exit = True
+            await serving
+
+    endpoint = asyncio.run(run())
+
+    status = endpoint.breaker.status()
+    assert status["total_calls"] == CALLS
+    assert status["total_failures"] == 0
+    assert status["state"] == "closed"